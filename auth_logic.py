@@ -2,106 +2,96 @@ import sqlite3
 from sqlite3 import Error
 from database import create_connection
 from models import UserRequest, UserResponse, User # type: ignore
+from password_hashing import hash_password, verify_password, needs_rehash # type: ignore
 from datetime import datetime
 
-def check_user_exists(username: str, password: str) -> tuple[bool, User | None]:
+def _row_to_user(row: tuple) -> User:
+   """Build a User from an (id, username, password, created_at) row."""
+   return User(
+       id=row[0],
+       username=row[1],
+       password=row[2],
+       created_at=datetime.fromisoformat(row[3])
+   )
+
+def _verify_and_migrate(cursor, row: tuple, password: str) -> User | None:
    """
-   Check if a user with the given username and password exists in the database.
-  
-   Args:
-       username (str): The username to check
-       password (str): The password to check
-      
+   Verify a password against a user row, re-hashing plain text or outdated hashes.
+   
    Returns:
-       tuple[bool, User | None]: (exists, user_data)
-           - exists: True if user exists with matching credentials, False otherwise
-           - user_data: User object if found, None otherwise
+       User | None: The user if the password matches, None otherwise
    """
-   conn = create_connection()
-   if conn is None:
-       return False, None
-  
-   try:
-       cursor = conn.cursor()
-      
-       # Query to find user with exact username and password match
-       query = "SELECT id, username, password, created_at FROM users WHERE username = ? AND password = ?"
-       cursor.execute(query, (username, password))
-      
-       result = cursor.fetchone()
-      
-       if result and result[0] is not None:
-           # User found with matching credentials
-           user = User(
-               id=result[0],
-               username=result[1],
-               password=result[2],
-               created_at=datetime.fromisoformat(result[3])
-           )
-           return True, user
-       else:
-           # No user found with matching credentials
-           return False, None
-          
-   except Error as e:
-       print(f"Error checking user existence: {e}")
-       return False, None
-   finally:
-       conn.close()
+   if not verify_password(password, row[2]):
+       return None
+   
+   stored_password = row[2]
+   
+   # Migrate plain text or outdated hashes to the current settings
+   if needs_rehash(stored_password):
+       stored_password = hash_password(password)
+       cursor.execute("UPDATE users SET password = ? WHERE id = ?", (stored_password, row[0]))
+   
+   return _row_to_user((row[0], row[1], stored_password, row[3]))
 
-def create_new_user(username: str, password: str) -> tuple[bool, User | None]:
+def login_or_register(username: str, password: str) -> tuple[str, User | None]:
    """
-   Create a new user in the database with the provided username and password.
+   Log a user in, or register them if the username is free, on a single connection.
+   
+   Logic:
+   1. Look the username up and, if found, verify the password
+   2. If not found, hash the password and INSERT ... ON CONFLICT DO NOTHING RETURNING
+      the new row, which is race-free against concurrent registrations
+   3. If the insert lost a race, verify against the row that won
+  
+   The lookup runs first so that logins, the common case, never pay for
+   hashing a password they don't store.
   
    Args:
-       username (str): The username for the new user
-       password (str): The password for the new user
+       username (str): The username
+       password (str): The password provided by the user
       
    Returns:
-       tuple[bool, User | None]: (success, user_data)
-           - success: True if user created successfully, False otherwise
-           - user_data: User object if created, None otherwise
+       tuple[str, User | None]: (outcome, user_data)
+           - outcome: "login", "created", "invalid" (wrong password) or "error"
+           - user_data: User object on login or registration, None otherwise
    """
    conn = create_connection()
    if conn is None:
-       return False, None
+       return "error", None
   
    try:
        cursor = conn.cursor()
+       select_query = "SELECT id, username, password, created_at FROM users WHERE username = ?"
+       cursor.execute(select_query, (username,))
+       row = cursor.fetchone()
       
-       # Check if username already exists (for uniqueness constraint)
-       check_query = "SELECT id FROM users WHERE username = ?"
-       cursor.execute(check_query, (username,))
-      
-       if cursor.fetchone():
-           # Username already exists
-           return False, None
-      
-       # Insert new user with plain text username and password
-       insert_query = "INSERT INTO users (username, password) VALUES (?, ?)"
-       cursor.execute(insert_query, (username, password))
-      
-       # Get the created user data
-       user_id = cursor.lastrowid
-       if user_id is None:
-           return False, None
+       if row is None:
+           # Insert new user with a salted hash of the password
+           insert_query = """
+           INSERT INTO users (username, password) VALUES (?, ?)
+           ON CONFLICT (username) DO NOTHING
+           RETURNING id, username, password, created_at
+           """
+           cursor.execute(insert_query, (username, hash_password(password)))
+           created = cursor.fetchone()
+           conn.commit()
+           if created is not None:
+               return "created", _row_to_user(created)
           
-       created_at = datetime.now()
-      
-       user = User(
-           id=user_id,
-           username=username,
-           password=password,
-           created_at=created_at
-       )
+           # Another request registered the username first
+           cursor.execute(select_query, (username,))
+           row = cursor.fetchone()
+           if row is None:
+               return "error", None
       
+       user = _verify_and_migrate(cursor, row, password)
        conn.commit()
-       return True, user
+       return ("login", user) if user is not None else ("invalid", None)
       
    except Error as e:
-       print(f"Error creating new user: {e}")
+       print(f"Error authenticating user: {e}")
        conn.rollback()
-       return False, None
+       return "error", None
    finally:
        conn.close()
 
@@ -114,42 +104,37 @@ def authenticate_user(user_request: UserRequest) -> UserResponse:
    2. If found: Return success message for login
    3. If not found: Create new user and return confirmation message
   
+   Both steps run on one connection (see login_or_register).
+  
    Args:
        user_request (UserRequest): The user authentication request
       
    Returns:
        UserResponse: Response with status and message
    """
-   username = user_request.username
-   password = user_request.password
+   outcome, user = login_or_register(user_request.username, user_request.password)
   
-   # Check if user exists with matching credentials
-   user_exists, existing_user = check_user_exists(username, password)
-  
-   if user_exists and existing_user is not None:
+   if outcome == "login" and user is not None:
        # User found - successful login
        return UserResponse(
            status="success",
            message="Login successful",
-           username=existing_user.username,
-           user_id=existing_user.id,
-           created_at=existing_user.created_at
+           username=user.username,
+           user_id=user.id,
+           created_at=user.created_at
+       )
+   elif outcome == "created" and user is not None:
+       # User not found - new user created
+       return UserResponse(
+           status="success",
+           message="User created successfully",
+           username=user.username,
+           user_id=user.id,
+           created_at=user.created_at
        )
    else:
-       # User not found - create new user
-       user_created, new_user = create_new_user(username, password)
-      
-       if user_created and new_user is not None:
-           return UserResponse(
-               status="success",
-               message="User created successfully",
-               username=new_user.username,
-               user_id=new_user.id,
-               created_at=new_user.created_at
-           )
-       else:
-           # Failed to create user (likely username already exists)
-           return UserResponse(
-               status="error",
-               message="Failed to create user. Username may already exist."
-           )
\ No newline at end of file
+       # Failed to create user (likely username already exists)
+       return UserResponse(
+           status="error",
+           message="Failed to create user. Username may already exist."
+       )
@@ -0,0 +1,310 @@
+import os
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from database import get_schedule, get_schedules, get_schedule_stamps, register_schedule_listener # type: ignore
+from recurrence import RecurrenceIndex, RecurringTask, ONCE, DAILY, WEEKDAYS_RULE # type: ignore
+
+# Maximum number of per-user indexes kept in memory
+MAX_CACHED_INDEXES = 10000
+
+# With several worker processes, saves handled by other processes never reach this
+# process's save listener. CACHE_REVALIDATE checks every cached index against the
+# stored schedule's change stamp (one indexed query per lookup) before using it.
+CACHE_REVALIDATE = os.getenv("CACHE_REVALIDATE", "false").lower() in ("1", "true", "yes")
+
+MINUTES_PER_DAY = 24 * 60
+
+Interval = Tuple[int, int]
+
+def _minutes_interval(recurring: RecurringTask) -> Interval:
+   """Return a task's busy interval in minutes from the start of its day."""
+   start = recurring.start_time.hour * 60 + recurring.start_time.minute
+   end = recurring.end_time.hour * 60 + recurring.end_time.minute
+   if end <= start:
+       # Overnight task, spills into the next day
+       end += MINUTES_PER_DAY
+   return start, end
+
+def merge_intervals(intervals: List[Interval]) -> List[Interval]:
+   """
+   Merge overlapping or touching intervals into a sorted, disjoint list.
+   """
+   merged: List[Interval] = []
+   for start, end in sorted(intervals):
+       if merged and start <= merged[-1][1]:
+           if end > merged[-1][1]:
+               merged[-1] = (merged[-1][0], end)
+       else:
+           merged.append((start, end))
+   return merged
+
+class FreeBusyIndex:
+   """
+   Sorted-interval index of a user's busy time.
+
+   Tasks repeating on fixed weekdays are pre-merged into one sorted interval
+   list per weekday. One-off dated tasks are bucketed by date, and the few
+   remaining rules (monthly or anchored to a start date) are checked per day
+   in constant time. A query therefore costs O(days in window) and never
+   re-parses the stored schedule.
+   """
+
+   def __init__(self, schedule_data: Dict[str, Any]):
+       self.recurrence = RecurrenceIndex(schedule_data)
+       weekly: List[List[Interval]] = [[] for _ in range(7)]
+       one_off: Dict[date, List[Interval]] = {}
+       self.dated_rules: List[Tuple[RecurringTask, Interval]] = []
+
+       for recurring in self.recurrence.tasks:
+           rule = recurring.rule
+           interval = _minutes_interval(recurring)
+           if rule.anchor is None and rule.kind in (DAILY, WEEKDAYS_RULE):
+               weekdays = range(7) if rule.kind == DAILY else rule.weekdays
+               for weekday in weekdays:
+                   weekly[weekday].append(interval)
+           elif rule.kind == ONCE:
+               one_off.setdefault(rule.anchor, []).append(interval)
+           else:
+               self.dated_rules.append((recurring, interval))
+
+       self.weekly = [merge_intervals(intervals) for intervals in weekly]
+       self.one_off = one_off
+
+   def day_intervals(self, day: date) -> List[Interval]:
+       """
+       Return the merged busy intervals for one day, in minutes from midnight.
+       Intervals of overnight tasks may extend past 1440.
+       """
+       extra = list(self.one_off.get(day, ()))
+       for recurring, interval in self.dated_rules:
+           if recurring.rule.occurs_on(day):
+               extra.append(interval)
+       if not extra:
+           return self.weekly[day.weekday()]
+       return merge_intervals(self.weekly[day.weekday()] + extra)
+
+   def busy_intervals(self, start: datetime, end: datetime) -> List[Interval]:
+       """
+       Return merged busy intervals overlapping [start, end).
+
+       Args:
+           start (datetime): Start of the window
+           end (datetime): End of the window
+
+       Returns:
+           List[Interval]: Sorted (start, end) pairs in minutes relative to `start`,
+               clipped to the window
+       """
+       window = int((end - start).total_seconds() // 60)
+       # Start one day early to pick up overnight tasks from the previous day
+       day = start.date() - timedelta(days=1)
+       offset = int((datetime.combine(day, time.min) - start).total_seconds() // 60)
+       busy: List[Interval] = []
+
+       while offset < window:
+           for busy_start, busy_end in self.day_intervals(day):
+               busy_start += offset
+               busy_end += offset
+               if busy_end <= 0 or busy_start >= window:
+                   continue
+               busy.append((max(busy_start, 0), min(busy_end, window)))
+           day += timedelta(days=1)
+           offset += MINUTES_PER_DAY
+
+       return merge_intervals(busy)
+
+   def free_windows(self, start: datetime, end: datetime, min_minutes: int = 0) -> List[Tuple[datetime, datetime]]:
+       """
+       Return free windows of at least `min_minutes` within [start, end).
+       """
+       window = int((end - start).total_seconds() // 60)
+       free = []
+       cursor = 0
+       for busy_start, busy_end in self.busy_intervals(start, end) + [(window, window)]:
+           if busy_start - cursor >= max(min_minutes, 1):
+               free.append((start + timedelta(minutes=cursor), start + timedelta(minutes=busy_start)))
+           cursor = max(cursor, busy_end)
+       return free
+
+# Per-user index cache, kept in sync with saved schedules through the database listener.
+# Entries are (index, change stamp of the schedule it was built from, or None)
+_index_cache: "OrderedDict[int, Tuple[FreeBusyIndex, Optional[int]]]" = OrderedDict()
+_index_generations: Dict[int, int] = {}
+_index_lock = threading.Lock()
+
+def _store_index(user_id: int, index: FreeBusyIndex, generation: Optional[int] = None,
+                 stamp: Optional[int] = None):
+   """Store an index in the LRU cache unless a newer save happened meanwhile."""
+   with _index_lock:
+       if generation is not None and _index_generations.get(user_id, 0) != generation:
+           return
+       _index_cache[user_id] = (index, stamp)
+       _index_cache.move_to_end(user_id)
+       while len(_index_cache) > MAX_CACHED_INDEXES:
+           evicted_user_id, _ = _index_cache.popitem(last=False)
+           _index_generations.pop(evicted_user_id, None)
+
+def _cached_index(user_id: int, stamp: Optional[int]) -> Optional[FreeBusyIndex]:
+   """Return a cached index that is still current; call with _index_lock held."""
+   entry = _index_cache.get(user_id)
+   if entry is None or (CACHE_REVALIDATE and entry[1] != stamp):
+       return None
+   _index_cache.move_to_end(user_id)
+   return entry[0]
+
+def get_free_busy_index(user_id: int) -> Optional[FreeBusyIndex]:
+   """
+   Get the free/busy index for a user, building it from the stored schedule on a cache miss.
+
+   Args:
+       user_id (int): The user ID
+
+   Returns:
+       Optional[FreeBusyIndex]: The user's index, or None if the user has no schedule
+   """
+   stamp = None
+   if CACHE_REVALIDATE:
+       stamp = get_schedule_stamps([user_id]).get(user_id)
+       if stamp is None:
+           with _index_lock:
+               _index_cache.pop(user_id, None)
+           return None
+
+   with _index_lock:
+       index = _cached_index(user_id, stamp)
+       if index is not None:
+           return index
+       generation = _index_generations.get(user_id, 0)
+
+   schedule = get_schedule(user_id)
+   if schedule is None:
+       return None
+
+   # The schedule was read after the stamp, so it is at least as new as the stamp
+   index = FreeBusyIndex(schedule["schedule_data"])
+   _store_index(user_id, index, generation, stamp)
+   return index
+
+def get_free_busy_indexes(user_ids: List[int]) -> Dict[int, Optional[FreeBusyIndex]]:
+   """
+   Get free/busy indexes for many users, loading all cache misses with one query.
+
+   Args:
+       user_ids (List[int]): The user IDs
+
+   Returns:
+       Dict[int, Optional[FreeBusyIndex]]: Index per user, None for users without a schedule
+   """
+   indexes: Dict[int, Optional[FreeBusyIndex]] = {}
+   generations: Dict[int, int] = {}
+   stamps = get_schedule_stamps(user_ids) if CACHE_REVALIDATE else {}
+   with _index_lock:
+       for user_id in user_ids:
+           if CACHE_REVALIDATE and user_id not in stamps:
+               _index_cache.pop(user_id, None)
+               indexes[user_id] = None
+               continue
+           index = _cached_index(user_id, stamps.get(user_id))
+           if index is not None:
+               indexes[user_id] = index
+           else:
+               generations[user_id] = _index_generations.get(user_id, 0)
+
+   if generations:
+       schedules = get_schedules(list(generations))
+       for user_id, generation in generations.items():
+           if user_id in schedules:
+               index = FreeBusyIndex(schedules[user_id])
+               _store_index(user_id, index, generation, stamps.get(user_id))
+               indexes[user_id] = index
+           else:
+               indexes[user_id] = None
+   return indexes
+
+def busy_bitmap(index: FreeBusyIndex, start: datetime, end: datetime, granularity: int = 5) -> int:
+   """
+   Encode a user's busy time in [start, end) as a bitset.
+
+   Bit i represents the slot [start + i * granularity, start + (i + 1) * granularity)
+   and is set when any part of that slot is busy.
+   """
+   bitmap = 0
+   for busy_start, busy_end in index.busy_intervals(start, end):
+       low = busy_start // granularity
+       high = -(-busy_end // granularity)
+       bitmap |= ((1 << (high - low)) - 1) << low
+   return bitmap
+
+def _bit_runs(bitmap: int) -> List[Interval]:
+   """Return the runs of consecutive set bits as (first_bit, length) pairs."""
+   runs = []
+   while bitmap:
+       low = (bitmap & -bitmap).bit_length() - 1
+       shifted = bitmap >> low
+       # Number of trailing ones in the shifted bitmap
+       length = (shifted ^ (shifted + 1)).bit_length() - 1
+       runs.append((low, length))
+       bitmap &= ~(((1 << length) - 1) << low)
+   return runs
+
+def common_free_slots(indexes: List[Optional[FreeBusyIndex]], start: datetime, end: datetime,
+                      min_minutes: int = 30, granularity: int = 5, limit: int = 10) -> List[Dict[str, Any]]:
+   """
+   Find the time slots in which every user is free.
+
+   Each user's window is encoded as a bitset of `granularity`-minute slots and the
+   free bitsets are intersected with a single AND per user, so the cost grows with
+   the number of users rather than with the number of pairwise comparisons.
+
+   Args:
+       indexes (List[Optional[FreeBusyIndex]]): One index per user (None means fully free)
+       start (datetime): Start of the search window
+       end (datetime): End of the search window
+       min_minutes (int): Minimum length of a common slot
+       granularity (int): Slot size in minutes
+       limit (int): Maximum number of slots to return
+
+   Returns:
+       List[Dict[str, Any]]: Common slots ranked by length, longest and earliest first
+   """
+   window = int((end - start).total_seconds() // 60)
+   slot_count = window // granularity
+   all_slots = (1 << slot_count) - 1
+
+   common = all_slots
+   for index in indexes:
+       if index is None:
+           continue
+       common &= ~busy_bitmap(index, start, end, granularity)
+       if not common:
+           break
+
+   min_slots = max(-(-min_minutes // granularity), 1)
+   runs = [(low, length) for low, length in _bit_runs(common & all_slots) if length >= min_slots]
+   runs.sort(key=lambda run: (-run[1], run[0]))
+
+   return [
+       {
+           "start": (start + timedelta(minutes=low * granularity)).isoformat(),
+           "end": (start + timedelta(minutes=(low + length) * granularity)).isoformat(),
+           "minutes": length * granularity
+       }
+       for low, length in runs[:limit]
+   ]
+
+def _on_schedule_saved(user_id: int, schedule_data: Dict[str, Any]):
+   """Rebuild a user's index whenever their schedule is saved."""
+   if CACHE_REVALIDATE:
+       # The new change stamp is not known here; the next lookup reloads the schedule
+       with _index_lock:
+           _index_generations[user_id] = _index_generations.get(user_id, 0) + 1
+           _index_cache.pop(user_id, None)
+       return
+   index = FreeBusyIndex(schedule_data)
+   with _index_lock:
+       _index_generations[user_id] = _index_generations.get(user_id, 0) + 1
+   _store_index(user_id, index)
+
+register_schedule_listener(_on_schedule_saved)
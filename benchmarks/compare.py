@@ -0,0 +1,57 @@
+"""
+Compare two benchmark result files.
+
+Matches results by name and reports the change in p50 and p99 latency.
+Exits with status 1 if any p50 regressed by more than the threshold, so CI
+can fail a run against a stored baseline.
+
+Usage:
+    python -m benchmarks.compare baseline.json results.json --threshold 0.2
+"""
+import argparse
+import json
+import sys
+
+def _load(path: str):
+   with open(path) as f:
+       data = json.load(f)
+   return data.get("metadata", {}), {result["name"]: result for result in data["results"]}
+
+def main():
+   parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+   parser.add_argument("baseline")
+   parser.add_argument("current")
+   parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative p50 slowdown")
+   args = parser.parse_args()
+
+   baseline_meta, baseline = _load(args.baseline)
+   current_meta, current = _load(args.current)
+   print(f"baseline: {baseline_meta.get('git_commit')} ({baseline_meta.get('timestamp')})")
+   print(f"current:  {current_meta.get('git_commit')} ({current_meta.get('timestamp')})")
+   if baseline_meta.get("platform") != current_meta.get("platform"):
+       print("warning: results come from different platforms")
+
+   regressions = []
+   for name, result in current.items():
+       if name not in baseline:
+           print(f"{name:<32} new")
+           continue
+       old = baseline[name]
+       if not old.get("p50_ms") or not result.get("p50_ms"):
+           print(f"{name:<32} {old.get('ops_per_second')} -> {result.get('ops_per_second')} ops/s")
+           continue
+       p50_change = result["p50_ms"] / old["p50_ms"] - 1
+       p99_change = result["p99_ms"] / old["p99_ms"] - 1 if old["p99_ms"] else 0.0
+       flag = ""
+       if p50_change > args.threshold:
+           regressions.append(name)
+           flag = "  REGRESSION"
+       print(f"{name:<32} p50 {old['p50_ms']:.3f} -> {result['p50_ms']:.3f} ms ({p50_change:+.1%})  "
+             f"p99 {old['p99_ms']:.3f} -> {result['p99_ms']:.3f} ms ({p99_change:+.1%}){flag}")
+
+   if regressions:
+       print(f"{len(regressions)} regression(s) above {args.threshold:.0%}: {', '.join(regressions)}")
+       sys.exit(1)
+
+if __name__ == "__main__":
+   main()
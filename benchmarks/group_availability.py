@@ -0,0 +1,62 @@
+"""
+Benchmark for group availability over several hundred users.
+
+Builds synthetic weekly schedules, encodes them as free/busy indexes and
+measures how long it takes to find the common free slots for the group.
+
+Usage:
+    python -m benchmarks.group_availability --users 500 --repeat 20
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from availability import FreeBusyIndex, common_free_slots # type: ignore
+from benchmarks.runner import measure, format_result, write_results, summarize
+from benchmarks.synthetic import synthetic_weekday_schedule
+
+def main():
+   parser = argparse.ArgumentParser(description="Benchmark group availability queries")
+   parser.add_argument("--users", type=int, default=500)
+   parser.add_argument("--tasks-per-day", type=int, default=4)
+   parser.add_argument("--days", type=int, default=7)
+   parser.add_argument("--granularity", type=int, default=5)
+   parser.add_argument("--repeat", type=int, default=20)
+   parser.add_argument("--seed", type=int, default=42)
+   parser.add_argument("--output", help="write results as JSON to this file")
+   args = parser.parse_args()
+
+   rng = random.Random(args.seed)
+   schedules = [synthetic_weekday_schedule(rng, args.tasks_per_day) for _ in range(args.users)]
+
+   build_timings = []
+   indexes = []
+   for schedule in schedules:
+       build_start = time.perf_counter()
+       indexes.append(FreeBusyIndex(schedule))
+       build_timings.append(time.perf_counter() - build_start)
+
+   start = datetime(2025, 7, 14, 0, 0)
+   end = start + timedelta(days=args.days)
+   sizes = {"users": args.users, "days": args.days, "granularity": args.granularity}
+   results = [
+       summarize("free_busy_index_build", build_timings, tasks_per_day=args.tasks_per_day),
+       measure(
+           "common_free_slots",
+           lambda: common_free_slots(indexes, start, end, min_minutes=30, granularity=args.granularity),
+           args.repeat, warmup=1, **sizes
+       )
+   ]
+   slots = common_free_slots(indexes, start, end, min_minutes=30, granularity=args.granularity)
+
+   print(f"users={args.users} days={args.days} granularity={args.granularity}min")
+   for result in results:
+       print(format_result(result))
+   print(f"common slots found: {len(slots)}")
+
+   if args.output:
+       write_results(args.output, results, **vars(args))
+       print(f"results written to {args.output}")
+
+if __name__ == "__main__":
+   main()
@@ -0,0 +1,133 @@
+"""
+Benchmark for the schedule validation, conversion, persistence, chunking and retrieval hot paths.
+
+Runs offline: the OpenAI key is replaced with a placeholder before the
+generation module is imported, and nothing that calls the API is timed.
+The database benchmarks use a temporary SQLite file.
+
+Usage:
+    python -m benchmarks.hot_paths --days 7 --tasks-per-day 8 --iterations 200 --output results.json
+    python -m benchmarks.compare baseline.json results.json
+"""
+import argparse
+import itertools
+import os
+import random
+import shutil
+import tempfile
+from benchmarks.runner import measure, format_result, write_results
+from benchmarks.synthetic import synthetic_corpus, synthetic_llm_output, synthetic_weekday_schedule
+
+def _generation_benchmarks(args, rng: random.Random):
+   """Time validation, conversion and chunking from the generation module."""
+   # The module builds an embedding function at import time; no request is ever sent
+   os.environ.setdefault("OPENAI_API_KEY", "sk-offline-benchmark")
+   import schedule_generation # type: ignore
+
+   llm_output = synthetic_llm_output(rng, args.days, args.tasks_per_day)
+   validator = schedule_generation.ScheduleValidator()
+   parsed = validator.validate_schedule(llm_output)
+   if not isinstance(parsed, schedule_generation.Schedule):
+       raise SystemExit(f"Synthetic schedule failed validation: {parsed}")
+   corpus = synthetic_corpus(rng, args.documents, args.paragraphs)
+   sizes = {"days": args.days, "tasks_per_day": args.tasks_per_day}
+
+   yield measure(
+       "validate_schedule", lambda: validator.validate_schedule(llm_output),
+       args.iterations, **sizes, bytes=len(llm_output)
+   )
+   yield measure(
+       "convert_date_to_weekday", lambda: schedule_generation.convert_date_schedule_to_weekday_schedule(parsed.root),
+       args.iterations, **sizes
+   )
+   yield measure(
+       "generate_chunks", lambda: schedule_generation.generate_chunks(corpus),
+       max(1, args.iterations // 10), warmup=1,
+       documents=args.documents, paragraphs=args.paragraphs, characters=len(corpus)
+   )
+
+   from embeddings import LocalEmbeddingBackend # type: ignore
+   backend = LocalEmbeddingBackend()
+   chunk_texts = [chunk["text"] for chunk in schedule_generation.generate_chunks(corpus)]
+   yield measure(
+       "embed_chunks_local", lambda: backend.embed(chunk_texts),
+       max(1, args.iterations // 10), warmup=1, chunks=len(chunk_texts), dimensions=backend.dimensions
+   )
+
+   from lexical_index import LexicalIndex # type: ignore
+   index = LexicalIndex()
+   index.add([str(i) for i in range(len(chunk_texts))], chunk_texts)
+   yield measure(
+       "lexical_search", lambda: index.search("midterm exam schedule for the syllabus deadline", 5),
+       args.iterations, chunks=len(chunk_texts)
+   )
+
+def _database_benchmarks(args, rng: random.Random):
+   """Time save_schedule and get_schedule against a temporary database."""
+   import database # type: ignore
+   if args.with_listeners:
+       # Availability caches subscribe to saves, as in the running API
+       # (version history is always recorded, in the save's own transaction)
+       import availability # type: ignore
+
+   directory = tempfile.mkdtemp(prefix="schedule-bench-")
+   database.DATABASE_FILE = os.path.join(directory, "bench.db")
+   try:
+       database.init_database()
+       conn = database.create_connection()
+       conn.executemany(
+           "INSERT INTO users (username, password) VALUES (?, ?)",
+           [(f"bench-user-{i}", "x") for i in range(args.users)]
+       )
+       conn.commit()
+       conn.close()
+
+       schedules = [synthetic_weekday_schedule(rng, args.tasks_per_day) for _ in range(args.users)]
+       saves = itertools.cycle(range(args.users))
+       gets = itertools.cycle(range(args.users))
+
+       def save():
+           user_index = next(saves)
+           database.save_schedule(user_index + 1, schedules[user_index])
+
+       # Insert every schedule once so the timed saves take the update path
+       for _ in range(args.users):
+           save()
+
+       sizes = {"users": args.users, "tasks_per_day": args.tasks_per_day, "listeners": args.with_listeners}
+       yield measure("save_schedule", save, args.iterations, **sizes)
+       yield measure("get_schedule", lambda: database.get_schedule(next(gets) + 1), args.iterations, **sizes)
+       yield measure("get_schedule_raw", lambda: database.get_schedule_raw(next(gets) + 1), args.iterations, **sizes)
+   finally:
+       shutil.rmtree(directory, ignore_errors=True)
+
+def main():
+   parser = argparse.ArgumentParser(description="Benchmark validation, conversion, persistence and chunking")
+   parser.add_argument("--days", type=int, default=7)
+   parser.add_argument("--tasks-per-day", type=int, default=8)
+   parser.add_argument("--documents", type=int, default=10)
+   parser.add_argument("--paragraphs", type=int, default=20)
+   parser.add_argument("--users", type=int, default=100)
+   parser.add_argument("--iterations", type=int, default=200)
+   parser.add_argument("--seed", type=int, default=42)
+   parser.add_argument("--with-listeners", action="store_true",
+                       help="register the availability save listener")
+   parser.add_argument("--skip-generation", action="store_true",
+                       help="skip benchmarks that import the generation module")
+   parser.add_argument("--output", help="write results as JSON to this file")
+   args = parser.parse_args()
+
+   rng = random.Random(args.seed)
+   results = []
+   suites = [_database_benchmarks] if args.skip_generation else [_generation_benchmarks, _database_benchmarks]
+   for suite in suites:
+       for result in suite(args, rng):
+           print(format_result(result))
+           results.append(result)
+
+   if args.output:
+       write_results(args.output, results, **vars(args))
+       print(f"results written to {args.output}")
+
+if __name__ == "__main__":
+   main()
@@ -0,0 +1,384 @@
+"""
+Concurrent load driver for the API.
+
+Registers a pool of users, seeds their schedules, then runs a weighted mix of
+requests against every endpoint from --concurrency threads for --duration
+seconds. Reports throughput, latency percentiles and error rates per endpoint
+and overall. Uses only the standard library.
+
+Run the API against the mock OpenAI server so that /schedule/generate stays offline:
+    python -m benchmarks.mock_openai --port 8100 &
+    OPENAI_BASE_URL=http://127.0.0.1:8100/v1 OPENAI_API_KEY=sk-mock uvicorn main:app --port 8000 &
+    python -m benchmarks.load_test --base-url http://127.0.0.1:8000 --concurrency 32 --duration 60 --output load.json
+"""
+import argparse
+import http.client
+import json
+import random
+import secrets
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+from benchmarks.runner import percentile, summarize, write_results
+from benchmarks.synthetic import synthetic_weekday_schedule
+
+PROMPTS = [
+   "I have a math exam on Friday, soccer practice Tuesday and Thursday evenings, and a project due Wednesday.",
+   "Plan study sessions for my biology midterm next week around my part-time job on weekday mornings.",
+   "Schedule daily reading, two gym sessions and a team meeting on Monday afternoon."
+]
+
+# Relative request weights per endpoint; generation is rare because each call waits on the LLM
+DEFAULT_WEIGHTS = {
+   "GET /": 1,
+   "GET /health": 2,
+   "GET /metrics": 1,
+   "POST /auth": 4,
+   "POST /auth/logout": 1,
+   "POST /schedule/save": 8,
+   "POST /schedule/ai-save": 3,
+   "POST /schedule/bulk-save": 1,
+   "POST /schedule/generate": 1,
+   "GET /schedule/{user_id}": 20,
+   "GET /schedule/{user_id}.ics": 4,
+   "PATCH /schedule/{user_id}": 6,
+   "GET /schedule/{user_id}/versions": 2,
+   "GET /schedule/{user_id}/versions/{version}": 2,
+   "GET /schedule/{user_id}/versions/{version}/diff": 1,
+   "POST /schedule/{user_id}/versions/{version}/restore": 1,
+   "GET /schedule/{user_id}/occurrences": 6,
+   "GET /schedule/{user_id}/next": 6,
+   "GET /schedule/{user_id}/free": 4,
+   "POST /schedule/group/free": 2,
+   "GET /schedules/export": 1
+}
+
+class LoadUser:
+   """A registered user with credentials and a session token."""
+
+   def __init__(self, username: str, password: str, user_id: int, token: str):
+       self.username = username
+       self.password = password
+       self.user_id = user_id
+       self.token = token
+
+class Recorder:
+   """Thread-safe latency and status collection per endpoint."""
+
+   def __init__(self):
+       self.timings: Dict[str, List[float]] = defaultdict(list)
+       self.statuses: Dict[str, Counter] = defaultdict(Counter)
+       self.errors: Counter = Counter()
+       self._lock = threading.Lock()
+
+   def record(self, name: str, elapsed: float, status: str, ok: bool):
+       with self._lock:
+           self.timings[name].append(elapsed)
+           self.statuses[name][status] += 1
+           if not ok:
+               self.errors[name] += 1
+
+class Worker:
+   """
+   One load-generating thread with its own keep-alive connection.
+   """
+
+   def __init__(self, base_url: str, users: List[LoadUser], recorder: Recorder, rng: random.Random,
+                timeout: float):
+       parts = urlsplit(base_url)
+       self.host = parts.hostname or "127.0.0.1"
+       self.port = parts.port or (443 if parts.scheme == "https" else 80)
+       self.https = parts.scheme == "https"
+       self.users = users
+       self.recorder = recorder
+       self.rng = rng
+       self.timeout = timeout
+       self.connection: Optional[http.client.HTTPConnection] = None
+
+   def _connect(self) -> http.client.HTTPConnection:
+       if self.connection is None:
+           factory = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+           self.connection = factory(self.host, self.port, timeout=self.timeout)
+       return self.connection
+
+   def request(self, method: str, path: str, body: Any = None, headers: Optional[Dict[str, str]] = None,
+               raw: Optional[bytes] = None) -> Tuple[int, bytes]:
+       """Send a request and return (status, body); status 0 means a connection error."""
+       payload = raw if raw is not None else (json.dumps(body).encode("utf-8") if body is not None else None)
+       request_headers = {"Content-Type": "application/json"} if payload is not None else {}
+       request_headers.update(headers or {})
+       try:
+           connection = self._connect()
+           connection.request(method, path, body=payload, headers=request_headers)
+           response = connection.getresponse()
+           data = response.read()
+           if response.getheader("Connection", "").lower() == "close":
+               self.close()
+           return response.status, data
+       except (OSError, http.client.HTTPException):
+           self.close()
+           return 0, b""
+
+   def close(self):
+       if self.connection is not None:
+           self.connection.close()
+           self.connection = None
+
+   def call(self, name: str, method: str, path: str, body: Any = None, headers: Optional[Dict[str, str]] = None,
+            expected: Tuple[int, ...] = (200,), raw: Optional[bytes] = None) -> Tuple[int, bytes]:
+       """Send a timed request and record it under `name`."""
+       start = time.perf_counter()
+       status, data = self.request(method, path, body, headers, raw)
+       elapsed = time.perf_counter() - start
+       self.recorder.record(name, elapsed, str(status) if status else "connection_error", status in expected)
+       return status, data
+
+   def user(self) -> LoadUser:
+       return self.rng.choice(self.users)
+
+   def auth(self, user: LoadUser) -> Dict[str, str]:
+       return {"Authorization": f"Bearer {user.token}"}
+
+def _window(rng: random.Random, days: int) -> Tuple[str, str]:
+   """Return an ISO start/end window beginning on a random day within the next two weeks."""
+   start = datetime.combine(date.today() + timedelta(days=rng.randint(0, 14)), datetime.min.time())
+   return start.isoformat(), (start + timedelta(days=days)).isoformat()
+
+# Scenarios: one function per endpoint, each issuing exactly one timed request
+
+def _root(w: Worker, name: str):
+   w.call(name, "GET", "/")
+
+def _health(w: Worker, name: str):
+   w.call(name, "GET", "/health")
+
+def _metrics(w: Worker, name: str):
+   w.call(name, "GET", "/metrics")
+
+def _login(w: Worker, name: str):
+   user = w.user()
+   w.call(name, "POST", "/auth", {"username": user.username, "password": user.password})
+
+def _logout(w: Worker, name: str):
+   # Log in for a throwaway token so the shared tokens stay valid
+   user = w.user()
+   status, data = w.request("POST", "/auth", {"username": user.username, "password": user.password})
+   if status == 200:
+       token = json.loads(data).get("token")
+       w.call(name, "POST", "/auth/logout", headers={"Authorization": f"Bearer {token}"})
+
+def _save(w: Worker, name: str):
+   user = w.user()
+   w.call(name, "POST", "/schedule/save",
+          {"user_id": user.user_id, "schedule_data": synthetic_weekday_schedule(w.rng, w.rng.randint(2, 6))},
+          w.auth(user))
+
+def _ai_save(w: Worker, name: str):
+   user = w.user()
+   w.call(name, "POST", "/schedule/ai-save",
+          {"user_id": user.user_id, "schedule_data": synthetic_weekday_schedule(w.rng, w.rng.randint(2, 6))},
+          w.auth(user))
+
+def _bulk_save(w: Worker, name: str):
+   users = w.rng.sample(w.users, min(20, len(w.users)))
+   lines = "\n".join(
+       json.dumps({"user_id": user.user_id, "schedule_data": synthetic_weekday_schedule(w.rng, 4)})
+       for user in users
+   )
+   w.call(name, "POST", "/schedule/bulk-save", raw=lines.encode("utf-8"),
+          headers={"Content-Type": "application/x-ndjson"})
+
+def _generate(w: Worker, name: str):
+   user = w.user()
+   w.call(name, "POST", "/schedule/generate", {"user_id": user.user_id, "user_prompt": w.rng.choice(PROMPTS)},
+          w.auth(user))
+
+def _get(w: Worker, name: str):
+   w.call(name, "GET", f"/schedule/{w.user().user_id}")
+
+def _ics(w: Worker, name: str):
+   w.call(name, "GET", f"/schedule/{w.user().user_id}.ics", expected=(200, 304))
+
+def _patch(w: Worker, name: str):
+   user = w.user()
+   day = w.rng.choice(["monday", "tuesday", "wednesday", "thursday", "friday"])
+   tasks = synthetic_weekday_schedule(w.rng, w.rng.randint(1, 5))[day]
+   w.call(name, "PATCH", f"/schedule/{user.user_id}",
+          {"operations": [{"op": "replace_day", "day": day, "tasks": tasks}]}, w.auth(user))
+
+def _versions(w: Worker, name: str):
+   w.call(name, "GET", f"/schedule/{w.user().user_id}/versions")
+
+def _version(w: Worker, name: str):
+   w.call(name, "GET", f"/schedule/{w.user().user_id}/versions/1")
+
+def _diff(w: Worker, name: str):
+   w.call(name, "GET", f"/schedule/{w.user().user_id}/versions/2/diff")
+
+def _restore(w: Worker, name: str):
+   user = w.user()
+   w.call(name, "POST", f"/schedule/{user.user_id}/versions/1/restore", headers=w.auth(user))
+
+def _occurrences(w: Worker, name: str):
+   start, end = _window(w.rng, 7)
+   w.call(name, "GET", f"/schedule/{w.user().user_id}/occurrences?start={start[:10]}&end={end[:10]}")
+
+def _next(w: Worker, name: str):
+   w.call(name, "GET", f"/schedule/{w.user().user_id}/next?limit=5")
+
+def _free(w: Worker, name: str):
+   start, end = _window(w.rng, 2)
+   w.call(name, "GET", f"/schedule/{w.user().user_id}/free?start={start}&end={end}&min_minutes=30")
+
+def _group_free(w: Worker, name: str):
+   start, end = _window(w.rng, 5)
+   users = w.rng.sample(w.users, min(25, len(w.users)))
+   w.call(name, "POST", "/schedule/group/free",
+          {"user_ids": [user.user_id for user in users], "start": start, "end": end, "min_minutes": 30})
+
+def _export(w: Worker, name: str):
+   w.call(name, "GET", "/schedules/export")
+
+SCENARIOS: Dict[str, Callable[[Worker, str], None]] = {
+   "GET /": _root,
+   "GET /health": _health,
+   "GET /metrics": _metrics,
+   "POST /auth": _login,
+   "POST /auth/logout": _logout,
+   "POST /schedule/save": _save,
+   "POST /schedule/ai-save": _ai_save,
+   "POST /schedule/bulk-save": _bulk_save,
+   "POST /schedule/generate": _generate,
+   "GET /schedule/{user_id}": _get,
+   "GET /schedule/{user_id}.ics": _ics,
+   "PATCH /schedule/{user_id}": _patch,
+   "GET /schedule/{user_id}/versions": _versions,
+   "GET /schedule/{user_id}/versions/{version}": _version,
+   "GET /schedule/{user_id}/versions/{version}/diff": _diff,
+   "POST /schedule/{user_id}/versions/{version}/restore": _restore,
+   "GET /schedule/{user_id}/occurrences": _occurrences,
+   "GET /schedule/{user_id}/next": _next,
+   "GET /schedule/{user_id}/free": _free,
+   "POST /schedule/group/free": _group_free,
+   "GET /schedules/export": _export
+}
+
+def setup_users(base_url: str, count: int, rng: random.Random, timeout: float) -> List[LoadUser]:
+   """Register users and save two schedules for each (so versions 1 and 2 exist)."""
+   worker = Worker(base_url, [], Recorder(), rng, timeout)
+   run_id = secrets.token_hex(4)
+   users = []
+   for index in range(count):
+       username, password = f"load-{run_id}-{index}", secrets.token_hex(8)
+       status, data = worker.request("POST", "/auth", {"username": username, "password": password})
+       if status != 200:
+           raise SystemExit(f"Could not register load test user ({status}): {data[:200]!r}")
+       response = json.loads(data)
+       user = LoadUser(username, password, response["user_id"], response["token"])
+       for _ in range(2):
+           status, data = worker.request("POST", "/schedule/save",
+                                         {"user_id": user.user_id, "schedule_data": synthetic_weekday_schedule(rng, 4)},
+                                         worker.auth(user))
+           if status != 200:
+               raise SystemExit(f"Could not seed schedule ({status}): {data[:200]!r}")
+       users.append(user)
+   worker.close()
+   return users
+
+def run_load(args: argparse.Namespace, users: List[LoadUser], weights: Dict[str, float]) -> Tuple[Recorder, float]:
+   """Run the request mix from --concurrency threads; return the recorder and wall time."""
+   recorder = Recorder()
+   names = list(weights)
+   weight_values = [weights[name] for name in names]
+   deadline = time.monotonic() + args.duration
+   remaining = [args.requests] if args.requests else None
+   lock = threading.Lock()
+
+   def take() -> bool:
+       if time.monotonic() >= deadline:
+           return False
+       if remaining is None:
+           return True
+       with lock:
+           remaining[0] -= 1
+           return remaining[0] >= 0
+
+   def run(seed: int):
+       worker = Worker(args.base_url, users, recorder, random.Random(seed), args.timeout)
+       try:
+           while take():
+               name = worker.rng.choices(names, weights=weight_values)[0]
+               SCENARIOS[name](worker, name)
+       finally:
+           worker.close()
+
+   threads = [threading.Thread(target=run, args=(args.seed + index,), daemon=True) for index in range(args.concurrency)]
+   start = time.perf_counter()
+   for thread in threads:
+       thread.start()
+   for thread in threads:
+       thread.join()
+   return recorder, time.perf_counter() - start
+
+def main():
+   parser = argparse.ArgumentParser(description="Concurrent load test for the scheduling API")
+   parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+   parser.add_argument("--concurrency", type=int, default=16)
+   parser.add_argument("--duration", type=float, default=30, help="seconds to run")
+   parser.add_argument("--requests", type=int, default=0, help="stop after this many requests (0 = no limit)")
+   parser.add_argument("--users", type=int, default=50)
+   parser.add_argument("--timeout", type=float, default=120)
+   parser.add_argument("--only", nargs="*", help="endpoints to include, e.g. \"GET /schedule/{user_id}\"")
+   parser.add_argument("--skip-generate", action="store_true", help="leave out POST /schedule/generate")
+   parser.add_argument("--weights", help="JSON object overriding endpoint weights")
+   parser.add_argument("--seed", type=int, default=42)
+   parser.add_argument("--output", help="write results as JSON to this file")
+   args = parser.parse_args()
+
+   weights = dict(DEFAULT_WEIGHTS)
+   if args.weights:
+       weights.update(json.loads(args.weights))
+   if args.only:
+       weights = {name: weights[name] for name in args.only}
+   if args.skip_generate:
+       weights.pop("POST /schedule/generate", None)
+   weights = {name: weight for name, weight in weights.items() if weight > 0}
+   unknown = set(weights) - set(SCENARIOS)
+   if unknown:
+       raise SystemExit(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+
+   rng = random.Random(args.seed)
+   print(f"registering {args.users} users at {args.base_url}...")
+   users = setup_users(args.base_url, args.users, rng, args.timeout)
+   print(f"running {args.concurrency} workers for {args.duration:g}s...")
+   recorder, wall_seconds = run_load(args, users, weights)
+
+   results = []
+   total_requests = sum(len(timings) for timings in recorder.timings.values())
+   total_errors = sum(recorder.errors.values())
+   print(f"{'endpoint':<52} {'count':>7} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+   for name in sorted(recorder.timings, key=lambda key: -len(recorder.timings[key])):
+       timings = recorder.timings[name]
+       result = summarize(name, timings)
+       result["p95_ms"] = round(percentile(sorted(timings), 0.95) * 1000, 4)
+       result["throughput"] = round(len(timings) / wall_seconds, 2)
+       result["errors"] = recorder.errors[name]
+       result["error_rate"] = round(recorder.errors[name] / len(timings), 4)
+       result["statuses"] = dict(recorder.statuses[name])
+       results.append(result)
+       print(f"{name:<52} {len(timings):>7} {result['throughput']:>8.1f} {result['p50_ms']:>9.1f} "
+             f"{result['p95_ms']:>9.1f} {result['p99_ms']:>9.1f} {result['error_rate']:>7.1%}")
+
+   print(f"total: {total_requests} requests in {wall_seconds:.1f}s = {total_requests / wall_seconds:.1f} req/s, "
+         f"error rate {total_errors / max(1, total_requests):.2%}")
+   if args.output:
+       write_results(args.output, results, **vars(args),
+                     total_requests=total_requests, wall_seconds=round(wall_seconds, 3),
+                     throughput=round(total_requests / wall_seconds, 2))
+       print(f"results written to {args.output}")
+
+if __name__ == "__main__":
+   main()
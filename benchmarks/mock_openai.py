@@ -0,0 +1,323 @@
+"""
+Local mock of the OpenAI chat completions and embeddings API for offline load tests.
+
+Chat completions return canned schedule JSON for the coming days: valid
+schedules by default, or (at --invalid-rate) output that fails validation in
+one of the ways real models fail: malformed JSON, overlapping tasks, bad
+time formats or an empty object. Requests with "stream": true are answered
+with server-sent events, the content split into --stream-chunk-chars pieces
+spread over the sampled latency. Embeddings are deterministic pseudo-random
+unit vectors derived from the input text. Latency follows a configurable
+distribution, and requests can fail with 429 (rate limited) or 500 errors.
+
+Point the API at the mock before starting it:
+    python -m benchmarks.mock_openai --port 8100 --latency-ms 800 --rate-limit-rate 0.02
+    OPENAI_BASE_URL=http://127.0.0.1:8100/v1 OPENAI_API_KEY=sk-mock python main.py
+
+GET /_mock/stats returns the number of requests served per endpoint and outcome.
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from collections import Counter
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from benchmarks.synthetic import synthetic_date_schedule
+
+INVALID_KINDS = ["malformed_json", "overlap", "bad_time", "empty"]
+
+class LatencyModel:
+   """
+   Samples response latencies in seconds.
+
+   Distributions: "fixed", "uniform" (mean +/- jitter), "normal" (stddev = jitter)
+   and "lognormal" (median = mean, long right tail controlled by jitter).
+   """
+
+   def __init__(self, distribution: str, mean_ms: float, jitter_ms: float, rng: random.Random):
+       self.distribution = distribution
+       self.mean = mean_ms / 1000
+       self.jitter = jitter_ms / 1000
+       self.rng = rng
+       self._lock = threading.Lock()
+
+   def sample(self) -> float:
+       with self._lock:
+           if self.distribution == "uniform":
+               value = self.rng.uniform(self.mean - self.jitter, self.mean + self.jitter)
+           elif self.distribution == "normal":
+               value = self.rng.gauss(self.mean, self.jitter)
+           elif self.distribution == "lognormal" and self.mean > 0:
+               sigma = self.jitter / self.mean if self.mean else 0.0
+               value = self.mean * math.exp(self.rng.gauss(0.0, sigma))
+           else:
+               value = self.mean
+       return max(0.0, value)
+
+class MockState:
+   """
+   Configuration and counters shared by all request handler threads.
+   """
+
+   def __init__(self, args: argparse.Namespace):
+       self.args = args
+       self.rng = random.Random(args.seed)
+       self.chat_latency = LatencyModel(args.latency_dist, args.latency_ms, args.latency_jitter_ms, random.Random(args.seed + 1))
+       self.embedding_latency = LatencyModel(args.latency_dist, args.embedding_latency_ms, args.latency_jitter_ms / 4,
+                                             random.Random(args.seed + 2))
+       self.stats: Counter = Counter()
+       self.in_flight = 0
+       self._lock = threading.Lock()
+
+   def random(self) -> float:
+       with self._lock:
+           return self.rng.random()
+
+   def record(self, key: str):
+       with self._lock:
+           self.stats[key] += 1
+
+   def enter(self) -> bool:
+       """Admit a request unless --max-concurrency requests are already in flight."""
+       with self._lock:
+           if self.args.max_concurrency and self.in_flight >= self.args.max_concurrency:
+               return False
+           self.in_flight += 1
+           return True
+
+   def leave(self):
+       with self._lock:
+           self.in_flight -= 1
+
+   def schedule_content(self) -> str:
+       """Return canned LLM output: a valid schedule, or at --invalid-rate an invalid one."""
+       with self._lock:
+           schedule = synthetic_date_schedule(self.rng, self.args.days, self.args.tasks_per_day, start=date.today())
+           kind = self.rng.choice(INVALID_KINDS) if self.rng.random() < self.args.invalid_rate else None
+           self.stats[f"chat_output_{kind or 'valid'}"] += 1
+
+       if kind == "malformed_json":
+           return json.dumps(schedule)[:-20]
+       if kind == "empty":
+           return "{}"
+       first_day = next(iter(schedule.values()))
+       if kind == "overlap" and len(first_day) > 1:
+           first_day[1]["start_time"] = first_day[0]["start_time"]
+       elif kind == "bad_time":
+           first_day[0]["start_time"] = first_day[0]["start_time"].replace(" ", "").lower()
+       return json.dumps(schedule)
+
+def _estimate_tokens(text: str) -> int:
+   """Rough token count (about four characters per token)."""
+   return max(1, len(text) // 4)
+
+def _embedding(text: str, dimensions: int) -> List[float]:
+   """Deterministic unit vector for a text."""
+   rng = random.Random(hashlib.sha256(text.encode("utf-8")).digest())
+   vector = [rng.gauss(0.0, 1.0) for _ in range(dimensions)]
+   norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+   return [value / norm for value in vector]
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+   """Handles /v1/chat/completions, /v1/embeddings and /_mock/stats."""
+
+   protocol_version = "HTTP/1.1"
+   state: MockState
+
+   def log_message(self, format: str, *args: Any):
+       if self.state.args.verbose:
+           super().log_message(format, *args)
+
+   def _send_json(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+       payload = json.dumps(body).encode("utf-8")
+       self.send_response(status)
+       self.send_header("Content-Type", "application/json")
+       self.send_header("Content-Length", str(len(payload)))
+       for name, value in (headers or {}).items():
+           self.send_header(name, value)
+       self.end_headers()
+       self.wfile.write(payload)
+
+   def _send_error(self, status: int, error_type: str, message: str, headers: Optional[Dict[str, str]] = None):
+       self._send_json(status, {"error": {"message": message, "type": error_type, "param": None, "code": error_type}},
+                       headers)
+
+   def do_GET(self):
+       if self.path == "/_mock/stats":
+           self._send_json(200, {"in_flight": self.state.in_flight, "requests": dict(self.state.stats)})
+       else:
+           self._send_error(404, "not_found", f"Unknown path {self.path}")
+
+   def do_POST(self):
+       length = int(self.headers.get("Content-Length") or 0)
+       try:
+           body = json.loads(self.rfile.read(length) or b"{}")
+       except ValueError:
+           self._send_error(400, "invalid_request_error", "Request body is not valid JSON")
+           return
+
+       path = self.path.split("?")[0].rstrip("/")
+       if path.endswith("/chat/completions"):
+           endpoint, latency = "chat", self.state.chat_latency
+       elif path.endswith("/embeddings"):
+           endpoint, latency = "embeddings", self.state.embedding_latency
+       else:
+           self._send_error(404, "not_found", f"Unknown path {self.path}")
+           return
+
+       # 429s are returned immediately, like a gateway rejection; 500s after the simulated latency
+       if not self.state.enter():
+           self.state.record(f"{endpoint}_429_concurrency")
+           self._send_error(429, "rate_limit_exceeded", "Too many concurrent requests", {"Retry-After": "1"})
+           return
+       try:
+           roll = self.state.random()
+           if roll < self.state.args.rate_limit_rate:
+               self.state.record(f"{endpoint}_429")
+               self._send_error(429, "rate_limit_exceeded", "Rate limit reached for requests",
+                                {"Retry-After": str(self.state.args.retry_after)})
+               return
+           delay = latency.sample()
+           if endpoint == "chat" and body.get("stream") and roll >= self.state.args.rate_limit_rate + self.state.args.error_rate:
+               self.state.record("chat_200_stream")
+               self._send_stream(body, delay)
+               return
+           time.sleep(delay)
+           if roll < self.state.args.rate_limit_rate + self.state.args.error_rate:
+               self.state.record(f"{endpoint}_500")
+               self._send_error(500, "server_error", "The server had an error while processing your request")
+               return
+
+           self.state.record(f"{endpoint}_200")
+           if endpoint == "chat":
+               self._send_json(200, self._chat_response(body))
+           else:
+               self._send_json(200, self._embeddings_response(body))
+       finally:
+           self.state.leave()
+
+   def _chat_response(self, body: Dict[str, Any]) -> Dict[str, Any]:
+       content = self.state.schedule_content()
+       prompt_tokens = sum(_estimate_tokens(str(message.get("content", ""))) for message in body.get("messages", []))
+       completion_tokens = _estimate_tokens(content)
+       return {
+           "id": f"chatcmpl-mock-{int(time.time() * 1000)}",
+           "object": "chat.completion",
+           "created": int(time.time()),
+           "model": body.get("model", "mock"),
+           "choices": [{
+               "index": 0,
+               "message": {"role": "assistant", "content": content},
+               "finish_reason": "stop"
+           }],
+           "usage": {
+               "prompt_tokens": prompt_tokens,
+               "completion_tokens": completion_tokens,
+               "total_tokens": prompt_tokens + completion_tokens
+           }
+       }
+
+   def _send_stream(self, body: Dict[str, Any], duration: float):
+       """
+       Send a chat completion as server-sent events: a tenth of the latency before
+       the first chunk, the rest spread evenly over the chunks. Clients that close
+       the connection early (after rejecting the partial output) are counted.
+       """
+       content = self.state.schedule_content()
+       size = max(1, self.state.args.stream_chunk_chars)
+       pieces = [content[i:i + size] for i in range(0, len(content), size)]
+       completion_id = f"chatcmpl-mock-{int(time.time() * 1000)}"
+       base = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+               "model": body.get("model", "mock")}
+
+       def event(choices: List[Dict[str, Any]], **extra: Any) -> bytes:
+           return f"data: {json.dumps(dict(base, choices=choices, **extra))}\n\n".encode("utf-8")
+
+       self.send_response(200)
+       self.send_header("Content-Type", "text/event-stream")
+       self.send_header("Cache-Control", "no-cache")
+       self.send_header("Connection", "close")
+       self.end_headers()
+       self.close_connection = True
+       try:
+           time.sleep(duration / 10)
+           interval = duration * 0.9 / len(pieces)
+           self.wfile.write(event([{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}]))
+           for piece in pieces:
+               time.sleep(interval)
+               self.wfile.write(event([{"index": 0, "delta": {"content": piece}, "finish_reason": None}]))
+               self.wfile.flush()
+           self.wfile.write(event([{"index": 0, "delta": {}, "finish_reason": "stop"}]))
+           if (body.get("stream_options") or {}).get("include_usage"):
+               prompt_tokens = sum(_estimate_tokens(str(message.get("content", ""))) for message in body.get("messages", []))
+               completion_tokens = _estimate_tokens(content)
+               self.wfile.write(event([], usage={"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                                                 "total_tokens": prompt_tokens + completion_tokens}))
+           self.wfile.write(b"data: [DONE]\n\n")
+           self.wfile.flush()
+       except (BrokenPipeError, ConnectionResetError):
+           self.state.record("chat_stream_closed_early")
+
+   def _embeddings_response(self, body: Dict[str, Any]) -> Dict[str, Any]:
+       inputs = body.get("input", [])
+       if isinstance(inputs, str):
+           inputs = [inputs]
+       dimensions = int(body.get("dimensions") or self.state.args.embedding_dim)
+       return {
+           "object": "list",
+           "model": body.get("model", "mock"),
+           "data": [
+               {"object": "embedding", "index": index, "embedding": _embedding(str(text), dimensions)}
+               for index, text in enumerate(inputs)
+           ],
+           "usage": {"prompt_tokens": sum(_estimate_tokens(str(text)) for text in inputs),
+                     "total_tokens": sum(_estimate_tokens(str(text)) for text in inputs)}
+       }
+
+def build_parser() -> argparse.ArgumentParser:
+   parser = argparse.ArgumentParser(description="Mock OpenAI API server for offline load tests")
+   parser.add_argument("--host", default="127.0.0.1")
+   parser.add_argument("--port", type=int, default=8100)
+   parser.add_argument("--latency-dist", choices=["fixed", "uniform", "normal", "lognormal"], default="lognormal")
+   parser.add_argument("--latency-ms", type=float, default=800, help="mean (median for lognormal) chat latency")
+   parser.add_argument("--latency-jitter-ms", type=float, default=300)
+   parser.add_argument("--embedding-latency-ms", type=float, default=60)
+   parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of requests answered with 429")
+   parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429 responses")
+   parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 500")
+   parser.add_argument("--max-concurrency", type=int, default=0, help="answer 429 above this many in-flight requests")
+   parser.add_argument("--invalid-rate", type=float, default=0.0, help="fraction of schedules that fail validation")
+   parser.add_argument("--stream-chunk-chars", type=int, default=16,
+                       help="characters of content per server-sent event for streamed chat completions")
+   parser.add_argument("--days", type=int, default=7)
+   parser.add_argument("--tasks-per-day", type=int, default=6)
+   parser.add_argument("--embedding-dim", type=int, default=1536)
+   parser.add_argument("--seed", type=int, default=42)
+   parser.add_argument("--verbose", action="store_true")
+   return parser
+
+def make_server(args: argparse.Namespace) -> ThreadingHTTPServer:
+   """Create (but do not start) a mock server for the given options."""
+   handler = type("ConfiguredMockOpenAIHandler", (MockOpenAIHandler,), {"state": MockState(args)})
+   server = ThreadingHTTPServer((args.host, args.port), handler)
+   server.daemon_threads = True
+   return server
+
+def main():
+   args = build_parser().parse_args()
+   server = make_server(args)
+   print(f"mock OpenAI API listening on http://{args.host}:{server.server_address[1]}/v1")
+   try:
+       server.serve_forever()
+   except KeyboardInterrupt:
+       pass
+   finally:
+       server.server_close()
+
+if __name__ == "__main__":
+   main()
@@ -0,0 +1,59 @@
+"""
+Benchmark for password hashing throughput.
+
+Measures how many logins (one password verification each) per second a single
+core sustains at the configured cost factor, and how throughput scales on the
+dedicated password hashing pool.
+
+Usage:
+    PASSWORD_HASH_ITERATIONS=600000 python -m benchmarks.password_hashing --logins 50
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import password_hashing # type: ignore
+from benchmarks.runner import summarize, write_results
+
+def main():
+   parser = argparse.ArgumentParser(description="Benchmark password hashing throughput")
+   parser.add_argument("--logins", type=int, default=50)
+   parser.add_argument("--workers", type=int, default=password_hashing.PASSWORD_HASH_WORKERS)
+   parser.add_argument("--output", help="write results as JSON to this file")
+   args = parser.parse_args()
+
+   stored = password_hashing.hash_password("correct horse battery staple")
+
+   # Single core: verifications back to back on one thread
+   timings = []
+   for _ in range(args.logins):
+       start = time.perf_counter()
+       password_hashing.verify_password("correct horse battery staple", stored)
+       timings.append(time.perf_counter() - start)
+   single_seconds = sum(timings)
+
+   # Worker pool: the same work spread over the pool's threads
+   with ThreadPoolExecutor(max_workers=args.workers) as executor:
+       start = time.perf_counter()
+       list(executor.map(lambda _: password_hashing.verify_password("correct horse battery staple", stored),
+                         range(args.logins)))
+       pool_seconds = time.perf_counter() - start
+
+   print(f"algorithm={password_hashing.PASSWORD_HASH_ALGORITHM} iterations={password_hashing.PASSWORD_HASH_ITERATIONS} "
+         f"cpus={os.cpu_count()}")
+   print(f"single core: {args.logins / single_seconds:.1f} logins/sec ({single_seconds / args.logins * 1000:.1f} ms/login)")
+   print(f"pool of {args.workers}: {args.logins / pool_seconds:.1f} logins/sec "
+         f"({args.logins / pool_seconds / args.workers:.1f} logins/sec per worker)")
+
+   if args.output:
+       results = [
+           summarize("verify_password", timings, algorithm=password_hashing.PASSWORD_HASH_ALGORITHM,
+                     iterations=password_hashing.PASSWORD_HASH_ITERATIONS),
+           {"name": "verify_password_pool", "ops_per_second": round(args.logins / pool_seconds, 2),
+            "params": {"workers": args.workers}}
+       ]
+       write_results(args.output, results, **vars(args))
+       print(f"results written to {args.output}")
+
+if __name__ == "__main__":
+   main()
@@ -0,0 +1,109 @@
+"""
+Timing and reporting helpers shared by the benchmarks.
+
+measure() times a callable over many iterations and summarizes throughput
+and latency percentiles; write_results() stores a run as JSON together with
+enough machine and code metadata to compare runs (see benchmarks.compare).
+"""
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+   """Nearest-rank percentile of an ascending list."""
+   if not sorted_values:
+       return 0.0
+   rank = max(1, math.ceil(fraction * len(sorted_values)))
+   return sorted_values[rank - 1]
+
+def summarize(name: str, timings: List[float], **params: Any) -> Dict[str, Any]:
+   """
+   Summarize per-call timings (in seconds).
+
+   Returns:
+       Dict[str, Any]: Throughput and latency statistics in milliseconds
+   """
+   ordered = sorted(timings)
+   total = sum(ordered)
+   return {
+       "name": name,
+       "iterations": len(ordered),
+       "total_seconds": round(total, 6),
+       "ops_per_second": round(len(ordered) / total, 2) if total else None,
+       "mean_ms": round(total / len(ordered) * 1000, 4) if ordered else None,
+       "p50_ms": round(percentile(ordered, 0.50) * 1000, 4),
+       "p99_ms": round(percentile(ordered, 0.99) * 1000, 4),
+       "min_ms": round(ordered[0] * 1000, 4) if ordered else None,
+       "max_ms": round(ordered[-1] * 1000, 4) if ordered else None,
+       "params": params
+   }
+
+def measure(name: str, func: Callable[[], Any], iterations: int = 100, warmup: int = 5,
+            **params: Any) -> Dict[str, Any]:
+   """
+   Time func() individually over `iterations` calls after `warmup` untimed calls.
+
+   Args:
+       name (str): Benchmark name, used to match results across runs
+       func (Callable): Zero-argument callable to time
+       iterations (int): Number of timed calls
+       warmup (int): Number of untimed calls first
+       **params: Input sizes recorded alongside the result
+
+   Returns:
+       Dict[str, Any]: Result as produced by summarize()
+   """
+   for _ in range(warmup):
+       func()
+   timings = []
+   for _ in range(iterations):
+       start = time.perf_counter()
+       func()
+       timings.append(time.perf_counter() - start)
+   return summarize(name, timings, **params)
+
+def format_result(result: Dict[str, Any]) -> str:
+   """Format a result as one line of human-readable output."""
+   return (f"{result['name']:<32} {result['ops_per_second'] or 0:>12.1f} ops/s  "
+           f"p50 {result['p50_ms']:>9.3f} ms  p99 {result['p99_ms']:>9.3f} ms")
+
+def _git_commit() -> Optional[str]:
+   """Return the current git commit, if available."""
+   try:
+       return subprocess.run(
+           ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True, timeout=5
+       ).stdout.strip()
+   except (OSError, subprocess.SubprocessError):
+       return None
+
+def run_metadata(**parameters: Any) -> Dict[str, Any]:
+   """Describe the machine, interpreter and code a run was measured on."""
+   return {
+       "timestamp": datetime.now(timezone.utc).isoformat(),
+       "git_commit": _git_commit(),
+       "python": sys.version.split()[0],
+       "implementation": platform.python_implementation(),
+       "platform": platform.platform(),
+       "machine": platform.machine(),
+       "cpu_count": os.cpu_count(),
+       "parameters": parameters
+   }
+
+def write_results(path: str, results: List[Dict[str, Any]], **parameters: Any):
+   """
+   Write benchmark results and run metadata to a JSON file.
+
+   Args:
+       path (str): Output file
+       results (List[Dict[str, Any]]): Results from measure() or summarize()
+       **parameters: Command line parameters of the run
+   """
+   with open(path, "w") as f:
+       json.dump({"metadata": run_metadata(**parameters), "results": results}, f, indent=2)
+       f.write("\n")
@@ -0,0 +1,103 @@
+"""
+Benchmark for compressed schedule storage: database size against read and write latency.
+
+Stores the same multi-month schedules once per codec ("none", "zlib" and, when
+the zstandard package is installed, "zstd") in a temporary SQLite file, and
+reports the file size after VACUUM next to save_schedule, get_schedule and
+get_schedule_raw latencies.
+
+Usage:
+    python -m benchmarks.schedule_storage --users 200 --days 90 --tasks-per-day 8 --output storage.json
+"""
+import argparse
+import itertools
+import os
+import random
+import shutil
+import tempfile
+from datetime import date
+from benchmarks.runner import measure, format_result, write_results
+from benchmarks.synthetic import synthetic_date_schedule
+import database # type: ignore
+import serialization # type: ignore
+
+def _codecs():
+   codecs = ["none", "zlib"]
+   if serialization.zstandard is not None:
+       codecs.append("zstd")
+   return codecs
+
+def _run_codec(codec: str, schedules, args):
+   """Store every schedule with one codec and time saves and reads."""
+   directory = tempfile.mkdtemp(prefix="schedule-storage-bench-")
+   previous_codec = serialization.SCHEDULE_COMPRESSION
+   serialization.SCHEDULE_COMPRESSION = codec
+   database.DATABASE_FILE = os.path.join(directory, "bench.db")
+   try:
+       database.init_database()
+       conn = database.create_connection()
+       conn.executemany("INSERT INTO users (username, password) VALUES (?, ?)",
+                        [(f"bench-user-{i}", "x") for i in range(args.users)])
+       conn.commit()
+       conn.close()
+
+       for user_index, schedule in enumerate(schedules):
+           database.save_schedule(user_index + 1, schedule)
+       conn = database.create_connection()
+       conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+       conn.execute("VACUUM")
+       stored_bytes = conn.execute("SELECT SUM(LENGTH(schedule_data)) FROM schedules").fetchone()[0]
+       conn.close()
+       file_bytes = os.path.getsize(database.DATABASE_FILE)
+
+       sizes = {"codec": codec, "users": args.users, "days": args.days, "tasks_per_day": args.tasks_per_day,
+                "db_file_bytes": file_bytes, "stored_bytes": stored_bytes}
+       saves = itertools.cycle(range(args.users))
+       gets = itertools.cycle(range(args.users))
+
+       def save():
+           user_index = next(saves)
+           database.save_schedule(user_index + 1, schedules[user_index])
+
+       return [
+           measure(f"save_schedule[{codec}]", save, args.iterations, **sizes),
+           measure(f"get_schedule[{codec}]", lambda: database.get_schedule(next(gets) + 1), args.iterations, **sizes),
+           measure(f"get_schedule_raw[{codec}]", lambda: database.get_schedule_raw(next(gets) + 1),
+                   args.iterations, **sizes)
+       ]
+   finally:
+       serialization.SCHEDULE_COMPRESSION = previous_codec
+       shutil.rmtree(directory, ignore_errors=True)
+
+def main():
+   parser = argparse.ArgumentParser(description="Benchmark schedule compression: database size and latency")
+   parser.add_argument("--users", type=int, default=200)
+   parser.add_argument("--days", type=int, default=90)
+   parser.add_argument("--tasks-per-day", type=int, default=8)
+   parser.add_argument("--iterations", type=int, default=200)
+   parser.add_argument("--seed", type=int, default=42)
+   parser.add_argument("--output", help="write results as JSON to this file")
+   args = parser.parse_args()
+
+   rng = random.Random(args.seed)
+   schedules = [synthetic_date_schedule(rng, args.days, args.tasks_per_day, start=date(2025, 1, 1))
+                for _ in range(args.users)]
+   json_bytes = sum(len(serialization.dumps_bytes(schedule)) for schedule in schedules)
+   print(f"{args.users} schedules, {json_bytes / args.users / 1024:.1f} KB of JSON each")
+
+   results = []
+   for codec in _codecs():
+       codec_results = _run_codec(codec, schedules, args)
+       params = codec_results[0]["params"]
+       print(f"{codec}: database file {params['db_file_bytes'] / 2**20:.2f} MB, "
+             f"schedule data {params['stored_bytes'] / 2**20:.2f} MB")
+       for result in codec_results:
+           print(format_result(result))
+       results.extend(codec_results)
+
+   if args.output:
+       write_results(args.output, results, **vars(args))
+       print(f"results written to {args.output}")
+
+if __name__ == "__main__":
+   main()
@@ -0,0 +1,91 @@
+"""
+Synthetic inputs shared by the benchmarks.
+
+Every generator takes a seeded random.Random so runs are reproducible.
+"""
+import json
+import random
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List
+from recurrence import WEEKDAYS # type: ignore
+
+RECURRENCES = ["none", "daily", "weekly", "monthly", "Monday, Wednesday, Friday"]
+
+WORDS = (
+   "assignment lecture exam project deadline review chapter lab report meeting practice "
+   "schedule syllabus quiz reading essay homework team presentation office hours tutorial "
+   "semester midterm final grade submission draft research library study group notes"
+).split()
+
+def _task(rng: random.Random, name: str, start_minute: int, length: int, recurrence: str) -> Dict[str, Any]:
+   """Build a task dict starting start_minute minutes after midnight."""
+   start = datetime(2025, 1, 1) + timedelta(minutes=start_minute)
+   end = start + timedelta(minutes=length)
+   return {
+       "task_name": name,
+       "start_time": start.strftime("%I:%M %p"),
+       "end_time": end.strftime("%I:%M %p"),
+       "priority": rng.random() < 0.25,
+       "recurrence": recurrence
+   }
+
+def _day_tasks(rng: random.Random, tasks_per_day: int, recurrence: str = "") -> List[Dict[str, Any]]:
+   """Generate non-overlapping tasks between 6 AM and 10 PM, in start order."""
+   slots = (22 - 6) * 4
+   tasks_per_day = min(tasks_per_day, slots)
+   starts = sorted(rng.sample(range(slots), tasks_per_day))
+   tasks = []
+   for position, quarter in enumerate(starts):
+       # Tasks end before the next one starts (the validator rejects touching tasks)
+       gap = (starts[position + 1] if position + 1 < len(starts) else slots) - quarter
+       length = rng.randint(1, min(4, gap - 1)) * 15 if gap > 1 else 10
+       tasks.append(_task(
+           rng, f"{rng.choice(WORDS).title()} {quarter}", (6 * 4 + quarter) * 15, length,
+           recurrence or rng.choice(RECURRENCES)
+       ))
+   return tasks
+
+def synthetic_weekday_schedule(rng: random.Random, tasks_per_day: int = 4) -> Dict[str, List[Dict[str, Any]]]:
+   """
+   Generate a weekday schedule (as stored in the database) with weekly tasks.
+   """
+   return {weekday: _day_tasks(rng, tasks_per_day, recurrence="weekly") for weekday in WEEKDAYS}
+
+def synthetic_date_schedule(rng: random.Random, days: int = 7, tasks_per_day: int = 6,
+                            start: date = date(2025, 7, 14)) -> Dict[str, List[Dict[str, Any]]]:
+   """
+   Generate a date-keyed schedule in the MM/DD/YYYY format the LLM is asked to produce.
+   """
+   return {
+       (start + timedelta(days=offset)).strftime("%m/%d/%Y"): _day_tasks(rng, tasks_per_day)
+       for offset in range(days)
+   }
+
+def synthetic_llm_output(rng: random.Random, days: int = 7, tasks_per_day: int = 6) -> str:
+   """Serialize a date-keyed schedule the way the LLM returns it."""
+   return json.dumps(synthetic_date_schedule(rng, days, tasks_per_day), indent=2)
+
+def synthetic_corpus(rng: random.Random, documents: int = 10, paragraphs: int = 20,
+                     sentences: int = 5) -> str:
+   """
+   Generate document text shaped like extracted course material: documents
+   separated by page breaks, paragraphs separated by blank lines, and some
+   repeated boilerplate paragraphs (headers, policies) to exercise deduplication.
+   """
+   boilerplate = [
+       " ".join(rng.choice(WORDS) for _ in range(40)).capitalize() + "."
+       for _ in range(3)
+   ]
+   parts = []
+   for _ in range(documents):
+       body = []
+       for _ in range(paragraphs):
+           if rng.random() < 0.1:
+               body.append(rng.choice(boilerplate))
+               continue
+           body.append(" ".join(
+               " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 20))).capitalize() + "."
+               for _ in range(sentences)
+           ))
+       parts.append("\n\n".join(body))
+   return "\f".join(parts)
@@ -0,0 +1,118 @@
+"""
+Benchmark for vector store query latency and memory: the memory-mapped NumPy store against Chroma.
+
+Each store runs in its own child process so resident memory (RSS) is measured
+in isolation: once before loading the corpus, and again after querying it. Vectors
+are random unit vectors, added with precomputed embeddings, so no embedding
+model is involved. Chroma is skipped when it is not installed.
+
+Usage:
+    python -m benchmarks.vector_store --chunks 500 --dimensions 1536 --queries 500 --output results.json
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from benchmarks.runner import measure, summarize, format_result, write_results
+
+STORES = ["numpy", "chroma"]
+
+def _rss_mb() -> float:
+   """Current resident memory of this process in MB (peak RSS where /proc is unavailable)."""
+   try:
+       with open("/proc/self/statm") as f:
+           return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+   except OSError:
+       peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+       return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+def _open_store(store: str, directory: str):
+   if store == "numpy":
+       from vector_store import NumpyVectorStore # type: ignore
+       return NumpyVectorStore(directory, "bench")
+   import chromadb
+   return chromadb.Client().create_collection(name="bench")
+
+def _run_child(args) -> list:
+   """Load one store and time its queries; runs in the child process."""
+   import numpy as np
+   directory = tempfile.mkdtemp(prefix="vector-bench-")
+   try:
+       try:
+           collection = _open_store(args.child, directory)
+       except ImportError as e:
+           return [{"name": f"{args.child}_skipped", "skipped": str(e)}]
+
+       rng = np.random.default_rng(args.seed)
+       vectors = rng.standard_normal((args.chunks, args.dimensions), dtype=np.float32)
+       vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+       embeddings = vectors.tolist()
+       queries = rng.standard_normal((args.queries, args.dimensions), dtype=np.float32).tolist()
+       ids = [str(i) for i in range(args.chunks)]
+       documents = [f"chunk {i} " + "word " * 90 for i in range(args.chunks)]
+       # Measured after the inputs exist, so the difference is what the store itself holds
+       rss_before = _rss_mb()
+
+       start = time.perf_counter()
+       collection.add(ids=ids, documents=documents, embeddings=embeddings)
+       add_seconds = time.perf_counter() - start
+
+       sizes = {"chunks": args.chunks, "dimensions": args.dimensions, "k": args.k}
+       remaining = iter(queries * 2)
+       query = measure(
+           f"{args.child}_query",
+           lambda: collection.query(query_embeddings=[next(remaining)], n_results=args.k,
+                                    include=["documents", "distances"]),
+           args.queries, warmup=min(args.queries, 20), **sizes
+       )
+       # After the queries, so pages of the mapped file that queries touch are counted
+       rss_loaded = _rss_mb()
+       query["params"].update(rss_before_load_mb=round(rss_before, 1), rss_loaded_mb=round(rss_loaded, 1),
+                              rss_corpus_mb=round(rss_loaded - rss_before, 1))
+       return [summarize(f"{args.child}_add", [add_seconds], **sizes), query]
+   finally:
+       shutil.rmtree(directory, ignore_errors=True)
+
+def main():
+   parser = argparse.ArgumentParser(description="Benchmark vector store query latency and memory")
+   parser.add_argument("--chunks", type=int, default=500)
+   parser.add_argument("--dimensions", type=int, default=1536)
+   parser.add_argument("--queries", type=int, default=500)
+   parser.add_argument("--k", type=int, default=5)
+   parser.add_argument("--seed", type=int, default=42)
+   parser.add_argument("--stores", default=",".join(STORES), help="comma-separated stores to compare")
+   parser.add_argument("--output", help="write results as JSON to this file")
+   parser.add_argument("--child", choices=STORES, help=argparse.SUPPRESS)
+   args = parser.parse_args()
+
+   if args.child:
+       print(json.dumps(_run_child(args)))
+       return
+
+   results = []
+   for store in args.stores.split(","):
+       command = [sys.executable, "-m", "benchmarks.vector_store", "--child", store,
+                  "--chunks", str(args.chunks), "--dimensions", str(args.dimensions),
+                  "--queries", str(args.queries), "--k", str(args.k), "--seed", str(args.seed)]
+       child = subprocess.run(command, capture_output=True, text=True, check=True)
+       for result in json.loads(child.stdout.strip().splitlines()[-1]):
+           if "skipped" in result:
+               print(f"{store}: skipped ({result['skipped']})")
+               continue
+           line = format_result(result)
+           if "rss_loaded_mb" in result["params"]:
+               line += f"  rss {result['params']['rss_loaded_mb']:.1f} MB (+{result['params']['rss_corpus_mb']:.1f})"
+           print(line)
+           results.append(result)
+
+   if args.output:
+       write_results(args.output, results, **vars(args))
+       print(f"results written to {args.output}")
+
+if __name__ == "__main__":
+   main()
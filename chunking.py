@@ -0,0 +1,263 @@
+import hashlib
+import logging
+import os
+import re
+from typing import Any, Dict, List, Optional, Set, Tuple
+from prompt_builder import estimate_tokens # type: ignore
+
+logger = logging.getLogger(__name__)
+
+# Chunking configuration (tunable through environment variables)
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "128"))
+NEAR_DUPLICATE_DISTANCE = int(os.getenv("NEAR_DUPLICATE_DISTANCE", "3"))
+
+# SimHash fingerprints are split into this many bands for candidate lookup; two
+# fingerprints within NEAR_DUPLICATE_DISTANCE bits always agree on at least one band
+# as long as SIMHASH_BANDS > NEAR_DUPLICATE_DISTANCE
+SIMHASH_BITS = 64
+SIMHASH_BANDS = 4
+SIMHASH_SHINGLE = 3
+
+# A page's first or last paragraph is a header or footer when the same text (digits
+# masked) is at that edge on a majority of the document's pages, or on at least this many
+HEADER_MIN_PAGES = 3
+
+# Blocks with fewer words are only deduplicated exactly; fingerprints of very
+# short texts are too coarse to compare
+SIMHASH_MIN_WORDS = 8
+
+PAGE_BREAK = "\f"
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_WORD = re.compile(r"\w+")
+
+def normalize(text: str) -> str:
+   """Lowercase and collapse whitespace."""
+   return " ".join(text.lower().split())
+
+def mask_digits(text: str) -> str:
+   """Normalize and replace digit runs with '#', so page numbers and dates in headers and footers match."""
+   return re.sub(r"\d+", "#", normalize(text))
+
+# Translation tables mapping each byte value to the value of one of its bits (0 or 1)
+_BIT_TABLES = [bytes((value >> bit) & 1 for value in range(256)) for bit in range(8)]
+
+def simhash(text: str) -> int:
+   """
+   64-bit SimHash of a text's word shingles.
+   Texts that share most of their shingles get fingerprints a few bits apart.
+
+   Shingles are hashed with the built-in string hash, which is randomized per
+   process, so fingerprints are only comparable within one process.
+   """
+   words = _WORD.findall(normalize(text))
+   if len(words) < SIMHASH_SHINGLE:
+       shingles = [" ".join(words)]
+   else:
+       shingles = [" ".join(words[i:i + SIMHASH_SHINGLE]) for i in range(len(words) - SIMHASH_SHINGLE + 1)]
+
+   # Count the set bits per position with C-level byte operations: take every
+   # hash's n-th byte, map it to one bit and count the ones
+   data = b"".join((hash(shingle) & 0xFFFFFFFFFFFFFFFF).to_bytes(8, "little") for shingle in shingles)
+   threshold = len(shingles) / 2
+   fingerprint = 0
+   for position in range(SIMHASH_BITS // 8):
+       column = data[position::8]
+       for bit, table in enumerate(_BIT_TABLES):
+           if column.translate(table).count(1) > threshold:
+               fingerprint |= 1 << (position * 8 + bit)
+   return fingerprint
+
+class Deduplicator:
+   """
+   Detects exact and near-duplicate texts across one chunking run.
+
+   Exact duplicates are found by hashing the normalized text. Near duplicates
+   are found with SimHash: fingerprints are indexed by band, and only texts
+   sharing a band are compared by Hamming distance.
+   """
+
+   def __init__(self, max_distance: int = NEAR_DUPLICATE_DISTANCE, bands: int = SIMHASH_BANDS):
+       self.max_distance = max_distance
+       self.bands = bands
+       self.band_bits = SIMHASH_BITS // bands
+       self.exact: set = set()
+       self.buckets: Dict[Tuple[int, int], List[int]] = {}
+       self.exact_duplicates = 0
+       self.near_duplicates = 0
+
+   def _band_keys(self, fingerprint: int) -> List[Tuple[int, int]]:
+       mask = (1 << self.band_bits) - 1
+       return [(band, (fingerprint >> (band * self.band_bits)) & mask) for band in range(self.bands)]
+
+   def is_duplicate(self, text: str) -> bool:
+       """Return True if text duplicates an earlier text; otherwise remember it."""
+       normalized = normalize(text)
+       digest = hashlib.blake2b(normalized.encode("utf-8"), digest_size=16).digest()
+       if digest in self.exact:
+           self.exact_duplicates += 1
+           return True
+       self.exact.add(digest)
+
+       if self.max_distance <= 0 or len(normalized.split()) < SIMHASH_MIN_WORDS:
+           return False
+       fingerprint = simhash(text)
+       keys = self._band_keys(fingerprint)
+       for key in keys:
+           for other in self.buckets.get(key, ()):
+               if bin(fingerprint ^ other).count("1") <= self.max_distance:
+                   self.near_duplicates += 1
+                   return True
+       for key in keys:
+           self.buckets.setdefault(key, []).append(fingerprint)
+       return False
+
+def split_blocks(text: str) -> List[Tuple[int, str]]:
+   """
+   Split a document into (page number, paragraph) blocks.
+   Pages are separated by form feeds, paragraphs by blank lines.
+   """
+   blocks = []
+   for page_number, page in enumerate(text.split(PAGE_BREAK), start=1):
+       for paragraph in _PARAGRAPH_BREAK.split(page):
+           paragraph = " ".join(paragraph.split())
+           if paragraph:
+               blocks.append((page_number, paragraph))
+   return blocks
+
+def repeated_page_edges(blocks: List[Tuple[int, str]], min_pages: int = HEADER_MIN_PAGES) -> Set[int]:
+   """
+   Find page headers and footers among a document's blocks.
+
+   The first and last block of every page are compared with digits masked
+   (page numbers, dates). A text found at the same edge (top or bottom) on a
+   majority of the pages, or on at least min_pages pages, is a header or
+   footer; dated paragraphs that merely happen to start or end a page are not.
+
+   Args:
+       blocks (List[Tuple[int, str]]): (page number, paragraph) blocks from split_blocks
+       min_pages (int): Pages at which a repeated edge text always counts
+
+   Returns:
+       Set[int]: Positions in blocks of every occurrence after the first
+   """
+   pages: Dict[int, List[int]] = {}
+   for position, (page, _) in enumerate(blocks):
+       pages.setdefault(page, []).append(position)
+   page_count = len({page for page, _ in blocks})
+
+   # (edge, masked text) -> block positions, one per page
+   edges: Dict[Tuple[str, str], List[int]] = {}
+   for positions in pages.values():
+       for edge, position in (("top", positions[0]), ("bottom", positions[-1])):
+           edges.setdefault((edge, mask_digits(blocks[position][1])), []).append(position)
+
+   repeated: Set[int] = set()
+   for positions in edges.values():
+       if len(positions) > 1 and (len(positions) * 2 > page_count or len(positions) >= min_pages):
+           repeated.update(positions[1:])
+   return repeated
+
+def split_long_block(block: str, max_tokens: int) -> List[str]:
+   """
+   Split a block that exceeds max_tokens at sentence boundaries,
+   falling back to word boundaries for very long sentences.
+   """
+   pieces: List[str] = []
+   current: List[str] = []
+   current_tokens = 0
+
+   def flush():
+       nonlocal current, current_tokens
+       if current:
+           pieces.append(" ".join(current))
+       current, current_tokens = [], 0
+
+   for sentence in _SENTENCE_END.split(block):
+       sentence_tokens = estimate_tokens(sentence)
+       if sentence_tokens > max_tokens:
+           flush()
+           words = sentence.split()
+           # Roughly max_tokens worth of words per piece
+           step = max(1, len(words) * max_tokens // sentence_tokens)
+           pieces.extend(" ".join(words[i:i + step]) for i in range(0, len(words), step))
+           continue
+       if current_tokens + sentence_tokens > max_tokens:
+           flush()
+       current.append(sentence)
+       current_tokens += sentence_tokens
+   flush()
+   return pieces
+
+def chunk_documents(documents: List[str], max_tokens: int = CHUNK_MAX_TOKENS,
+                    deduplicate: bool = True) -> List[Dict[str, Any]]:
+   """
+   Split documents into token-sized chunks along their structure, without duplicates.
+
+   Paragraphs are packed into chunks of up to max_tokens, never crossing a
+   document boundary; paragraphs that are too long are split at sentences.
+   Repeated paragraphs are dropped before packing: exact and near duplicates,
+   and page headers and footers (see repeated_page_edges). Chunks that are
+   exact or near duplicates of earlier chunks are dropped after, so they are
+   never embedded.
+
+   Args:
+       documents (List[str]): Document texts, pages separated by form feeds
+       max_tokens (int): Maximum tokens per chunk
+       deduplicate (bool): Drop exact and near-duplicate paragraphs and chunks
+
+   Returns:
+       List[Dict[str, Any]]: Chunks as {"id", "text", "document", "page"}
+   """
+   block_filter: Optional[Deduplicator] = Deduplicator() if deduplicate else None
+   chunk_filter: Optional[Deduplicator] = Deduplicator() if deduplicate else None
+   chunks: List[Dict[str, Any]] = []
+   dropped_chunks = 0
+   dropped_headers = 0
+
+   for document_index, text in enumerate(documents):
+       current: List[str] = []
+       current_tokens = 0
+       current_page = 1
+
+       def flush():
+           nonlocal current, current_tokens, dropped_chunks
+           if current:
+               chunk_text = "\n\n".join(current)
+               if chunk_filter is not None and chunk_filter.is_duplicate(chunk_text):
+                   dropped_chunks += 1
+               else:
+                   chunks.append({"id": len(chunks), "text": chunk_text, "document": document_index, "page": current_page})
+           current, current_tokens = [], 0
+
+       blocks = split_blocks(text)
+       headers = repeated_page_edges(blocks) if block_filter is not None else set()
+       dropped_headers += len(headers)
+       for position, (page, block) in enumerate(blocks):
+           if position in headers:
+               continue
+           if block_filter is not None and block_filter.is_duplicate(block):
+               continue
+           block_tokens = estimate_tokens(block)
+           pieces = split_long_block(block, max_tokens) if block_tokens > max_tokens else [block]
+           for piece in pieces:
+               piece_tokens = block_tokens if len(pieces) == 1 else estimate_tokens(piece)
+               if current_tokens + piece_tokens > max_tokens:
+                   flush()
+               if not current:
+                   current_page = page
+               current.append(piece)
+               current_tokens += piece_tokens
+       flush()
+
+   if block_filter is not None and chunk_filter is not None:
+       logger.info(
+           f"Chunked {len(documents)} documents into {len(chunks)} chunks; dropped "
+           f"{block_filter.exact_duplicates + block_filter.near_duplicates + dropped_headers} repeated paragraphs "
+           f"and {dropped_chunks} duplicate chunks"
+       )
+   return chunks
+
+def chunk_text(text: str, max_tokens: int = CHUNK_MAX_TOKENS, deduplicate: bool = True) -> List[Dict[str, Any]]:
+   """Chunk a single document; see chunk_documents."""
+   return chunk_documents([text], max_tokens, deduplicate)
@@ -1,21 +1,58 @@
 import sqlite3
 from sqlite3 import Error
 import os
-import json
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Callable, List, Set, Tuple, Iterator
 from datetime import datetime
+from metrics import timed_query # type: ignore
+from serialization import encode_document, decode_document, document_json # type: ignore
+from schedule_history import latest_versions, version_rows, insert_versions, baseline_rows # type: ignore
 
 # Database configuration
 DATABASE_FILE = "users.db"
+# Seconds a connection waits for another process's write lock before failing with "database is locked"
+DATABASE_BUSY_TIMEOUT = float(os.getenv("DATABASE_BUSY_TIMEOUT", "5"))
 
-def create_connection():
+# PRAGMA user_version once every stored schedule is the latest version of its history
+# (see record_version_baselines)
+SCHEMA_VERSION = 1
+
+# Callbacks invoked with (user_id, schedule_data) after a schedule is saved
+_schedule_listeners: List[Callable[[int, Dict[str, Any]], None]] = []
+
+def register_schedule_listener(listener: Callable[[int, Dict[str, Any]], None]):
+   """
+   Register a callback to be notified whenever a schedule is saved.
+   Used to keep in-memory indexes derived from schedules in sync.
+   
+   Args:
+       listener (Callable): Function called with (user_id, schedule_data)
+   """
+   if listener not in _schedule_listeners:
+       _schedule_listeners.append(listener)
+
+def notify_schedule_saved(user_id: int, schedule_data: Dict[str, Any]):
+   """
+   Notify registered listeners that a schedule has been saved.
+   Listener failures are logged and never affect the save itself.
+   """
+   for listener in _schedule_listeners:
+       try:
+           listener(user_id, schedule_data)
+       except Exception as e:
+           print(f"Error in schedule listener: {e}")
+
+def create_connection(check_same_thread: bool = True):
    """
    Create a database connection to SQLite database.
    Returns a connection object or None if connection fails.
+   
+   Args:
+       check_same_thread (bool): Set to False for connections that are used by
+           one thread at a time but not always the same one (e.g. streaming responses)
    """
    try:
        # Create connection to SQLite database
-       conn = sqlite3.connect(DATABASE_FILE)
+       conn = sqlite3.connect(DATABASE_FILE, timeout=DATABASE_BUSY_TIMEOUT, check_same_thread=check_same_thread)
        return conn
    except Error as e:
        print(f"Error connecting to database: {e}")
@@ -24,15 +61,15 @@ def create_connection():
 def create_users_table():
    """
    Create the users table if it doesn't exist.
-   The table stores username and password as plain text as requested.
+   The password column stores salted KDF hashes (see password_hashing.py);
+   rows created before hashing was introduced are migrated on their next login.
    """
    conn = create_connection()
    if conn is not None:
        try:
            cursor = conn.cursor()
            
-           # Create users table with username and password columns
-           # Both fields are TEXT to store the plain text values
+           # Create users table with username and password hash columns
            create_table_sql = """
            CREATE TABLE IF NOT EXISTS users (
                id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -71,11 +108,28 @@ def create_schedules_table():
                schedule_data TEXT NOT NULL,
                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+               revision INTEGER NOT NULL DEFAULT 0,
                FOREIGN KEY (user_id) REFERENCES users (id)
            );
            """
            
            cursor.execute(create_table_sql)
+           
+           # Tables created before the revision counter existed get it with every row at 0
+           cursor.execute("PRAGMA table_info(schedules)")
+           if "revision" not in {column[1] for column in cursor.fetchall()}:
+               cursor.execute("ALTER TABLE schedules ADD COLUMN revision INTEGER NOT NULL DEFAULT 0")
+           
+           # Covers change stamps and conditional GETs, so they never read the stored document
+           cursor.execute(
+               "CREATE INDEX IF NOT EXISTS idx_schedules_validators ON schedules (user_id, revision, created_at, updated_at)"
+           )
+           
+           # Index schedules by user for the per-user lookups on every read and write
+           cursor.execute("CREATE INDEX IF NOT EXISTS idx_schedules_user_id ON schedules (user_id)")
+           
+           # Index by modification time for incremental exports
+           cursor.execute("CREATE INDEX IF NOT EXISTS idx_schedules_updated_at ON schedules (updated_at)")
            conn.commit()
            print("Schedules table created successfully or already exists.")
            
@@ -86,9 +140,74 @@ def create_schedules_table():
    else:
        print("Error: Could not create database connection.")
 
+def create_schedule_versions_table():
+   """
+   Create the schedule_versions table if it doesn't exist.
+   Each row is either a full snapshot or a delta against the previous version.
+   """
+   conn = create_connection()
+   if conn is not None:
+       try:
+           cursor = conn.cursor()
+           
+           # Versions are unique per user; the unique index also serves per-user lookups
+           create_table_sql = """
+           CREATE TABLE IF NOT EXISTS schedule_versions (
+               id INTEGER PRIMARY KEY AUTOINCREMENT,
+               user_id INTEGER NOT NULL,
+               version INTEGER NOT NULL,
+               is_snapshot INTEGER NOT NULL,
+               data TEXT NOT NULL,
+               created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+               UNIQUE (user_id, version),
+               FOREIGN KEY (user_id) REFERENCES users (id)
+           );
+           """
+
+           cursor.execute(create_table_sql)
+           conn.commit()
+           print("Schedule versions table created successfully or already exists.")
+           
+       except Error as e:
+           print(f"Error creating schedule versions table: {e}")
+       finally:
+           conn.close()
+   else:
+       print("Error: Could not create database connection.")
+
+def create_revoked_sessions_table():
+   """
+   Create the revoked_sessions table if it doesn't exist.
+   The table lists revoked session token IDs until the tokens expire.
+   """
+   conn = create_connection()
+   if conn is not None:
+       try:
+           cursor = conn.cursor()
+           
+           create_table_sql = """
+           CREATE TABLE IF NOT EXISTS revoked_sessions (
+               jti TEXT PRIMARY KEY,
+               expires_at INTEGER NOT NULL
+           );
+           """
+           
+           cursor.execute(create_table_sql)
+           conn.commit()
+           print("Revoked sessions table created successfully or already exists.")
+           
+       except Error as e:
+           print(f"Error creating revoked sessions table: {e}")
+       finally:
+           conn.close()
+   else:
+       print("Error: Could not create database connection.")
+
+@timed_query("save_schedule")
 def save_schedule(user_id: int, schedule_data: Dict[str, Any]) -> Dict[str, Any]:
    """
    Save or update a schedule for a user.
+   The change is recorded in the user's version history in the same transaction.
    
    Args:
        user_id (int): The user ID
@@ -102,23 +221,32 @@ def save_schedule(user_id: int, schedule_data: Dict[str, Any]) -> Dict[str, Any]
        try:
            cursor = conn.cursor()
            
+           # Take the write lock up front so versions are numbered in commit order
+           cursor.execute("BEGIN IMMEDIATE")
+           
            # Check if schedule already exists for this user
-           check_sql = "SELECT id, created_at FROM schedules WHERE user_id = ?"
+           check_sql = "SELECT id, created_at, schedule_data FROM schedules WHERE user_id = ?"
            cursor.execute(check_sql, (user_id,))
            existing_schedule = cursor.fetchone()
            
-           # Convert schedule_data to JSON string
-           schedule_json = json.dumps(schedule_data)
+           # Encode schedule_data as (compressed) JSON
+           schedule_json = encode_document(schedule_data)
+           previous = decode_document(existing_schedule[2]) if existing_schedule else None
+           insert_versions(cursor, version_rows(
+               user_id, latest_versions(cursor, [user_id]).get(user_id), previous, schedule_data))
            
            if existing_schedule:
                # Update existing schedule
                update_sql = """
                UPDATE schedules 
-               SET schedule_data = ?, updated_at = CURRENT_TIMESTAMP 
+               SET schedule_data = ?, updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now'), revision = revision + 1 
                WHERE user_id = ?
                """
                cursor.execute(update_sql, (schedule_json, user_id))
+               cursor.execute("SELECT updated_at FROM schedules WHERE user_id = ?", (user_id,))
+               updated_at = cursor.fetchone()[0]
                conn.commit()
+               notify_schedule_saved(user_id, schedule_data)
                
                return {
                    "status": "success",
@@ -126,13 +254,13 @@ def save_schedule(user_id: int, schedule_data: Dict[str, Any]) -> Dict[str, Any]
                    "user_id": user_id,
                    "schedule_data": schedule_data,
                    "created_at": existing_schedule[1],
-                   "updated_at": datetime.now().isoformat()
+                   "updated_at": updated_at
                }
            else:
                # Insert new schedule
                insert_sql = """
                INSERT INTO schedules (user_id, schedule_data, created_at, updated_at)
-               VALUES (?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+               VALUES (?, ?, strftime('%Y-%m-%d %H:%M:%f', 'now'), strftime('%Y-%m-%d %H:%M:%f', 'now'))
                """
                cursor.execute(insert_sql, (user_id, schedule_json))
                conn.commit()
@@ -140,6 +268,7 @@ def save_schedule(user_id: int, schedule_data: Dict[str, Any]) -> Dict[str, Any]
                # Get the created schedule details
                cursor.execute("SELECT created_at FROM schedules WHERE user_id = ?", (user_id,))
                created_at = cursor.fetchone()[0]
+               notify_schedule_saved(user_id, schedule_data)
                
                return {
                    "status": "success",
@@ -164,6 +293,106 @@ def save_schedule(user_id: int, schedule_data: Dict[str, Any]) -> Dict[str, Any]
            "message": "Could not create database connection"
        }
 
+@timed_query("update_schedule_data")
+def update_schedule_data(user_id: int, transform: Callable[[Dict[str, Any]], Dict[str, Any]],
+                        expected_updated_at: Optional[datetime] = None) -> Dict[str, Any]:
+   """
+   Apply a change to a stored schedule inside a single write transaction.
+   
+   The schedule is read, passed to `transform` and written back while holding
+   the write lock, so concurrent changes are never lost, and the change is recorded
+   in the user's version history in the same transaction. When `expected_updated_at`
+   is given the write only happens if the schedule has not been modified since
+   (optimistic concurrency). The new updated_at has millisecond precision.
+   
+   The stored document is rewritten whole (decoded, changed, re-encoded and
+   compressed), so a write costs as much as a full save; only the version
+   history row scales with the change. A change that leaves the document as
+   it was writes nothing.
+   
+   Args:
+       user_id (int): The user ID
+       transform (Callable): Function receiving the current schedule data and returning the new data.
+           Exceptions raised by it abort the update and are propagated.
+       expected_updated_at (Optional[datetime]): The updated_at value the client last saw
+   
+   Returns:
+       Dict[str, Any]: Response with status ("success", "not_found", "conflict" or "error") and timestamps
+   """
+   conn = create_connection()
+   if conn is None:
+       return {
+           "status": "error",
+           "message": "Could not create database connection"
+       }
+   
+   try:
+       cursor = conn.cursor()
+       
+       # Take the write lock up front so the read and the write see the same row
+       cursor.execute("BEGIN IMMEDIATE")
+       cursor.execute("SELECT schedule_data, created_at, updated_at FROM schedules WHERE user_id = ?", (user_id,))
+       existing_schedule = cursor.fetchone()
+       
+       if existing_schedule is None:
+           return {
+               "status": "not_found",
+               "message": "No schedule found for this user"
+           }
+       
+       if expected_updated_at is not None and datetime.fromisoformat(existing_schedule[2]) != expected_updated_at:
+           return {
+               "status": "conflict",
+               "message": "Schedule was modified by another request",
+               "updated_at": existing_schedule[2]
+           }
+       
+       # transform may change the document in place, so it gets its own copy
+       previous = decode_document(existing_schedule[0])
+       schedule_data = transform(decode_document(existing_schedule[0]))
+       if schedule_data == previous:
+           return {
+               "status": "success",
+               "message": "Schedule unchanged",
+               "user_id": user_id,
+               "schedule_data": schedule_data,
+               "created_at": existing_schedule[1],
+               "updated_at": existing_schedule[2]
+           }
+       insert_versions(cursor, version_rows(
+           user_id, latest_versions(cursor, [user_id]).get(user_id), previous, schedule_data))
+       
+       update_sql = """
+       UPDATE schedules 
+       SET schedule_data = ?, updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now'), revision = revision + 1 
+       WHERE user_id = ?
+       """
+       cursor.execute(update_sql, (encode_document(schedule_data), user_id))
+       cursor.execute("SELECT updated_at FROM schedules WHERE user_id = ?", (user_id,))
+       updated_at = cursor.fetchone()[0]
+       conn.commit()
+       notify_schedule_saved(user_id, schedule_data)
+       
+       return {
+           "status": "success",
+           "message": "Schedule updated successfully",
+           "user_id": user_id,
+           "schedule_data": schedule_data,
+           "created_at": existing_schedule[1],
+           "updated_at": updated_at
+       }
+       
+   except Error as e:
+       print(f"Error updating schedule: {e}")
+       return {
+           "status": "error",
+           "message": f"Failed to update schedule: {e}"
+       }
+   finally:
+       # Closing without commit rolls back any unfinished transaction
+       conn.close()
+
+@timed_query("get_schedule")
 def get_schedule(user_id: int) -> Optional[Dict[str, Any]]:
    """
    Retrieve a schedule for a user.
@@ -189,7 +418,7 @@ def get_schedule(user_id: int) -> Optional[Dict[str, Any]]:
            result = cursor.fetchone()
            
            if result:
-               schedule_data = json.loads(result[0])
+               schedule_data = decode_document(result[0])
                return {
                    "user_id": user_id,
                    "schedule_data": schedule_data,
@@ -207,6 +436,295 @@ def get_schedule(user_id: int) -> Optional[Dict[str, Any]]:
    else:
        return None
 
+@timed_query("get_schedule_raw")
+def get_schedule_raw(user_id: int) -> Optional[Tuple[str, str, str]]:
+   """
+   Retrieve a user's schedule with the stored JSON decompressed but left unparsed.
+   Used to send the stored document as a response body without decoding and re-encoding it.
+   
+   Args:
+       user_id (int): The user ID
+   
+   Returns:
+       Optional[Tuple[str, str, str]]: (schedule_json, created_at, updated_at) if found, None otherwise
+   """
+   conn = create_connection()
+   if conn is not None:
+       try:
+           cursor = conn.cursor()
+           cursor.execute("SELECT schedule_data, created_at, updated_at FROM schedules WHERE user_id = ?", (user_id,))
+           result = cursor.fetchone()
+           return (document_json(result[0]), result[1], result[2]) if result else None
+               
+       except Error as e:
+           print(f"Error retrieving schedule: {e}")
+           return None
+       finally:
+           conn.close()
+   else:
+       return None
+
+@timed_query("get_schedule_stamps")
+def get_schedule_stamps(user_ids: List[int]) -> Dict[int, int]:
+   """
+   Retrieve a cheap change stamp (the revision, incremented by every save) for many users' schedules.
+   Used by caches shared with other processes to notice schedules saved elsewhere.
+   
+   Args:
+       user_ids (List[int]): The user IDs
+   
+   Returns:
+       Dict[int, int]: Revision keyed by user ID; users without a schedule are omitted
+   """
+   if not user_ids:
+       return {}
+   
+   conn = create_connection()
+   if conn is not None:
+       try:
+           cursor = conn.cursor()
+           placeholders = ", ".join("?" for _ in user_ids)
+           cursor.execute(
+               f"SELECT user_id, revision FROM schedules WHERE user_id IN ({placeholders})",
+               list(user_ids)
+           )
+           return dict(cursor.fetchall())
+               
+       except Error as e:
+           print(f"Error retrieving schedule stamps: {e}")
+           return {}
+       finally:
+           conn.close()
+   else:
+       return {}
+
+@timed_query("get_schedule_validators")
+def get_schedule_validators(user_id: int) -> Optional[Tuple[str, str, int]]:
+   """
+   Retrieve a user's schedule timestamps and revision, without reading the stored
+   document. Used to answer conditional requests cheaply.
+   
+   The revision changes with every change to the schedule, even between two saves
+   in the same second, which Last-Modified cannot tell apart. The query is answered
+   from the idx_schedules_validators covering index.
+   
+   Args:
+       user_id (int): The user ID
+   
+   Returns:
+       Optional[Tuple[str, str, int]]: (created_at, updated_at, revision) if a schedule exists, None otherwise
+   """
+   conn = create_connection()
+   if conn is not None:
+       try:
+           cursor = conn.cursor()
+           cursor.execute("SELECT created_at, updated_at, revision FROM schedules WHERE user_id = ?", (user_id,))
+           result = cursor.fetchone()
+           return tuple(result) if result is not None else None
+               
+       except Error as e:
+           print(f"Error retrieving schedule validators: {e}")
+           return None
+       finally:
+           conn.close()
+   else:
+       return None
+
+@timed_query("get_schedules")
+def get_schedules(user_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+   """
+   Retrieve the schedule data for many users with a single query.
+   
+   Args:
+       user_ids (List[int]): The user IDs
+   
+   Returns:
+       Dict[int, Dict[str, Any]]: Schedule data keyed by user ID; users without a schedule are omitted
+   """
+   if not user_ids:
+       return {}
+   
+   conn = create_connection()
+   if conn is not None:
+       try:
+           cursor = conn.cursor()
+           
+           # Query for all schedules at once
+           placeholders = ", ".join("?" for _ in user_ids)
+           select_sql = f"SELECT user_id, schedule_data FROM schedules WHERE user_id IN ({placeholders})"
+           cursor.execute(select_sql, list(user_ids))
+           
+           return {row[0]: decode_document(row[1]) for row in cursor.fetchall()}
+               
+       except Error as e:
+           print(f"Error retrieving schedules: {e}")
+           return {}
+       finally:
+           conn.close()
+   else:
+       return {}
+
+def get_existing_user_ids(cursor, user_ids: List[int]) -> Set[int]:
+   """
+   Return which of the given user IDs exist, using a single query.
+   
+   Args:
+       cursor: An open database cursor
+       user_ids (List[int]): The user IDs to check
+   
+   Returns:
+       Set[int]: The subset of user IDs present in the users table
+   """
+   if not user_ids:
+       return set()
+   placeholders = ", ".join("?" for _ in user_ids)
+   cursor.execute(f"SELECT id FROM users WHERE id IN ({placeholders})", list(user_ids))
+   return {row[0] for row in cursor.fetchall()}
+
+@timed_query("bulk_save_schedules")
+def bulk_save_schedules(entries: List[Tuple[int, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+   """
+   Save or update many schedules in a single transaction.
+   
+   User existence, existing schedules and latest versions are each checked with
+   one query, and all writes, including the version history rows, are issued with
+   executemany. If the same user appears more than once, the last entry wins.
+   
+   Args:
+       entries (List[Tuple[int, Dict[str, Any]]]): (user_id, schedule_data) pairs
+   
+   Returns:
+       List[Dict[str, Any]]: One result per entry, in input order
+   """
+   if not entries:
+       return []
+   
+   conn = create_connection()
+   if conn is None:
+       return [{"status": "error", "message": "Could not create database connection", "user_id": user_id}
+               for user_id, _ in entries]
+   
+   try:
+       cursor = conn.cursor()
+       cursor.execute("BEGIN IMMEDIATE")
+       user_ids = list({user_id for user_id, _ in entries})
+       
+       # Check users, existing schedules and latest versions with one query each
+       existing_users = get_existing_user_ids(cursor, user_ids)
+       placeholders = ", ".join("?" for _ in user_ids)
+       cursor.execute(f"SELECT user_id, schedule_data FROM schedules WHERE user_id IN ({placeholders})", user_ids)
+       stored = {row[0]: row[1] for row in cursor.fetchall()}
+       scheduled_users = set(stored)
+       latest = latest_versions(cursor, user_ids)
+       # Schedule each user's next version is compared against, updated as entries are applied
+       current: Dict[int, Optional[Dict[str, Any]]] = {}
+       
+       inserts = []
+       updates = []
+       versions = []
+       results = []
+       saved = []
+       for user_id, schedule_data in entries:
+           if user_id not in existing_users:
+               results.append({"status": "error", "message": "User not found", "user_id": user_id})
+               continue
+           
+           schedule_json = encode_document(schedule_data)
+           if user_id in scheduled_users:
+               updates.append((schedule_json, user_id))
+               message = "Schedule updated successfully"
+           else:
+               inserts.append((user_id, schedule_json))
+               scheduled_users.add(user_id)
+               message = "Schedule created successfully"
+           results.append({"status": "success", "message": message, "user_id": user_id})
+           saved.append((user_id, schedule_data))
+           
+           if user_id not in current:
+               current[user_id] = decode_document(stored[user_id]) if user_id in stored else None
+           rows = version_rows(user_id, latest.get(user_id), current[user_id], schedule_data)
+           versions.extend(rows)
+           if rows:
+               latest[user_id] = rows[-1][1]
+           current[user_id] = schedule_data
+       
+       # Inserts run before updates so repeated entries for a new user keep the last one
+       cursor.executemany("""
+           INSERT INTO schedules (user_id, schedule_data, created_at, updated_at)
+           VALUES (?, ?, strftime('%Y-%m-%d %H:%M:%f', 'now'), strftime('%Y-%m-%d %H:%M:%f', 'now'))
+           """, inserts)
+       cursor.executemany("""
+           UPDATE schedules 
+           SET schedule_data = ?, updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now'), revision = revision + 1 
+           WHERE user_id = ?
+           """, updates)
+       insert_versions(cursor, versions)
+       conn.commit()
+       
+       for user_id, schedule_data in saved:
+           notify_schedule_saved(user_id, schedule_data)
+       return results
+       
+   except Error as e:
+       print(f"Error bulk saving schedules: {e}")
+       conn.rollback()
+       return [{"status": "error", "message": f"Failed to save schedule: {e}", "user_id": user_id}
+               for user_id, _ in entries]
+   finally:
+       conn.close()
+
+def iter_schedules(updated_since: Optional[str] = None, batch_size: int = 500) -> Iterator[Tuple[int, str, str, str]]:
+   """
+   Stream all schedules from the database in constant memory.
+   
+   Rows are read from a single cursor with fetchmany, so only one batch is held
+   in memory at a time. The stored JSON is decompressed but not parsed.
+   
+   Args:
+       updated_since (Optional[str]): Only include schedules updated at or after this
+           UTC timestamp ("YYYY-MM-DD HH:MM:SS")
+       batch_size (int): Number of rows fetched per round trip
+   
+   Returns:
+       Iterator[Tuple[int, str, str, str]]: (user_id, schedule_json, created_at, updated_at) rows
+   """
+   # The generator may be resumed from different threads by a streaming response
+   conn = create_connection(check_same_thread=False)
+   if conn is None:
+       return
+   
+   try:
+       cursor = conn.cursor()
+       
+       if updated_since is not None:
+           select_sql = """
+           SELECT user_id, schedule_data, created_at, updated_at 
+           FROM schedules 
+           WHERE updated_at >= ? 
+           ORDER BY updated_at
+           """
+           cursor.execute(select_sql, (updated_since,))
+       else:
+           select_sql = """
+           SELECT user_id, schedule_data, created_at, updated_at 
+           FROM schedules 
+           ORDER BY id
+           """
+           cursor.execute(select_sql)
+       
+       while True:
+           rows = cursor.fetchmany(batch_size)
+           if not rows:
+               break
+           for user_id, schedule_data, created_at, updated_at in rows:
+               yield user_id, document_json(schedule_data), created_at, updated_at
+           
+   except Error as e:
+       print(f"Error exporting schedules: {e}")
+   finally:
+       conn.close()
+
+@timed_query("user_exists")
 def user_exists(user_id: int) -> bool:
    """
    Check if a user with the given user_id exists in the database.
@@ -237,10 +755,158 @@ def user_exists(user_id: int) -> bool:
    else:
        return False
 
+@timed_query("users_exist")
+def users_exist(user_ids: List[int]) -> Set[int]:
+   """
+   Check which of many user IDs exist, with a single query.
+   
+   Args:
+       user_ids (List[int]): The user IDs to check
+   
+   Returns:
+       Set[int]: The user IDs that exist (empty if the database cannot be read)
+   """
+   conn = create_connection()
+   if conn is not None:
+       try:
+           return get_existing_user_ids(conn.cursor(), list(user_ids))
+       except Error as e:
+           print(f"Error checking user existence: {e}")
+           return set()
+       finally:
+           conn.close()
+   else:
+       return set()
+
+def enable_wal_mode():
+   """
+   Switch the database to write-ahead logging.
+   Long-running reads such as exports then no longer block writers. The setting
+   is stored in the database file, so this only needs to run once.
+   """
+   conn = create_connection()
+   if conn is not None:
+       try:
+           conn.execute("PRAGMA journal_mode=WAL")
+       except Error as e:
+           print(f"Error enabling WAL mode: {e}")
+       finally:
+           conn.close()
+
+def compress_stored_schedules(batch_size: int = 500) -> int:
+   """
+   Rewrite schedules still stored as plain JSON text in the compressed format.
+   
+   Rows are converted in batches, one transaction each, and updated_at is left
+   unchanged so cached copies and conditional requests stay valid. Safe to run
+   repeatedly; rows already converted are skipped.
+   
+   Args:
+       batch_size (int): Number of rows converted per transaction
+   
+   Returns:
+       int: Number of rows converted
+   """
+   conn = create_connection()
+   if conn is None:
+       return 0
+   
+   converted = 0
+   try:
+       cursor = conn.cursor()
+       while True:
+           cursor.execute(
+               "SELECT id, schedule_data FROM schedules WHERE typeof(schedule_data) = 'text' LIMIT ?",
+               (batch_size,)
+           )
+           rows = cursor.fetchall()
+           if not rows:
+               break
+           # The schedule_data guard skips rows rewritten by a concurrent save
+           cursor.executemany(
+               "UPDATE schedules SET schedule_data = ? WHERE id = ? AND schedule_data = ?",
+               [(encode_document(decode_document(data)), row_id, data) for row_id, data in rows]
+           )
+           updated = cursor.rowcount
+           conn.commit()
+           converted += updated
+           if updated == 0:
+               break
+       return converted
+   except (Error, ValueError) as e:
+       print(f"Error compressing stored schedules: {e}")
+       conn.rollback()
+       return converted
+   finally:
+       conn.close()
+
+def record_version_baselines(batch_size: int = 500) -> int:
+   """
+   Make every stored schedule the latest version of its history, once per database.
+   
+   Schedules saved before version history existed get a first snapshot, so the
+   next save does not discard them. Histories recorded while versions were still
+   written after the schedule's own transaction may have missed saves; when their
+   latest version differs from the stored schedule, the stored schedule is
+   appended as a snapshot. Rows are processed in batches, one write transaction
+   each, and PRAGMA user_version records that the pass has run.
+   
+   Args:
+       batch_size (int): Number of schedules checked per transaction
+   
+   Returns:
+       int: Number of versions recorded
+   """
+   conn = create_connection()
+   if conn is None:
+       return 0
+   
+   recorded = 0
+   try:
+       cursor = conn.cursor()
+       cursor.execute("PRAGMA user_version")
+       if cursor.fetchone()[0] >= SCHEMA_VERSION:
+           return 0
+       
+       last_id = 0
+       while True:
+           cursor.execute("BEGIN IMMEDIATE")
+           cursor.execute(
+               "SELECT id, user_id, schedule_data FROM schedules WHERE id > ? ORDER BY id LIMIT ?",
+               (last_id, batch_size)
+           )
+           rows = cursor.fetchall()
+           if not rows:
+               cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+               conn.commit()
+               return recorded
+           versions = []
+           for row_id, user_id, schedule_data in rows:
+               versions.extend(baseline_rows(cursor, user_id, decode_document(schedule_data)))
+               last_id = row_id
+           insert_versions(cursor, versions)
+           conn.commit()
+           recorded += len(versions)
+   except (Error, ValueError) as e:
+       print(f"Error recording schedule version baselines: {e}")
+       conn.rollback()
+       return recorded
+   finally:
+       conn.close()
+
 def init_database():
    """
    Initialize the database by creating the users and schedules tables.
    This function should be called when the application starts.
    """
+   enable_wal_mode()
    create_users_table()
-   create_schedules_table()
\ No newline at end of file
+   create_schedules_table()
+   create_schedule_versions_table()
+   create_revoked_sessions_table()
+   converted = compress_stored_schedules()
+   if converted:
+       print(f"Compressed {converted} stored schedules.")
+   recorded = record_version_baselines()
+   if recorded:
+       print(f"Recorded {recorded} schedule version baselines.")
\ No newline at end of file
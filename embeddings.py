@@ -0,0 +1,171 @@
+import math
+import os
+import re
+import zlib
+from collections import Counter
+from typing import List, Optional
+from metrics import timed # type: ignore
+
+try:
+   import numpy as np
+except ImportError:  # Optional: the local backend falls back to pure Python
+   np = None
+
+# Embedding configuration (tunable through environment variables)
+# EMBEDDING_BACKEND: "openai" (text-embedding-3-small over the network) or "local" (CPU only, no network)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "openai").lower()
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "512"))
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "128"))
+
+_TOKEN = re.compile(r"\w+")
+
+# Words too common to say anything about which chunk matches a query
+STOP_WORDS = frozenset("""
+   a an and are as at be but by for from has have i in is it its me my of on or our so that the
+   their them then there these this to was we were what when which will with you your
+""".split())
+
+class EmbeddingBackend:
+   """
+   Turns texts into embedding vectors.
+
+   Backends return one unit-length vector of `dimensions` floats per text.
+   Vectors from different backends (or dimensions) are not comparable, so a
+   collection must be embedded and queried with the same backend.
+   """
+
+   name = "base"
+   dimensions = 0
+   # Largest squared L2 distance (2 - 2 * cosine similarity) at which a chunk
+   # still counts as relevant to a query
+   max_distance = 1.0
+
+   def embed(self, texts: List[str]) -> List[List[float]]:
+       raise NotImplementedError
+
+   def embed_one(self, text: str) -> List[float]:
+       return self.embed([text])[0]
+
+class OpenAIEmbeddingBackend(EmbeddingBackend):
+   """
+   Embeddings from the OpenAI API, sent in batches of EMBEDDING_BATCH_SIZE texts.
+   The client reads OPENAI_API_KEY and OPENAI_BASE_URL and is created on first use.
+   """
+
+   name = "openai"
+
+   def __init__(self, model: str = EMBEDDING_MODEL, batch_size: int = EMBEDDING_BATCH_SIZE):
+       self.model = model
+       self.batch_size = max(1, batch_size)
+       self.dimensions = 1536 if model == "text-embedding-3-small" else 0
+       self._client = None
+
+   def _get_client(self):
+       if self._client is None:
+           import openai
+           self._client = openai.OpenAI()
+       return self._client
+
+   def embed(self, texts: List[str]) -> List[List[float]]:
+       client = self._get_client()
+       vectors: List[List[float]] = []
+       with timed("embedding"):
+           for start in range(0, len(texts), self.batch_size):
+               response = client.embeddings.create(model=self.model, input=texts[start:start + self.batch_size])
+               # The API may return items out of order; index says which input each belongs to
+               vectors.extend(item.embedding for item in sorted(response.data, key=lambda item: item.index))
+       return vectors
+
+class LocalEmbeddingBackend(EmbeddingBackend):
+   """
+   CPU-only embeddings by feature hashing; makes no network calls.
+
+   Each text becomes a bag of words and word bigrams (stop words dropped).
+   Every feature is hashed with CRC32 to one of `dimensions` buckets and a
+   sign, weighted by 1 + log(term frequency), and the vector is normalized
+   to unit length. Hashing is deterministic, so vectors stay comparable
+   across processes and restarts. Texts that share rare words end up close;
+   there is no notion of synonyms.
+   """
+
+   name = "local"
+   # Hashed vectors share fewer dimensions than learned ones: a chunk matching a
+   # query's key words typically scores about 1.1, unrelated chunks 1.5 and above
+   max_distance = 1.4
+
+   def __init__(self, dimensions: int = EMBEDDING_DIMENSIONS):
+       if dimensions <= 0:
+           raise ValueError("dimensions must be positive")
+       self.dimensions = dimensions
+
+   def features(self, text: str) -> Counter:
+       words = [word for word in _TOKEN.findall(text.lower()) if word not in STOP_WORDS]
+       features = Counter(words)
+       features.update(f"{first} {second}" for first, second in zip(words, words[1:]))
+       return features
+
+   def _buckets(self, features: Counter):
+       for feature, count in features.items():
+           digest = zlib.crc32(feature.encode("utf-8"))
+           sign = -1.0 if digest & 0x80000000 else 1.0
+           yield digest % self.dimensions, sign * (1.0 + math.log(count))
+
+   def _embed_python(self, text: str) -> List[float]:
+       vector = [0.0] * self.dimensions
+       for bucket, weight in self._buckets(self.features(text)):
+           vector[bucket] += weight
+       norm = math.sqrt(sum(value * value for value in vector))
+       return [value / norm for value in vector] if norm else vector
+
+   def embed(self, texts: List[str]) -> List[List[float]]:
+       with timed("embedding"):
+           if np is None:
+               return [self._embed_python(text) for text in texts]
+           matrix = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+           for row, text in enumerate(texts):
+               pairs = list(self._buckets(self.features(text)))
+               if pairs:
+                   buckets, weights = zip(*pairs)
+                   np.add.at(matrix[row], np.fromiter(buckets, dtype=np.int64, count=len(pairs)),
+                             np.fromiter(weights, dtype=np.float32, count=len(pairs)))
+           norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+           np.divide(matrix, norms, out=matrix, where=norms > 0)
+           return matrix.tolist()
+
+class ChromaEmbeddingFunction:
+   """
+   Adapts an EmbeddingBackend to Chroma's embedding function interface,
+   so a collection embeds its documents and queries with the backend.
+   """
+
+   def __init__(self, backend: EmbeddingBackend):
+       self.backend = backend
+
+   def __call__(self, input: List[str]) -> List[List[float]]:
+       return self.backend.embed(list(input))
+
+_backend: Optional[EmbeddingBackend] = None
+
+def create_embedding_backend(name: str = EMBEDDING_BACKEND) -> EmbeddingBackend:
+   """
+   Create an embedding backend by name.
+
+   Args:
+       name (str): "openai" or "local"
+
+   Returns:
+       EmbeddingBackend: The backend
+   """
+   if name == "openai":
+       return OpenAIEmbeddingBackend()
+   if name == "local":
+       return LocalEmbeddingBackend()
+   raise ValueError(f"Unknown EMBEDDING_BACKEND '{name}'; expected 'openai' or 'local'")
+
+def get_embedding_backend() -> EmbeddingBackend:
+   """Return the process-wide backend selected by EMBEDDING_BACKEND."""
+   global _backend
+   if _backend is None:
+       _backend = create_embedding_backend()
+   return _backend
@@ -0,0 +1,139 @@
+import hashlib
+from datetime import date, datetime
+from typing import Dict, Iterator, Optional
+from recurrence import RecurrenceIndex, RecurrenceRule, ONCE, DAILY, WEEKDAYS_RULE # type: ignore
+
+PRODUCT_ID = "-//Automated Scheduling Tool//Schedule Export//EN"
+UID_DOMAIN = "automated-scheduling-tool"
+
+# iCalendar two-letter weekday codes, indexed like date.weekday()
+ICAL_WEEKDAYS = ["MO", "TU", "WE", "TH", "FR", "SA", "SU"]
+
+# Maximum line length in octets before folding (RFC 5545 section 3.1)
+MAX_LINE_OCTETS = 75
+
+def escape_text(value: str) -> str:
+   """Escape a TEXT property value."""
+   return (
+       value.replace("\\", "\\\\")
+       .replace(";", "\\;")
+       .replace(",", "\\,")
+       .replace("\r\n", "\\n")
+       .replace("\n", "\\n")
+   )
+
+def fold_line(line: str) -> str:
+   """
+   Fold a content line at 75 octets and terminate it with CRLF.
+   Continuation lines start with a single space and never split a UTF-8 character.
+   """
+   encoded = line.encode("utf-8")
+   if len(encoded) <= MAX_LINE_OCTETS:
+       return line + "\r\n"
+
+   parts = []
+   current = ""
+   current_octets = 0
+   limit = MAX_LINE_OCTETS
+   for character in line:
+       octets = len(character.encode("utf-8"))
+       if current_octets + octets > limit:
+           parts.append(current)
+           current = ""
+           current_octets = 0
+           # Continuation lines lose one octet to the leading space
+           limit = MAX_LINE_OCTETS - 1
+       current += character
+       current_octets += octets
+   parts.append(current)
+   return "\r\n ".join(parts) + "\r\n"
+
+def format_local(value: datetime) -> str:
+   """Format a floating (local wall-clock) date-time."""
+   return value.strftime("%Y%m%dT%H%M%S")
+
+def format_utc(value: datetime) -> str:
+   """Format a UTC date-time."""
+   return value.strftime("%Y%m%dT%H%M%SZ")
+
+def recurrence_rule(rule: RecurrenceRule) -> Optional[str]:
+   """
+   Translate a compiled recurrence rule into an RRULE value.
+
+   Args:
+       rule (RecurrenceRule): The task's recurrence rule
+
+   Returns:
+       Optional[str]: RRULE value, or None for one-off tasks
+   """
+   if rule.kind == ONCE:
+       return None
+   if rule.kind == DAILY:
+       return "FREQ=DAILY"
+   if rule.kind == WEEKDAYS_RULE:
+       days = ",".join(ICAL_WEEKDAYS[weekday] for weekday in sorted(rule.weekdays))
+       return f"FREQ=WEEKLY;BYDAY={days}"
+   if rule.anchor is not None:
+       return f"FREQ=MONTHLY;BYMONTHDAY={rule.anchor.day}"
+   return f"FREQ=MONTHLY;BYDAY=1{ICAL_WEEKDAYS[rule.template_weekday]}"
+
+def parse_timestamp(value: str) -> datetime:
+   """Parse a timestamp stored by SQLite (UTC, with or without fractional seconds)."""
+   return datetime.fromisoformat(value)
+
+def iter_ics(user_id: int, index: RecurrenceIndex, created_at: str, updated_at: str) -> Iterator[str]:
+   """
+   Generate an iCalendar document for a stored schedule, one folded line at a time.
+
+   Each task becomes a single VEVENT whose recurrence is expressed as an RRULE,
+   so the output size depends on the number of tasks rather than on the number
+   of occurrences. Weekday-template tasks start on their first occurrence on or
+   after the day the schedule was created; dated tasks start on their date.
+
+   Args:
+       user_id (int): The user ID, used to build stable event UIDs
+       index (RecurrenceIndex): Compiled recurrence index of the stored schedule
+       created_at (str): Schedule creation timestamp
+       updated_at (str): Schedule modification timestamp
+
+   Returns:
+       Iterator[str]: CRLF-terminated content lines
+   """
+   template_start = parse_timestamp(created_at).date()
+   stamp = format_utc(parse_timestamp(updated_at))
+
+   yield fold_line("BEGIN:VCALENDAR")
+   yield fold_line("VERSION:2.0")
+   yield fold_line(f"PRODID:{PRODUCT_ID}")
+   yield fold_line("CALSCALE:GREGORIAN")
+   yield fold_line(f"X-WR-CALNAME:Schedule {user_id}")
+
+   # UIDs derive from each task's identity rather than its position, so adding or
+   # removing a task leaves the other events' UIDs unchanged; identical tasks are numbered
+   seen: Dict[str, int] = {}
+   for recurring in index.tasks:
+       rule = recurring.rule
+       first_day: Optional[date] = rule.first_on_or_after(rule.anchor or template_start)
+       if first_day is None:
+           continue
+       occurrence = recurring.occurrence_on(first_day)
+       task = recurring.task
+       task_name = str(task.get("task_name") or "Task")
+       digest = hashlib.sha1(f"{recurring.key}|{task_name}|{task.get('start_time')}".encode("utf-8")).hexdigest()[:12]
+       seen[digest] = seen.get(digest, 0) + 1
+       uid = digest if seen[digest] == 1 else f"{digest}-{seen[digest]}"
+
+       yield fold_line("BEGIN:VEVENT")
+       yield fold_line(f"UID:{user_id}-{uid}@{UID_DOMAIN}")
+       yield fold_line(f"DTSTAMP:{stamp}")
+       yield fold_line(f"DTSTART:{format_local(occurrence.start)}")
+       yield fold_line(f"DTEND:{format_local(occurrence.end)}")
+       yield fold_line(f"SUMMARY:{escape_text(task_name)}")
+       rrule = recurrence_rule(rule)
+       if rrule:
+           yield fold_line(f"RRULE:{rrule}")
+       if task.get("priority"):
+           yield fold_line("PRIORITY:1")
+       yield fold_line("END:VEVENT")
+
+   yield fold_line("END:VCALENDAR")
@@ -0,0 +1,181 @@
+import math
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# Retrieval configuration (tunable through environment variables)
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+# Constant k in reciprocal rank fusion: score = sum(1 / (RRF_K + rank))
+RRF_K = int(os.getenv("RRF_K", "60"))
+# A lexical hit is "strong" (and the query embedding is skipped) when the best BM25
+# score is at least this many times the runner-up's; 0 always runs the vector search
+LEXICAL_SKIP_RATIO = float(os.getenv("LEXICAL_SKIP_RATIO", "2.0"))
+# ... and the best chunk contains at least this many distinct query terms
+LEXICAL_SKIP_MIN_TERMS = int(os.getenv("LEXICAL_SKIP_MIN_TERMS", "2"))
+
+_WORD = re.compile(r"\w+")
+_ALPHA_DIGIT = re.compile(r"^([a-z]+)(\d+)$")
+
+# Words that carry no information about which chunk matches
+STOP_WORDS = frozenset("""
+   a an and are as at be but by do for from has have i in is it its me my of on or our so that the
+   their them then there these this to was we were what when where which will with you your
+""".split())
+
+def tokenize(text: str) -> List[str]:
+   """
+   Lowercase word tokens without stop words.
+
+   Course codes and room numbers match however they are written: "CS 101"
+   also yields "cs101", and "CS101" also yields "cs" and "101".
+   """
+   words = _WORD.findall(text.lower())
+   tokens = []
+   for index, word in enumerate(words):
+       if word in STOP_WORDS:
+           continue
+       tokens.append(word)
+       split = _ALPHA_DIGIT.match(word)
+       if split:
+           tokens.extend(split.groups())
+       elif word.isalpha() and index + 1 < len(words) and words[index + 1].isdigit():
+           tokens.append(word + words[index + 1])
+   return tokens
+
+class LexicalIndex:
+   """
+   In-memory BM25 inverted index over the chunks of one collection.
+
+   Postings map each term to the chunks containing it and its frequency there,
+   so a search only scores chunks sharing at least one term with the query.
+   """
+
+   def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+       self.k1 = k1
+       self.b = b
+       self.postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+       self.lengths: Dict[str, int] = {}
+       self.documents: Dict[str, str] = {}
+       self.total_length = 0
+       # Version of the collection this index was built from (see get_lexical_index)
+       self.source_version: Any = None
+       self._lock = threading.Lock()
+
+   def __len__(self) -> int:
+       return len(self.lengths)
+
+   def add(self, ids: Sequence[str], documents: Sequence[str]):
+       """Index chunks, replacing any with the same ids."""
+       with self._lock:
+           for chunk_id, text in zip(ids, documents):
+               self._remove(chunk_id)
+               terms = Counter(tokenize(text or ""))
+               for term, frequency in terms.items():
+                   self.postings[term][chunk_id] = frequency
+               length = sum(terms.values())
+               self.lengths[chunk_id] = length
+               self.documents[chunk_id] = text
+               self.total_length += length
+
+   def _remove(self, chunk_id: str):
+       if chunk_id not in self.lengths:
+           return
+       for term in set(tokenize(self.documents[chunk_id] or "")):
+           postings = self.postings.get(term)
+           if postings is not None:
+               postings.pop(chunk_id, None)
+               if not postings:
+                   del self.postings[term]
+       self.total_length -= self.lengths.pop(chunk_id)
+       del self.documents[chunk_id]
+
+   def delete(self, ids: Optional[Sequence[str]] = None):
+       """Remove chunks by id; with no ids, remove every chunk."""
+       with self._lock:
+           if ids is None:
+               self.postings.clear()
+               self.lengths.clear()
+               self.documents.clear()
+               self.total_length = 0
+               return
+           for chunk_id in ids:
+               self._remove(chunk_id)
+
+   def search(self, query: str, k: int = 5) -> List[Tuple[str, float, int]]:
+       """
+       Rank chunks against a query with BM25.
+
+       Args:
+           query (str): Query text
+           k (int): Maximum number of results
+
+       Returns:
+           List[Tuple[str, float, int]]: (chunk id, score, distinct query terms matched), best first
+       """
+       with self._lock:
+           count = len(self.lengths)
+           if not count:
+               return []
+           average_length = self.total_length / count or 1.0
+           scores: Dict[str, float] = defaultdict(float)
+           matched: Dict[str, int] = defaultdict(int)
+           for term in set(tokenize(query)):
+               postings = self.postings.get(term)
+               if not postings:
+                   continue
+               idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+               for chunk_id, frequency in postings.items():
+                   norm = self.k1 * (1 - self.b + self.b * self.lengths[chunk_id] / average_length)
+                   scores[chunk_id] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+                   matched[chunk_id] += 1
+       ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+       return [(chunk_id, score, matched[chunk_id]) for chunk_id, score in ranked]
+
+def is_strong_hit(results: List[Tuple[str, float, int]], ratio: float = LEXICAL_SKIP_RATIO,
+                  min_terms: int = LEXICAL_SKIP_MIN_TERMS) -> bool:
+   """Whether the best lexical result clearly beats the rest, so vector search can be skipped."""
+   if ratio <= 0 or not results or results[0][2] < min_terms:
+       return False
+   return len(results) == 1 or results[0][1] >= ratio * results[1][1]
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = RRF_K) -> List[str]:
+   """
+   Merge ranked id lists by reciprocal rank fusion.
+   Ids ranked high in any list, or present in several lists, come first.
+   """
+   scores: Dict[str, float] = defaultdict(float)
+   for ranking in rankings:
+       for rank, item in enumerate(ranking, start=1):
+           scores[item] += 1.0 / (k + rank)
+   return sorted(scores, key=lambda item: scores[item], reverse=True)
+
+_indexes: Dict[str, LexicalIndex] = {}
+_indexes_lock = threading.Lock()
+
+def get_lexical_index(namespace: str, collection: Any) -> LexicalIndex:
+   """
+   Return the lexical index for a namespace, building it from the collection's documents
+   on first use, and rebuilding it when a collection that reports a version (the
+   NumPy store, whose files other processes may rewrite) has changed since.
+
+   Args:
+       namespace (str): Collection name
+       collection: The vector collection the index mirrors
+
+   Returns:
+       LexicalIndex: The index
+   """
+   version = collection.version() if hasattr(collection, "version") else None
+   with _indexes_lock:
+       index = _indexes.get(namespace)
+       if index is not None and (version is None or index.source_version == version):
+           return index
+       index = LexicalIndex()
+       stored = collection.get(include=["documents"])
+       index.add(stored["ids"], stored["documents"] or [""] * len(stored["ids"]))
+       index.source_version = version
+       _indexes[namespace] = index
+       return index
@@ -1,16 +1,62 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Depends, Header
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, Response, JSONResponse
+from email.utils import format_datetime, parsedate_to_datetime
+from pydantic import ValidationError
 import uvicorn
-from database import init_database, save_schedule, get_schedule, user_exists # type: ignore
-from models import UserRequest, UserResponse, ScheduleSaveRequest, ScheduleResponse, AIScheduleSaveRequest, AIScheduleResponse # type: ignore
+import asyncio
+import os
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Optional, Any, List, Iterator
+from database import init_database, save_schedule, get_schedule_raw, user_exists, users_exist, bulk_save_schedules, iter_schedules, get_schedule_validators, update_schedule_data # type: ignore
+from models import UserRequest, UserResponse, ScheduleSaveRequest, ScheduleGenerateRequest, ScheduleResponse, AIScheduleSaveRequest, AIScheduleResponse, GroupAvailabilityRequest, SchedulePatchRequest # type: ignore
 from auth_logic import authenticate_user # type: ignore
-from schedule_generation import generate_and_save_schedule # type: ignore
+from password_hashing import run_in_password_pool # type: ignore
+from sessions import issue_token, verify_token, revoke_token, REQUIRE_SESSION_TOKENS # type: ignore
+from schedule_generation import generate_and_save_schedule, generate_converted_schedule # type: ignore
+from recurrence import occurrence_to_dict # type: ignore
+from availability import get_free_busy_index, get_free_busy_indexes, common_free_slots # type: ignore
+from ical import iter_ics, parse_timestamp # type: ignore
+from schedule_patch import apply_operations, PatchError # type: ignore
+from schedule_history import list_versions, get_version, compute_delta, delta_to_changes # type: ignore
+import metrics # type: ignore
+from serialization import dumps, dumps_bytes, loads # type: ignore
+from tracing import TracingMiddleware, run_in_threadpool # type: ignore
+
+# Largest window (in days) that a single occurrence query may expand
+MAX_OCCURRENCE_WINDOW_DAYS = 366
+
+# Limits for group availability queries
+MAX_GROUP_SIZE = 500
+MAX_GROUP_WINDOW_DAYS = 31
+
+# Number of schedules written per transaction by the bulk save endpoint
+BULK_SAVE_CHUNK_SIZE = 500
+
+# Batch generation: largest batch, and LLM generations in flight at once across all batches
+# (tunable through environment variables; LLM_REQUESTS_PER_MINUTE limits the request rate)
+MAX_BATCH_GENERATION_SIZE = 500
+BATCH_GENERATION_CONCURRENCY = int(os.getenv("BATCH_GENERATION_CONCURRENCY", "8"))
+_batch_generation_slots = asyncio.Semaphore(BATCH_GENERATION_CONCURRENCY)
+
+# Number of rows fetched per round trip by the export endpoint
+EXPORT_BATCH_SIZE = 500
+
+# Approximate size of each chunk written by streaming endpoints
+STREAM_CHUNK_BYTES = 64 * 1024
+
+class FastJSONResponse(JSONResponse):
+   """JSON response encoded with the fast serializer (orjson when installed)."""
+
+   def render(self, content: Any) -> bytes:
+       return dumps_bytes(content)
 
 # Create FastAPI application instance
 app = FastAPI(
    title="Simple User Authentication API",
    description="A simple backend-only user authentication system using FastAPI and SQLite",
-   version="1.0.0"
+   version="1.0.0",
+   default_response_class=FastJSONResponse
 )
 
 # Add CORS middleware to allow cross-origin requests
@@ -22,15 +68,67 @@ app.add_middleware(
    allow_headers=["*"],  # Allow all headers
 )
 
+# Record per-request span trees and profiles (no-op unless TRACE_ENABLED or PROFILE_ENABLED is set)
+app.add_middleware(TracingMiddleware)
+
 @app.on_event("startup")
 async def startup_event():
    """
    Initialize the database when the application starts.
    This creates the users table if it doesn't exist.
+   
+   Under serve.py the launcher initializes the database once before starting
+   the workers and sets INIT_DATABASE_ON_STARTUP=false for them.
    """
-   print("Initializing database...")
-   init_database()
-   print("Database initialization complete.")
+   if os.getenv("INIT_DATABASE_ON_STARTUP", "true").lower() in ("1", "true", "yes"):
+       print("Initializing database...")
+       init_database()
+       print("Database initialization complete.")
+   # Share this process's metrics with the other workers (only when METRICS_DIR is set)
+   metrics.start_snapshot_writer()
+
+def _bearer_token(authorization: Optional[str]) -> Optional[str]:
+   """Extract the token from an "Authorization: Bearer <token>" header."""
+   if authorization and authorization.lower().startswith("bearer "):
+       return authorization[7:].strip()
+   return None
+
+def get_session_user_id(authorization: Optional[str] = Header(None)) -> Optional[int]:
+   """
+   Resolve the user ID from the session token in the Authorization header.
+   
+   Tokens are validated without touching the database. Requests without a
+   token are still accepted unless REQUIRE_SESSION_TOKENS is enabled.
+   
+   Returns:
+       Optional[int]: The authenticated user ID, or None for requests without a token
+   """
+   token = _bearer_token(authorization)
+   if token is None:
+       if REQUIRE_SESSION_TOKENS:
+           raise HTTPException(
+               status_code=401,
+               detail="Session token is required"
+           )
+       return None
+   
+   user_id = verify_token(token)
+   if user_id is None:
+       raise HTTPException(
+           status_code=401,
+           detail="Invalid or expired session token"
+       )
+   return user_id
+
+def authorize_user(session_user_id: Optional[int], user_id: int):
+   """
+   Ensure a session, if present, belongs to the user being modified.
+   """
+   if session_user_id is not None and session_user_id != user_id:
+       raise HTTPException(
+           status_code=403,
+           detail="Session does not belong to this user"
+       )
 
 @app.get("/")
 async def root():
@@ -42,10 +140,25 @@ async def root():
        "version": "1.0.0",
        "endpoints": {
            "POST /auth": "Authenticate user (login or register)",
+           "POST /auth/logout": "Revoke the current session token",
            "POST /schedule/save": "Save or update user schedule",
            "POST /schedule/ai-save": "Save or update AI-generated schedule",
+           "POST /schedule/bulk-save": "Save many schedules from a JSON array or NDJSON body",
            "POST /schedule/generate": "Generate and save AI schedule from prompt",
-           "GET /schedule/{user_id}": "Get user schedule"
+           "POST /schedule/generate/batch": "Generate and save AI schedules for many users, streaming NDJSON results",
+           "GET /schedule/{user_id}": "Get user schedule",
+           "PATCH /schedule/{user_id}": "Apply per-day or per-task changes to a schedule",
+           "GET /schedule/{user_id}/versions": "List saved versions of a schedule",
+           "GET /schedule/{user_id}/versions/{version}": "Get a saved version of a schedule",
+           "GET /schedule/{user_id}/versions/{version}/diff": "Diff a version against another version",
+           "POST /schedule/{user_id}/versions/{version}/restore": "Restore a saved version",
+           "GET /schedule/{user_id}.ics": "Get user schedule as an iCalendar feed",
+           "GET /schedules/export": "Stream all schedules as NDJSON",
+           "GET /schedule/{user_id}/occurrences": "Expand recurring tasks over a date window",
+           "GET /schedule/{user_id}/next": "Get the next upcoming task occurrences",
+           "GET /schedule/{user_id}/free": "Find free time windows for a user",
+           "POST /schedule/group/free": "Find free time slots shared by a group of users",
+           "GET /metrics": "Pipeline and database metrics in Prometheus text format"
        }
    }
 
@@ -72,8 +185,8 @@ async def authenticate_user_endpoint(user_request: UserRequest):
    }
   
    Example responses:
-   - Login success: {"status": "success", "message": "Login successful", "username": "john_doe", "user_id": 1, "created_at": "2024-01-01T12:00:00"}
-   - Registration success: {"status": "success", "message": "User created successfully", "username": "john_doe", "user_id": 1, "created_at": "2024-01-01T12:00:00"}
+   - Login success: {"status": "success", "message": "Login successful", "username": "john_doe", "user_id": 1, "created_at": "2024-01-01T12:00:00", "token": "...", "token_expires_at": "..."}
+   - Registration success: {"status": "success", "message": "User created successfully", "username": "john_doe", "user_id": 1, "created_at": "2024-01-01T12:00:00", "token": "...", "token_expires_at": "..."}
    - Error: {"status": "error", "message": "Failed to create user. Username may already exist."}
    """
    try:
@@ -84,11 +197,14 @@ async def authenticate_user_endpoint(user_request: UserRequest):
                detail="Username and password are required"
            )
       
-       # Process authentication request
-       response = authenticate_user(user_request)
+       # Process authentication request on the password hashing pool so the KDF
+       # never blocks the event loop
+       response = await run_in_password_pool(authenticate_user, user_request)
       
        # Return appropriate HTTP status based on response
        if response.status == "success":
+           # Issue a session token so later requests can skip user lookups
+           response.token, response.token_expires_at = issue_token(response.user_id)
            return response
        else:
            raise HTTPException(
@@ -107,8 +223,24 @@ async def authenticate_user_endpoint(user_request: UserRequest):
            detail="Internal server error"
        )
 
+@app.post("/auth/logout")
+async def logout_endpoint(authorization: Optional[str] = Header(None)):
+   """
+   Revoke the session token sent in the Authorization header.
+   
+   Returns:
+       JSON response with status and message
+   """
+   token = _bearer_token(authorization)
+   if token is None or not revoke_token(token):
+       raise HTTPException(
+           status_code=401,
+           detail="Invalid or expired session token"
+       )
+   return {"status": "success", "message": "Logged out"}
+
 @app.post("/schedule/save", response_model=ScheduleResponse)
-async def save_schedule_endpoint(schedule_request: ScheduleSaveRequest):
+async def save_schedule_endpoint(schedule_request: ScheduleSaveRequest, session_user_id: Optional[int] = Depends(get_session_user_id)):
    """
    Save or update a schedule for a user.
    
@@ -146,6 +278,8 @@ async def save_schedule_endpoint(schedule_request: ScheduleSaveRequest):
                status_code=400,
                detail="Schedule data is required"
            )
+       
+       authorize_user(session_user_id, schedule_request.user_id)
       
        # Save or update schedule
        result = save_schedule(schedule_request.user_id, schedule_request.schedule_data)
@@ -170,6 +304,297 @@ async def save_schedule_endpoint(schedule_request: ScheduleSaveRequest):
            detail="Internal server error"
        )
 
+def _iter_ndjson_items(body: bytes) -> Any:
+   """
+   Lazily decode the lines of an NDJSON body.
+   Undecodable lines are yielded as the exception so they can be reported per item.
+   """
+   for line in body.splitlines():
+       if not line.strip():
+           continue
+       try:
+           yield loads(line)
+       except ValueError as e:
+           yield e
+
+def _validate_bulk_item(item: Any) -> ScheduleSaveRequest:
+   """
+   Validate one bulk save item, raising ValueError with a readable message.
+   """
+   if isinstance(item, Exception):
+       raise ValueError(f"Invalid JSON: {item}")
+   if not isinstance(item, dict):
+       raise ValueError("Each item must be an object with user_id and schedule_data")
+   try:
+       entry = ScheduleSaveRequest(**item)
+   except ValidationError as e:
+       raise ValueError(f"Validation error: {e.errors()[0]['msg']}")
+   if entry.user_id <= 0:
+       raise ValueError("User ID is required")
+   if not entry.schedule_data:
+       raise ValueError("Schedule data is required")
+   return entry
+
+@app.post("/schedule/bulk-save")
+async def bulk_save_schedule_endpoint(request: Request, session_user_id: Optional[int] = Depends(get_session_user_id)):
+   """
+   Save or update many schedules in one request.
+   
+   The body is either a JSON array of {"user_id", "schedule_data"} objects or an
+   NDJSON stream with one such object per line (Content-Type: application/x-ndjson).
+   Items are validated as they are read and written in chunked transactions, each
+   chunk checking user existence with a single query. One NDJSON result line is
+   streamed back per item as soon as its chunk is committed; results carry the
+   item's position in the input as "index". With a session token, items for any
+   other user are rejected.
+   
+   Example request (NDJSON):
+   {"user_id": 1, "schedule_data": {"monday": ["9:00 AM - 5:00 PM"]}}
+   {"user_id": 2, "schedule_data": {"tuesday": ["10:00 AM - 6:00 PM"]}}
+   
+   Example response lines:
+   {"index": 0, "status": "success", "message": "Schedule created successfully", "user_id": 1}
+   {"index": 1, "status": "error", "message": "User not found", "user_id": 2}
+   """
+   content_type = request.headers.get("content-type", "")
+   is_ndjson = "ndjson" in content_type or "jsonl" in content_type
+   body = await request.body()
+   
+   try:
+       if is_ndjson:
+           items = _iter_ndjson_items(body)
+       else:
+           items = loads(body)
+           if not isinstance(items, list):
+               raise ValueError("Expected a JSON array")
+   except ValueError:
+       raise HTTPException(
+           status_code=400,
+           detail="Request body must be a JSON array or NDJSON"
+       )
+   
+   async def save_chunk(chunk: List[tuple]):
+       results = await run_in_threadpool(bulk_save_schedules, [(user_id, data) for _, user_id, data in chunk])
+       lines = []
+       for (index, _, _), result in zip(chunk, results):
+           lines.append(dumps({"index": index, **result}) + "\n")
+       return "".join(lines)
+   
+   async def stream_results():
+       chunk = []
+       for index, item in enumerate(items):
+           try:
+               entry = _validate_bulk_item(item)
+           except ValueError as e:
+               user_id = item.get("user_id") if isinstance(item, dict) else None
+               yield dumps({"index": index, "status": "error", "message": str(e), "user_id": user_id}) + "\n"
+               continue
+           try:
+               authorize_user(session_user_id, entry.user_id)
+           except HTTPException as e:
+               yield dumps({"index": index, "status": "error", "message": e.detail, "user_id": entry.user_id}) + "\n"
+               continue
+           
+           chunk.append((index, entry.user_id, entry.schedule_data))
+           if len(chunk) >= BULK_SAVE_CHUNK_SIZE:
+               yield await save_chunk(chunk)
+               chunk = []
+       
+       if chunk:
+           yield await save_chunk(chunk)
+   
+   return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+@app.post("/schedule/group/free")
+async def get_group_free_slots_endpoint(group_request: GroupAvailabilityRequest):
+   """
+   Find time slots in which every user in a group is free.
+   
+   Each user's window is represented as a bitset of fixed-size slots built
+   from their cached free/busy index, and the bitsets are intersected to find
+   the common free time. Users without a saved schedule are treated as free.
+   
+   Args:
+       group_request (GroupAvailabilityRequest): JSON object containing user_ids and the search window
+      
+   Returns:
+       JSON response with the common slots ranked longest first
+      
+   Example request:
+   {
+       "user_ids": [1, 2, 3],
+       "start": "2025-07-14T08:00:00",
+       "end": "2025-07-18T18:00:00",
+       "min_minutes": 60
+   }
+   """
+   try:
+       # Validate input
+       user_ids = list(dict.fromkeys(group_request.user_ids))
+       if not user_ids or len(user_ids) > MAX_GROUP_SIZE:
+           raise HTTPException(
+               status_code=400,
+               detail=f"Between 1 and {MAX_GROUP_SIZE} user IDs are required"
+           )
+       
+       # Schedule times are local wall-clock times, so drop any timezone offset
+       start = group_request.start.replace(tzinfo=None)
+       end = group_request.end.replace(tzinfo=None)
+       if end <= start or (end - start).days >= MAX_GROUP_WINDOW_DAYS:
+           raise HTTPException(
+               status_code=400,
+               detail=f"End must be after start and within {MAX_GROUP_WINDOW_DAYS} days"
+           )
+       
+       if group_request.granularity_minutes not in (1, 5, 10, 15, 30, 60):
+           raise HTTPException(
+               status_code=400,
+               detail="Granularity must be 1, 5, 10, 15, 30 or 60 minutes"
+           )
+       
+       if group_request.min_minutes < 0 or group_request.limit < 1:
+           raise HTTPException(
+               status_code=400,
+               detail="Minimum minutes cannot be negative and limit must be positive"
+           )
+      
+       # Load all indexes, fetching cache misses in one query
+       indexes = get_free_busy_indexes(user_ids)
+       slots = common_free_slots(
+           list(indexes.values()),
+           start,
+           end,
+           min_minutes=group_request.min_minutes,
+           granularity=group_request.granularity_minutes,
+           limit=group_request.limit
+       )
+      
+       return {
+           "user_ids": user_ids,
+           "users_without_schedule": [user_id for user_id, index in indexes.items() if index is None],
+           "start": start.isoformat(),
+           "end": end.isoformat(),
+           "granularity_minutes": group_request.granularity_minutes,
+           "slots": slots
+       }
+          
+   except HTTPException:
+       # Re-raise HTTP exceptions
+       raise
+   except Exception as e:
+       # Handle unexpected errors
+       print(f"Unexpected error in group free slots endpoint: {e}")
+       raise HTTPException(
+           status_code=500,
+           detail="Internal server error"
+       )
+
+def _chunked(lines: Iterator[str], chunk_bytes: int = STREAM_CHUNK_BYTES) -> Iterator[str]:
+   """
+   Group streamed lines into chunks of roughly chunk_bytes.
+   
+   StreamingResponse runs a synchronous iterator on the thread pool one item
+   at a time, so yielding single lines costs a thread hop per line.
+   """
+   buffer: List[str] = []
+   size = 0
+   for line in lines:
+       buffer.append(line)
+       size += len(line)
+       if size >= chunk_bytes:
+           yield "".join(buffer)
+           buffer = []
+           size = 0
+   if buffer:
+       yield "".join(buffer)
+
+def _not_modified(request: Request, etag: str, last_modified: datetime) -> bool:
+   """
+   Evaluate If-None-Match / If-Modified-Since request headers.
+   """
+   if_none_match = request.headers.get("if-none-match")
+   if if_none_match is not None:
+       candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+       return "*" in candidates or etag in candidates or etag.removeprefix("W/") in candidates
+   
+   if_modified_since = request.headers.get("if-modified-since")
+   if if_modified_since is not None:
+       try:
+           return last_modified <= parsedate_to_datetime(if_modified_since)
+       except (TypeError, ValueError):
+           return False
+   return False
+
+# Registered before /schedule/{user_id} so that "1.ics" is not parsed as a user ID
+@app.get("/schedule/{user_id}.ics")
+async def get_schedule_ics_endpoint(user_id: int, request: Request):
+   """
+   Export a user's schedule as an iCalendar (.ics) feed.
+   
+   Each task is emitted as one VEVENT with an RRULE derived from its recurrence,
+   streamed line by line. Responses carry ETag and Last-Modified headers, and
+   conditional requests from polling calendar clients are answered with
+   304 Not Modified after a single indexed lookup. The ETag is derived from the
+   schedule's revision, so it changes with every save; Last-Modified only has one-second
+   precision and is used for If-Modified-Since when no If-None-Match is sent.
+   
+   Args:
+       user_id (int): The user ID from the URL path
+      
+   Returns:
+       text/calendar stream, or 304 if the client's copy is current
+   """
+   try:
+       # Validate input
+       if not user_id or user_id <= 0:
+           raise HTTPException(
+               status_code=400,
+               detail="Valid user ID is required"
+           )
+      
+       validators = get_schedule_validators(user_id)
+       if validators is None:
+           raise HTTPException(
+               status_code=404,
+               detail="No schedule found for this user"
+           )
+      
+       created_at, updated_at, revision = validators
+       last_modified = parse_timestamp(updated_at).replace(tzinfo=timezone.utc, microsecond=0)
+       etag = f'W/"{user_id}-{revision}-ics"'
+       headers = {
+           "ETag": etag,
+           "Last-Modified": format_datetime(last_modified, usegmt=True),
+           "Cache-Control": "private, no-cache"
+       }
+      
+       if _not_modified(request, etag, last_modified):
+           return Response(status_code=304, headers=headers)
+      
+       index = get_free_busy_index(user_id)
+       if index is None:
+           raise HTTPException(
+               status_code=404,
+               detail="No schedule found for this user"
+           )
+      
+       return StreamingResponse(
+           _chunked(iter_ics(user_id, index.recurrence, created_at, updated_at)),
+           media_type="text/calendar",
+           headers=headers
+       )
+          
+   except HTTPException:
+       # Re-raise HTTP exceptions
+       raise
+   except Exception as e:
+       # Handle unexpected errors
+       print(f"Unexpected error in schedule ics endpoint: {e}")
+       raise HTTPException(
+           status_code=500,
+           detail="Internal server error"
+       )
+
 @app.get("/schedule/{user_id}")
 async def get_schedule_endpoint(user_id: int):
    """
@@ -196,11 +621,16 @@ async def get_schedule_endpoint(user_id: int):
                detail="Valid user ID is required"
            )
       
-       # Get schedule
-       schedule = get_schedule(user_id)
+       # Get schedule without decoding it
+       schedule = get_schedule_raw(user_id)
       
        if schedule:
-           return schedule
+           # The stored schedule is already JSON; splice it into the body as-is
+           # instead of decoding it and encoding it again
+           schedule_json, created_at, updated_at = schedule
+           body = (f'{{"user_id":{user_id},"schedule_data":{schedule_json},'
+                   f'"created_at":{dumps(created_at)},"updated_at":{dumps(updated_at)}}}')
+           return Response(content=body, media_type="application/json")
        else:
            raise HTTPException(
                status_code=404,
@@ -218,8 +648,507 @@ async def get_schedule_endpoint(user_id: int):
            detail="Internal server error"
        )
 
+@app.get("/schedule/{user_id}/occurrences")
+async def get_schedule_occurrences_endpoint(user_id: int, start: date, end: Optional[date] = None):
+   """
+   Expand a user's recurring tasks over a date window.
+   
+   Occurrences are generated lazily from each task's recurrence rule, so the
+   cost depends on the size of the window rather than on how long the
+   schedule has existed.
+   
+   Args:
+       user_id (int): The user ID from the URL path
+       start (date): First day of the window (query parameter, YYYY-MM-DD)
+       end (date): Last day of the window, inclusive (defaults to start + 6 days)
+      
+   Returns:
+       JSON response with the occurrences in chronological order
+      
+   Example request:
+   GET /schedule/1/occurrences?start=2025-07-14&end=2025-07-20
+   """
+   try:
+       # Validate input
+       if not user_id or user_id <= 0:
+           raise HTTPException(
+               status_code=400,
+               detail="Valid user ID is required"
+           )
+       
+       if end is None:
+           end = start + timedelta(days=6)
+       
+       if end < start or (end - start).days >= MAX_OCCURRENCE_WINDOW_DAYS:
+           raise HTTPException(
+               status_code=400,
+               detail=f"End date must be on or after start date and within {MAX_OCCURRENCE_WINDOW_DAYS} days"
+           )
+      
+       # Get the cached schedule index
+       index = get_free_busy_index(user_id)
+       if index is None:
+           raise HTTPException(
+               status_code=404,
+               detail="No schedule found for this user"
+           )
+      
+       window_start = datetime.combine(start, time.min)
+       window_end = datetime.combine(end + timedelta(days=1), time.min)
+      
+       return {
+           "user_id": user_id,
+           "start": start.isoformat(),
+           "end": end.isoformat(),
+           "occurrences": [occurrence_to_dict(occurrence) for occurrence in index.recurrence.occurrences(window_start, window_end)]
+       }
+          
+   except HTTPException:
+       # Re-raise HTTP exceptions
+       raise
+   except Exception as e:
+       # Handle unexpected errors
+       print(f"Unexpected error in schedule occurrences endpoint: {e}")
+       raise HTTPException(
+           status_code=500,
+           detail="Internal server error"
+       )
+
+@app.get("/schedule/{user_id}/next")
+async def get_next_occurrences_endpoint(user_id: int, after: Optional[datetime] = None, limit: int = 1):
+   """
+   Get the next upcoming task occurrences for a user.
+   
+   Args:
+       user_id (int): The user ID from the URL path
+       after (datetime): Reference time (query parameter, defaults to now)
+       limit (int): Number of occurrences to return (1-100)
+      
+   Returns:
+       JSON response with the upcoming occurrences in chronological order
+      
+   Example request:
+   GET /schedule/1/next?after=2025-07-14T12:00:00&limit=3
+   """
+   try:
+       # Validate input
+       if not user_id or user_id <= 0:
+           raise HTTPException(
+               status_code=400,
+               detail="Valid user ID is required"
+           )
+       
+       if limit < 1 or limit > 100:
+           raise HTTPException(
+               status_code=400,
+               detail="Limit must be between 1 and 100"
+           )
+      
+       # Get the cached schedule index
+       index = get_free_busy_index(user_id)
+       if index is None:
+           raise HTTPException(
+               status_code=404,
+               detail="No schedule found for this user"
+           )
+      
+       # Schedule times are local wall-clock times, so drop any timezone offset
+       after = after.replace(tzinfo=None) if after else datetime.now()
+      
+       return {
+           "user_id": user_id,
+           "after": after.isoformat(),
+           "occurrences": [occurrence_to_dict(occurrence) for occurrence in index.recurrence.next_occurrences(after, limit)]
+       }
+          
+   except HTTPException:
+       # Re-raise HTTP exceptions
+       raise
+   except Exception as e:
+       # Handle unexpected errors
+       print(f"Unexpected error in next occurrences endpoint: {e}")
+       raise HTTPException(
+           status_code=500,
+           detail="Internal server error"
+       )
+
+@app.get("/schedule/{user_id}/free")
+async def get_free_windows_endpoint(user_id: int, start: datetime, end: datetime, min_minutes: int = 30):
+   """
+   Find the windows in which a user is free.
+   
+   Answers are served from a per-user sorted-interval index that is built from
+   the stored schedule once and rebuilt whenever the schedule is saved.
+   
+   Args:
+       user_id (int): The user ID from the URL path
+       start (datetime): Start of the search window (query parameter)
+       end (datetime): End of the search window (query parameter)
+       min_minutes (int): Minimum length of a free window in minutes
+      
+   Returns:
+       JSON response with the free windows in chronological order
+      
+   Example request:
+   GET /schedule/1/free?start=2025-07-14T08:00:00&end=2025-07-14T18:00:00&min_minutes=45
+   """
+   try:
+       # Validate input
+       if not user_id or user_id <= 0:
+           raise HTTPException(
+               status_code=400,
+               detail="Valid user ID is required"
+           )
+       
+       # Schedule times are local wall-clock times, so drop any timezone offset
+       start = start.replace(tzinfo=None)
+       end = end.replace(tzinfo=None)
+       if end <= start or (end - start).days >= MAX_OCCURRENCE_WINDOW_DAYS:
+           raise HTTPException(
+               status_code=400,
+               detail=f"End must be after start and within {MAX_OCCURRENCE_WINDOW_DAYS} days"
+           )
+       
+       if min_minutes < 0:
+           raise HTTPException(
+               status_code=400,
+               detail="Minimum minutes cannot be negative"
+           )
+      
+       # Get the cached schedule index
+       index = get_free_busy_index(user_id)
+       if index is None:
+           raise HTTPException(
+               status_code=404,
+               detail="No schedule found for this user"
+           )
+      
+       return {
+           "user_id": user_id,
+           "start": start.isoformat(),
+           "end": end.isoformat(),
+           "min_minutes": min_minutes,
+           "free": [
+               {
+                   "start": free_start.isoformat(),
+                   "end": free_end.isoformat(),
+                   "minutes": int((free_end - free_start).total_seconds() // 60)
+               }
+               for free_start, free_end in index.free_windows(start, end, min_minutes)
+           ]
+       }
+          
+   except HTTPException:
+       # Re-raise HTTP exceptions
+       raise
+   except Exception as e:
+       # Handle unexpected errors
+       print(f"Unexpected error in free windows endpoint: {e}")
+       raise HTTPException(
+           status_code=500,
+           detail="Internal server error"
+       )
+
+@app.get("/schedules/export")
+async def export_schedules_endpoint(raw: bool = True, updated_since: Optional[datetime] = None):
+   """
+   Stream every stored schedule as NDJSON, one schedule per line.
+   
+   Rows are read from a single database cursor in batches, so the export runs
+   in constant memory regardless of the number of schedules.
+   
+   Args:
+       raw (bool): Pass the stored schedule JSON through without re-parsing it (default).
+           Set to false to decode and re-encode each schedule.
+       updated_since (datetime): Only export schedules updated at or after this time
+           (naive times are treated as UTC)
+      
+   Returns:
+       NDJSON stream of {"user_id", "schedule_data", "created_at", "updated_at"} objects
+      
+   Example request:
+   GET /schedules/export?updated_since=2025-07-01T00:00:00Z
+   """
+   since = None
+   if updated_since is not None:
+       # Stored timestamps are SQLite CURRENT_TIMESTAMP values in UTC
+       if updated_since.tzinfo is not None:
+           updated_since = updated_since.astimezone(timezone.utc).replace(tzinfo=None)
+       since = updated_since.strftime("%Y-%m-%d %H:%M:%S")
+   
+   def stream_rows():
+       for user_id, schedule_json, created_at, updated_at in iter_schedules(since, EXPORT_BATCH_SIZE):
+           if not raw:
+               schedule_json = dumps(loads(schedule_json))
+           yield (
+               f'{{"user_id": {user_id}, "schedule_data": {schedule_json}, '
+               f'"created_at": {dumps(created_at)}, "updated_at": {dumps(updated_at)}}}\n'
+           )
+   
+   return StreamingResponse(_chunked(stream_rows()), media_type="application/x-ndjson")
+
+@app.patch("/schedule/{user_id}", response_model=ScheduleResponse)
+async def patch_schedule_endpoint(user_id: int, patch_request: SchedulePatchRequest, session_user_id: Optional[int] = Depends(get_session_user_id)):
+   """
+   Apply partial changes to a user's schedule.
+   
+   Operations are applied server-side in one transaction, so clients only send
+   what changed. Each operation is either a per-day/per-task operation
+   (add, update, delete, replace_day, delete_day) or a JSON Patch operation
+   (add, replace, remove, test) addressed with a "path". If expected_updated_at
+   is given and the schedule has changed since, nothing is applied and 409 is returned.
+   
+   Args:
+       user_id (int): The user ID from the URL path
+       patch_request (SchedulePatchRequest): JSON object containing operations and expected_updated_at
+      
+   Returns:
+       ScheduleResponse: JSON response with status, message and the new updated_at
+      
+   Example request:
+   {
+       "expected_updated_at": "2025-07-14 12:00:00",
+       "operations": [
+           {"op": "update", "day": "monday", "index": 0, "task": {"start_time": "10:00 AM"}},
+           {"op": "add", "path": "/tuesday/-", "value": {"task_name": "Gym", "start_time": "06:00 PM", "end_time": "07:00 PM", "priority": false, "recurrence": "weekly"}}
+       ]
+   }
+   """
+   try:
+       # Validate input
+       if not user_id or user_id <= 0:
+           raise HTTPException(
+               status_code=400,
+               detail="Valid user ID is required"
+           )
+       
+       if not patch_request.operations:
+           raise HTTPException(
+               status_code=400,
+               detail="At least one operation is required"
+           )
+       
+       authorize_user(session_user_id, user_id)
+       
+       # Stored timestamps are naive UTC values
+       expected_updated_at = patch_request.expected_updated_at
+       if expected_updated_at is not None and expected_updated_at.tzinfo is not None:
+           expected_updated_at = expected_updated_at.astimezone(timezone.utc).replace(tzinfo=None)
+      
+       try:
+           result = update_schedule_data(
+               user_id,
+               lambda schedule_data: apply_operations(schedule_data, patch_request.operations),
+               expected_updated_at
+           )
+       except PatchError as e:
+           raise HTTPException(
+               status_code=422,
+               detail=str(e)
+           )
+      
+       # Return appropriate HTTP status based on response
+       if result["status"] == "success":
+           return ScheduleResponse(
+               status=result["status"],
+               message=result["message"],
+               user_id=user_id,
+               created_at=result["created_at"],
+               updated_at=result["updated_at"]
+           )
+       elif result["status"] == "not_found":
+           raise HTTPException(
+               status_code=404,
+               detail=result["message"]
+           )
+       elif result["status"] == "conflict":
+           raise HTTPException(
+               status_code=409,
+               detail=result["message"]
+           )
+       else:
+           raise HTTPException(
+               status_code=500,
+               detail=result["message"]
+           )
+          
+   except HTTPException:
+       # Re-raise HTTP exceptions
+       raise
+   except Exception as e:
+       # Handle unexpected errors
+       print(f"Unexpected error in schedule patch endpoint: {e}")
+       raise HTTPException(
+           status_code=500,
+           detail="Internal server error"
+       )
+
+@app.get("/schedule/{user_id}/versions")
+async def list_schedule_versions_endpoint(user_id: int):
+   """
+   List the saved versions of a user's schedule, newest first.
+   
+   Args:
+       user_id (int): The user ID from the URL path
+      
+   Returns:
+       JSON response with version numbers, storage kind (snapshot or delta), size and timestamp
+   """
+   try:
+       # Validate input
+       if not user_id or user_id <= 0:
+           raise HTTPException(
+               status_code=400,
+               detail="Valid user ID is required"
+           )
+      
+       versions = list_versions(user_id)
+       if not versions:
+           raise HTTPException(
+               status_code=404,
+               detail="No versions found for this user"
+           )
+      
+       return {"user_id": user_id, "versions": versions}
+          
+   except HTTPException:
+       # Re-raise HTTP exceptions
+       raise
+   except Exception as e:
+       # Handle unexpected errors
+       print(f"Unexpected error in schedule versions endpoint: {e}")
+       raise HTTPException(
+           status_code=500,
+           detail="Internal server error"
+       )
+
+@app.get("/schedule/{user_id}/versions/{version}")
+async def get_schedule_version_endpoint(user_id: int, version: int):
+   """
+   Get a saved version of a user's schedule.
+   
+   Args:
+       user_id (int): The user ID from the URL path
+       version (int): The version number from the URL path
+      
+   Returns:
+       JSON response with the version's schedule_data
+   """
+   try:
+       schedule_version = get_version(user_id, version)
+       if schedule_version is None:
+           raise HTTPException(
+               status_code=404,
+               detail="Version not found"
+           )
+      
+       return schedule_version
+          
+   except HTTPException:
+       # Re-raise HTTP exceptions
+       raise
+   except Exception as e:
+       # Handle unexpected errors
+       print(f"Unexpected error in schedule version endpoint: {e}")
+       raise HTTPException(
+           status_code=500,
+           detail="Internal server error"
+       )
+
+@app.get("/schedule/{user_id}/versions/{version}/diff")
+async def diff_schedule_version_endpoint(user_id: int, version: int, against: Optional[int] = None):
+   """
+   Show the changes between two versions of a user's schedule.
+   
+   Args:
+       user_id (int): The user ID from the URL path
+       version (int): The version to diff
+       against (int): The version to compare with (query parameter, defaults to the previous version)
+      
+   Returns:
+       JSON response with the changes that turn `against` into `version`
+      
+   Example request:
+   GET /schedule/1/versions/5/diff?against=2
+   """
+   try:
+       against = against if against is not None else version - 1
+       target = get_version(user_id, version)
+       base = get_version(user_id, against)
+       if target is None or base is None:
+           raise HTTPException(
+               status_code=404,
+               detail="Version not found"
+           )
+      
+       return {
+           "user_id": user_id,
+           "from_version": against,
+           "to_version": version,
+           "changes": delta_to_changes(compute_delta(base["schedule_data"], target["schedule_data"]))
+       }
+          
+   except HTTPException:
+       # Re-raise HTTP exceptions
+       raise
+   except Exception as e:
+       # Handle unexpected errors
+       print(f"Unexpected error in schedule version diff endpoint: {e}")
+       raise HTTPException(
+           status_code=500,
+           detail="Internal server error"
+       )
+
+@app.post("/schedule/{user_id}/versions/{version}/restore", response_model=ScheduleResponse)
+async def restore_schedule_version_endpoint(user_id: int, version: int, session_user_id: Optional[int] = Depends(get_session_user_id)):
+   """
+   Restore a saved version of a user's schedule.
+   
+   The restored schedule is saved like any other update, so it becomes the
+   newest version and the restore itself can be undone.
+   
+   Args:
+       user_id (int): The user ID from the URL path
+       version (int): The version to restore
+      
+   Returns:
+       ScheduleResponse: JSON response with status, message, and schedule information
+   """
+   try:
+       authorize_user(session_user_id, user_id)
+      
+       schedule_version = get_version(user_id, version)
+       if schedule_version is None:
+           raise HTTPException(
+               status_code=404,
+               detail="Version not found"
+           )
+      
+       result = save_schedule(user_id, schedule_version["schedule_data"])
+      
+       # Return appropriate HTTP status based on response
+       if result["status"] == "success":
+           result["message"] = f"Schedule restored to version {version}"
+           return ScheduleResponse(**result)
+       else:
+           raise HTTPException(
+               status_code=500,
+               detail=result["message"]
+           )
+          
+   except HTTPException:
+       # Re-raise HTTP exceptions
+       raise
+   except Exception as e:
+       # Handle unexpected errors
+       print(f"Unexpected error in schedule version restore endpoint: {e}")
+       raise HTTPException(
+           status_code=500,
+           detail="Internal server error"
+       )
+
 @app.post("/schedule/ai-save", response_model=AIScheduleResponse)
-async def save_ai_schedule_endpoint(schedule_request: AIScheduleSaveRequest):
+async def save_ai_schedule_endpoint(schedule_request: AIScheduleSaveRequest, session_user_id: Optional[int] = Depends(get_session_user_id)):
    """
    Save or update an AI-generated schedule for a user.
    
@@ -274,8 +1203,10 @@ async def save_ai_schedule_endpoint(schedule_request: AIScheduleSaveRequest):
                detail="Schedule data is required"
            )
       
-       # Validate that user exists
-       if not user_exists(schedule_request.user_id):
+       authorize_user(session_user_id, schedule_request.user_id)
+      
+       # Validate that user exists (a valid session already proves it)
+       if session_user_id is None and not user_exists(schedule_request.user_id):
            raise HTTPException(
                status_code=404,
                detail="User not found"
@@ -316,7 +1247,7 @@ async def save_ai_schedule_endpoint(schedule_request: AIScheduleSaveRequest):
        )
 
 @app.post("/schedule/generate")
-async def generate_ai_schedule_endpoint(request: dict):
+async def generate_ai_schedule_endpoint(request: dict, session_user_id: Optional[int] = Depends(get_session_user_id)):
    """
    Generate and save an AI schedule from a user prompt.
    
@@ -352,9 +1283,12 @@ async def generate_ai_schedule_endpoint(request: dict):
       
        user_id = request["user_id"]
        user_prompt = request["user_prompt"]
+       authorize_user(session_user_id, user_id)
       
-       # Use the complete workflow function
-       result = generate_and_save_schedule(user_prompt, user_id)
+       # Use the complete workflow function; a valid session already proves the user exists.
+       # It blocks on the LLM and the rate limiter, so it runs outside the event loop
+       result = await run_in_threadpool(generate_and_save_schedule, user_prompt, user_id,
+                                        verify_user=session_user_id is None)
       
        # Return appropriate HTTP status based on response
        if result["status"] == "success":
@@ -384,6 +1318,148 @@ async def generate_ai_schedule_endpoint(request: dict):
            detail="Internal server error"
        )
 
+def _validate_generate_item(item: Any) -> ScheduleGenerateRequest:
+   """
+   Validate one batch generation item, raising ValueError with a readable message.
+   """
+   if isinstance(item, Exception):
+       raise ValueError(f"Invalid JSON: {item}")
+   if not isinstance(item, dict):
+       raise ValueError("Each item must be an object with user_id and user_prompt")
+   try:
+       entry = ScheduleGenerateRequest(**item)
+   except ValidationError as e:
+       raise ValueError(f"Validation error: {e.errors()[0]['msg']}")
+   if entry.user_id <= 0:
+       raise ValueError("User ID is required")
+   if not entry.user_prompt.strip():
+       raise ValueError("User prompt is required")
+   return entry
+
+@app.post("/schedule/generate/batch")
+async def generate_ai_schedule_batch_endpoint(request: Request, session_user_id: Optional[int] = Depends(get_session_user_id)):
+   """
+   Generate and save AI schedules for many users in one request.
+   
+   The body is a JSON array of {"user_id", "user_prompt"} objects, or NDJSON with
+   one such object per line. User existence is checked for the whole batch with
+   one query. Generations then run in parallel, at most BATCH_GENERATION_CONCURRENCY
+   at a time across all batches, and every LLM request goes through the shared
+   rate limiter. Schedules that finish together are saved in one transaction, and
+   one NDJSON result line per item is streamed back as soon as it is saved or has
+   failed, so lines arrive in completion order; "index" is the item's position in
+   the input. With a session token, only the session's own user may be included.
+   
+   Example request (NDJSON):
+   {"user_id": 1, "user_prompt": "Math exam on Friday, soccer practice Tuesday and Thursday"}
+   {"user_id": 2, "user_prompt": "Finish my project by Wednesday"}
+   
+   Example response lines:
+   {"index": 1, "status": "success", "message": "AI schedule generated and saved successfully", "user_id": 2, ...}
+   {"index": 0, "status": "error", "message": "Failed to generate schedule: ...", "user_id": 1}
+   """
+   content_type = request.headers.get("content-type", "")
+   is_ndjson = "ndjson" in content_type or "jsonl" in content_type
+   body = await request.body()
+   
+   try:
+       if is_ndjson:
+           items = list(_iter_ndjson_items(body))
+       else:
+           items = loads(body)
+           if not isinstance(items, list):
+               raise ValueError("Expected a JSON array")
+   except ValueError:
+       raise HTTPException(
+           status_code=400,
+           detail="Request body must be a JSON array or NDJSON"
+       )
+   
+   if len(items) > MAX_BATCH_GENERATION_SIZE:
+       raise HTTPException(
+           status_code=400,
+           detail=f"A batch may contain at most {MAX_BATCH_GENERATION_SIZE} items"
+       )
+   
+   def error_line(index: int, user_id: Any, message: str) -> str:
+       return dumps({"index": index, "status": "error", "message": message, "user_id": user_id}) + "\n"
+   
+   async def generate(entry: ScheduleGenerateRequest) -> dict:
+       async with _batch_generation_slots:
+           return await run_in_threadpool(generate_converted_schedule, entry.user_prompt, entry.user_id)
+   
+   async def save_generated(generated: List[tuple]) -> str:
+       results = await run_in_threadpool(
+           bulk_save_schedules, [(result["user_id"], result["schedule_data"]) for _, result in generated])
+       lines = []
+       for (index, result), saved in zip(generated, results):
+           if saved["status"] == "success":
+               saved = {
+                   **saved,
+                   "message": "AI schedule generated and saved successfully",
+                   "schedule_data": result["schedule_data"],
+                   "original_schedule": result["original_schedule"]
+               }
+           lines.append(dumps({"index": index, **saved}) + "\n")
+       return "".join(lines)
+   
+   async def stream_results():
+       entries = []
+       for index, item in enumerate(items):
+           user_id = item.get("user_id") if isinstance(item, dict) else None
+           try:
+               entry = _validate_generate_item(item)
+           except ValueError as e:
+               yield error_line(index, user_id, str(e))
+               continue
+           if session_user_id is not None and session_user_id != entry.user_id:
+               yield error_line(index, user_id, "Session does not belong to this user")
+               continue
+           entries.append((index, entry))
+       
+       # One query for the whole batch, so no LLM call is spent on unknown users
+       existing_users = await run_in_threadpool(users_exist, list({entry.user_id for _, entry in entries}))
+       pending = {}
+       for index, entry in entries:
+           if entry.user_id not in existing_users:
+               yield error_line(index, entry.user_id, "User not found")
+           else:
+               pending[asyncio.ensure_future(generate(entry))] = (index, entry.user_id)
+       
+       try:
+           while pending:
+               done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+               lines = []
+               generated = []
+               for task in sorted(done, key=lambda task: pending[task][0]):
+                   index, user_id = pending.pop(task)
+                   try:
+                       result = task.result()
+                   except Exception as e:
+                       print(f"Unexpected error in batch schedule generation for user {user_id}: {e}")
+                       result = {"status": "error", "message": "Internal server error", "user_id": user_id}
+                   if result["status"] == "success":
+                       generated.append((index, result))
+                   else:
+                       lines.append(dumps({"index": index, **result}) + "\n")
+               if generated:
+                   lines.append(await save_generated(generated))
+               yield "".join(lines)
+       finally:
+           # The client went away: generations still waiting for a slot are not started
+           for task in pending:
+               task.cancel()
+   
+   return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+@app.get("/metrics")
+async def metrics_endpoint():
+   """
+   Expose pipeline stage latencies, LLM retries and token usage, validation
+   failure reasons and database timings in the Prometheus text format.
+   """
+   return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 @app.get("/health")
 async def health_check():
    """
@@ -395,11 +1471,13 @@ if __name__ == "__main__":
    """
    Run the FastAPI application using uvicorn when this file is executed directly.
    The server will run on http://localhost:8000 by default.
+   Set RELOAD=true to restart on code changes during development; use serve.py
+   to run several worker processes.
    """
    uvicorn.run(
        "main:app",
-       host="0.0.0.0",
-       port=8000,
-       reload=True,  # Enable auto-reload for development
+       host=os.getenv("HOST", "0.0.0.0"),
+       port=int(os.getenv("PORT", "8000")),
+       reload=os.getenv("RELOAD", "false").lower() in ("1", "true", "yes"),
        log_level="info"
    )
\ No newline at end of file
@@ -0,0 +1,315 @@
+import bisect
+import functools
+import glob
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from tracing import start_span, end_span # type: ignore
+
+# Histogram bucket upper bounds in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+# Content type of the Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+# Multi-process mode: with METRICS_DIR set, every process writes its metrics to
+# METRICS_DIR/metrics-<pid>.json every METRICS_FLUSH_SECONDS, and render() merges
+# the files of all processes (see serve.py)
+METRICS_DIR = os.getenv("METRICS_DIR")
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+
+def _escape_label(value: str) -> str:
+   """Escape a label value for the text exposition format."""
+   return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+   """Format label pairs as {name="value",...}, or nothing without labels."""
+   if not names:
+       return ""
+   pairs = ",".join(f'{name}="{_escape_label(value)}"' for name, value in zip(names, values))
+   return "{" + pairs + "}"
+
+def _format_value(value: float) -> str:
+   """Format a sample value."""
+   if value == float("inf"):
+       return "+Inf"
+   return repr(float(value))
+
+class Counter:
+   """
+   A monotonically increasing value per label combination.
+   """
+
+   def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+       self.name = name
+       self.documentation = documentation
+       self.labelnames = tuple(labelnames)
+       self._values: Dict[Tuple[str, ...], float] = {}
+       self._lock = threading.Lock()
+       REGISTRY.append(self)
+
+   def inc(self, amount: float = 1.0, **labels: Any):
+       """Increase the counter for the given labels."""
+       key = tuple(str(labels[name]) for name in self.labelnames)
+       with self._lock:
+           self._values[key] = self._values.get(key, 0.0) + amount
+
+   def snapshot(self) -> List[List[Any]]:
+       """Return the current values as [label values, value] pairs."""
+       with self._lock:
+           return [[list(key), value] for key, value in self._values.items()]
+
+   def merge(self, snapshots: List[List[List[Any]]]) -> Dict[Tuple[str, ...], float]:
+       """Add up snapshots from several processes."""
+       merged: Dict[Tuple[str, ...], float] = {}
+       for snapshot in snapshots:
+           for key, value in snapshot:
+               merged[tuple(key)] = merged.get(tuple(key), 0.0) + value
+       return merged
+
+   def collect(self, values: Optional[Dict[Tuple[str, ...], float]] = None) -> Iterator[str]:
+       """Yield the counter's exposition lines, for this process or for merged values."""
+       yield f"# HELP {self.name} {self.documentation}"
+       yield f"# TYPE {self.name} counter"
+       if values is None:
+           with self._lock:
+               values = dict(self._values)
+       for key, value in sorted(values.items()):
+           yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+class Histogram:
+   """
+   Observations counted into cumulative buckets per label combination.
+   """
+
+   def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                buckets: Sequence[float] = DEFAULT_BUCKETS):
+       self.name = name
+       self.documentation = documentation
+       self.labelnames = tuple(labelnames)
+       self.buckets = tuple(sorted(buckets))
+       # Per label combination: [count per bucket (+Inf last), sum]
+       self._values: Dict[Tuple[str, ...], List[Any]] = {}
+       self._lock = threading.Lock()
+       REGISTRY.append(self)
+
+   def observe(self, value: float, **labels: Any):
+       """Record one observation for the given labels."""
+       key = tuple(str(labels[name]) for name in self.labelnames)
+       index = bisect.bisect_left(self.buckets, value)
+       with self._lock:
+           entry = self._values.get(key)
+           if entry is None:
+               entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+           entry[0][index] += 1
+           entry[1] += value
+
+   def snapshot(self) -> List[List[Any]]:
+       """Return the current values as [label values, bucket counts, sum] entries."""
+       with self._lock:
+           return [[list(key), list(entry[0]), entry[1]] for key, entry in self._values.items()]
+
+   def merge(self, snapshots: List[List[List[Any]]]) -> Dict[Tuple[str, ...], List[Any]]:
+       """Add up snapshots from several processes."""
+       merged: Dict[Tuple[str, ...], List[Any]] = {}
+       for snapshot in snapshots:
+           for key, counts, total in snapshot:
+               entry = merged.setdefault(tuple(key), [[0] * (len(self.buckets) + 1), 0.0])
+               if len(counts) != len(entry[0]):
+                   continue  # Written with different buckets (an older version of this process)
+               entry[0] = [a + b for a, b in zip(entry[0], counts)]
+               entry[1] += total
+       return merged
+
+   def collect(self, values: Optional[Dict[Tuple[str, ...], List[Any]]] = None) -> Iterator[str]:
+       """Yield the histogram's exposition lines, for this process or for merged values."""
+       yield f"# HELP {self.name} {self.documentation}"
+       yield f"# TYPE {self.name} histogram"
+       if values is None:
+           with self._lock:
+               values = {key: [list(entry[0]), entry[1]] for key, entry in self._values.items()}
+       bucket_labels = self.labelnames + ("le",)
+       for key, (counts, total) in sorted(values.items()):
+           cumulative = 0
+           for bound, count in zip(self.buckets + (float("inf"),), counts):
+               cumulative += count
+               labels = _format_labels(bucket_labels, key + (_format_value(bound),))
+               yield f"{self.name}_bucket{labels} {cumulative}"
+           labels = _format_labels(self.labelnames, key)
+           yield f"{self.name}_sum{labels} {_format_value(total)}"
+           yield f"{self.name}_count{labels} {cumulative}"
+
+# All metrics, in registration order
+REGISTRY: List[Any] = []
+
+STAGE_DURATION = Histogram(
+   "schedule_stage_duration_seconds",
+   "Latency of schedule generation pipeline stages",
+   ("stage",)
+)
+STAGE_ERRORS = Counter(
+   "schedule_stage_errors_total",
+   "Pipeline stages that raised an exception",
+   ("stage",)
+)
+DB_QUERY_DURATION = Histogram(
+   "db_query_duration_seconds",
+   "Latency of database operations",
+   ("operation",),
+   buckets=DB_BUCKETS
+)
+DB_QUERY_ERRORS = Counter(
+   "db_query_errors_total",
+   "Database operations that raised an exception",
+   ("operation",)
+)
+LLM_RETRIES = Counter(
+   "llm_retries_total",
+   "LLM calls made after a failed schedule attempt"
+)
+LLM_STREAM_ABORTS = Counter(
+   "llm_stream_aborts_total",
+   "Streamed LLM outputs abandoned at the first validation error"
+)
+LLM_TOKENS = Counter(
+   "llm_tokens_total",
+   "Tokens used by LLM calls",
+   ("kind",)
+)
+RETRIEVAL_REQUESTS = Counter(
+   "retrieval_requests_total",
+   "Context retrievals by mode: lexical (query embedding skipped) or hybrid",
+   ("mode",)
+)
+VALIDATION_FAILURES = Counter(
+   "schedule_validation_failures_total",
+   "LLM outputs rejected by schedule validation",
+   ("reason",)
+)
+
+class timed:
+   """
+   Time a block or function into a histogram.
+
+   Usable as a context manager (``with timed("llm"):``) or as a decorator
+   (``@timed("retrieval")``). Blocks that raise are also counted in the
+   matching errors counter. When the current request is traced, the block
+   is also recorded as a span.
+   """
+
+   def __init__(self, name: str, histogram: Histogram = STAGE_DURATION, errors: Optional[Counter] = STAGE_ERRORS,
+                kind: str = "stage"):
+       self.name = name
+       self.histogram = histogram
+       self.errors = errors
+       self.kind = kind
+       self._started: List[Tuple[float, Any]] = []
+
+   def __enter__(self) -> "timed":
+       self._started.append((time.perf_counter(), start_span(self.name, self.kind)))
+       return self
+
+   def __exit__(self, exc_type, exc, tb) -> bool:
+       started, span = self._started.pop()
+       elapsed = time.perf_counter() - started
+       end_span(span, exc)
+       label = self.histogram.labelnames[0]
+       self.histogram.observe(elapsed, **{label: self.name})
+       if exc_type is not None and self.errors is not None:
+           self.errors.inc(**{self.errors.labelnames[0]: self.name})
+       return False
+
+   def __call__(self, func: Callable) -> Callable:
+       @functools.wraps(func)
+       def wrapper(*args, **kwargs):
+           # A fresh instance per call keeps concurrent calls from sharing start times
+           with timed(self.name, self.histogram, self.errors, self.kind):
+               return func(*args, **kwargs)
+       return wrapper
+
+def timed_query(operation: str) -> timed:
+   """Time a database operation into db_query_duration_seconds."""
+   return timed(operation, DB_QUERY_DURATION, DB_QUERY_ERRORS, kind="db")
+
+def record_llm_usage(response: Any):
+   """Add the token usage reported on an OpenAI response, if any."""
+   usage = getattr(response, "usage", None)
+   if usage is None:
+       return
+   for kind in ("prompt_tokens", "completion_tokens"):
+       count = getattr(usage, kind, None)
+       if count:
+           LLM_TOKENS.inc(count, kind=kind.replace("_tokens", ""))
+
+def _snapshot_path(pid: int) -> str:
+   return os.path.join(METRICS_DIR or "", f"metrics-{pid}.json")
+
+def write_snapshot():
+   """Write this process's metrics to its file in METRICS_DIR (atomically)."""
+   if not METRICS_DIR:
+       return
+   snapshot = {metric.name: metric.snapshot() for metric in REGISTRY}
+   path = _snapshot_path(os.getpid())
+   temporary = f"{path}.tmp"
+   with open(temporary, "w") as f:
+       json.dump(snapshot, f)
+   os.replace(temporary, path)
+
+def _read_snapshots() -> List[Dict[str, Any]]:
+   snapshots = []
+   for path in glob.glob(os.path.join(METRICS_DIR or "", "metrics-*.json")):
+       try:
+           with open(path) as f:
+               snapshots.append(json.load(f))
+       except (OSError, ValueError):
+           continue  # Removed or being replaced; its values come back on the next scrape
+   return snapshots
+
+_writer_started = False
+
+def start_snapshot_writer():
+   """
+   In multi-process mode, write this process's metrics every METRICS_FLUSH_SECONDS
+   from a background thread. Does nothing without METRICS_DIR.
+   """
+   global _writer_started
+   if not METRICS_DIR or _writer_started:
+       return
+   _writer_started = True
+   os.makedirs(METRICS_DIR, exist_ok=True)
+
+   def run():
+       while True:
+           try:
+               write_snapshot()
+           except OSError as e:
+               print(f"Error writing metrics snapshot: {e}")
+           time.sleep(METRICS_FLUSH_SECONDS)
+
+   threading.Thread(target=run, name="metrics-snapshot-writer", daemon=True).start()
+
+def render() -> str:
+   """
+   Render every registered metric in the Prometheus text exposition format.
+
+   In multi-process mode (METRICS_DIR set) the values of all processes are added
+   up, using this process's current values and the other processes' latest
+   snapshots (at most METRICS_FLUSH_SECONDS old). Snapshots of exited processes
+   are kept, so counters do not go backwards when a worker restarts.
+
+   Returns:
+       str: The exposition document
+   """
+   lines: List[str] = []
+   if METRICS_DIR:
+       write_snapshot()
+       snapshots = _read_snapshots()
+       for metric in REGISTRY:
+           lines.extend(metric.collect(metric.merge([snapshot.get(metric.name, []) for snapshot in snapshots])))
+   else:
+       for metric in REGISTRY:
+           lines.extend(metric.collect())
+   return "\n".join(lines) + "\n"
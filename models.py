@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from datetime import datetime
 
 class UserRequest(BaseModel):
@@ -20,11 +20,14 @@ class UserResponse(BaseModel):
    username: Optional[str] = None
    user_id: Optional[int] = None
    created_at: Optional[datetime] = None
+   token: Optional[str] = None
+   token_expires_at: Optional[datetime] = None
 
 class User(BaseModel):
    """
    Pydantic model representing a user in the database.
    Used for internal data handling and response formatting.
+   The password field holds the stored password hash.
    """
    id: int
    username: str
@@ -39,6 +42,14 @@ class ScheduleSaveRequest(BaseModel):
    user_id: int
    schedule_data: Dict[str, Any]
 
+class ScheduleGenerateRequest(BaseModel):
+   """
+   Pydantic model for AI schedule generation requests.
+   Contains the user_id to save the schedule for and the user_prompt describing it.
+   """
+   user_id: int
+   user_prompt: str
+
 class ScheduleResponse(BaseModel):
    """
    Pydantic model for schedule responses.
@@ -93,4 +104,25 @@ class AIScheduleResponse(BaseModel):
    user_id: int
    schedule_data: AIScheduleData
    created_at: Optional[datetime] = None
-   updated_at: Optional[datetime] = None
\ No newline at end of file
+   updated_at: Optional[datetime] = None
+
+class GroupAvailabilityRequest(BaseModel):
+   """
+   Pydantic model for group availability requests.
+   Contains the users to schedule together and the window to search.
+   """
+   user_ids: List[int]
+   start: datetime
+   end: datetime
+   min_minutes: int = 30
+   granularity_minutes: int = 5
+   limit: int = 10
+
+class SchedulePatchRequest(BaseModel):
+   """
+   Pydantic model for partial schedule updates.
+   Contains the operations to apply and, optionally, the updated_at timestamp
+   the client last saw for optimistic concurrency.
+   """
+   operations: List[Dict[str, Any]]
+   expected_updated_at: Optional[datetime] = None
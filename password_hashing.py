@@ -0,0 +1,106 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional
+
+# Hashing configuration (tunable through environment variables)
+PASSWORD_HASH_ALGORITHM = os.getenv("PASSWORD_HASH_ALGORITHM", "pbkdf2_sha256")
+PASSWORD_HASH_ITERATIONS = int(os.getenv("PASSWORD_HASH_ITERATIONS", "600000"))
+PASSWORD_SCRYPT_N = int(os.getenv("PASSWORD_SCRYPT_N", "16384"))
+PASSWORD_SCRYPT_R = int(os.getenv("PASSWORD_SCRYPT_R", "8"))
+PASSWORD_SCRYPT_P = int(os.getenv("PASSWORD_SCRYPT_P", "1"))
+SALT_BYTES = 16
+
+# Worker pool configuration: hashing runs on these threads (hashlib releases the GIL),
+# and at most PASSWORD_HASH_MAX_PENDING requests may be queued or running at once
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", str(PASSWORD_HASH_WORKERS * 8)))
+
+password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+_pending_limit: Optional[asyncio.Semaphore] = None
+
+def _b64encode(value: bytes) -> str:
+   """Encode bytes as base64 text."""
+   return base64.b64encode(value).decode("ascii")
+
+def _b64decode(value: str) -> bytes:
+   """Decode base64 text to bytes."""
+   return base64.b64decode(value.encode("ascii"))
+
+def hash_password(password: str) -> str:
+   """
+   Hash a password with a random salt using the configured KDF.
+
+   Args:
+       password (str): The plain text password
+
+   Returns:
+       str: Encoded hash, e.g. "pbkdf2_sha256$600000$<salt>$<hash>" or "scrypt$16384$8$1$<salt>$<hash>"
+   """
+   salt = secrets.token_bytes(SALT_BYTES)
+   if PASSWORD_HASH_ALGORITHM == "scrypt":
+       derived = hashlib.scrypt(
+           password.encode("utf-8"), salt=salt,
+           n=PASSWORD_SCRYPT_N, r=PASSWORD_SCRYPT_R, p=PASSWORD_SCRYPT_P,
+           maxmem=256 * PASSWORD_SCRYPT_N * PASSWORD_SCRYPT_R
+       )
+       return f"scrypt${PASSWORD_SCRYPT_N}${PASSWORD_SCRYPT_R}${PASSWORD_SCRYPT_P}${_b64encode(salt)}${_b64encode(derived)}"
+
+   derived = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, PASSWORD_HASH_ITERATIONS)
+   return f"pbkdf2_sha256${PASSWORD_HASH_ITERATIONS}${_b64encode(salt)}${_b64encode(derived)}"
+
+def verify_password(password: str, stored: str) -> bool:
+   """
+   Check a password against a stored value in constant time.
+   Legacy rows that still hold the plain text password are compared directly.
+
+   Args:
+       password (str): The password provided by the user
+       stored (str): The value from the users table
+
+   Returns:
+       bool: True if the password matches
+   """
+   try:
+       if stored.startswith("pbkdf2_sha256$"):
+           _, iterations, salt, expected = stored.split("$")
+           derived = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), _b64decode(salt), int(iterations))
+           return hmac.compare_digest(derived, _b64decode(expected))
+       if stored.startswith("scrypt$"):
+           _, n, r, p, salt, expected = stored.split("$")
+           derived = hashlib.scrypt(
+               password.encode("utf-8"), salt=_b64decode(salt),
+               n=int(n), r=int(r), p=int(p), maxmem=256 * int(n) * int(r)
+           )
+           return hmac.compare_digest(derived, _b64decode(expected))
+   except (ValueError, TypeError):
+       return False
+   return hmac.compare_digest(password.encode("utf-8"), stored.encode("utf-8"))
+
+def needs_rehash(stored: str) -> bool:
+   """
+   Return True if a stored value should be re-hashed with the current settings:
+   legacy plain text, a different algorithm, or a lower cost factor.
+   """
+   if PASSWORD_HASH_ALGORITHM == "scrypt":
+       return not stored.startswith(f"scrypt${PASSWORD_SCRYPT_N}${PASSWORD_SCRYPT_R}${PASSWORD_SCRYPT_P}$")
+   return not stored.startswith(f"pbkdf2_sha256${PASSWORD_HASH_ITERATIONS}$")
+
+async def run_in_password_pool(func: Callable[..., Any], *args: Any) -> Any:
+   """
+   Run a password-hashing workload on the dedicated worker pool.
+
+   Keeps the event loop free while the KDF runs. Callers beyond
+   PASSWORD_HASH_MAX_PENDING wait for a slot instead of growing the queue.
+   """
+   global _pending_limit
+   if _pending_limit is None:
+       _pending_limit = asyncio.Semaphore(PASSWORD_HASH_MAX_PENDING)
+   async with _pending_limit:
+       loop = asyncio.get_running_loop()
+       return await loop.run_in_executor(password_executor, partial(func, *args))
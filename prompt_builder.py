@@ -0,0 +1,214 @@
+import math
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+try:
+   import tiktoken
+except ImportError:  # Optional: fall back to a character-based estimate
+   tiktoken = None
+
+# Token budget for retrieved document context in each request (tunable through environment variables)
+PROMPT_CONTEXT_TOKEN_BUDGET = int(os.getenv("PROMPT_CONTEXT_TOKEN_BUDGET", "1500"))
+PROMPT_TOKENIZER_MODEL = os.getenv("PROMPT_TOKENIZER_MODEL", "gpt-3.5-turbo")
+
+# Average characters per token for English text, used when tiktoken is not installed
+CHARS_PER_TOKEN = 4
+
+# Static instructions sent as the system message. The text must not change between
+# requests (no dates or user data) so that provider-side prompt caching can reuse it;
+# per-request values go in the user message instead.
+SYSTEM_PROMPT = """
+   You are an expert AI assistant specializing in generating personalized, structured daily schedules based on a user's goals, preferences, and contextual data. The user provides a scheduling prompt describing their needs, including classwork, extracurricular activities, personal tasks, and other commitments.
+   The user may also upload supporting documents such as existing schedules or notes, and specify whether their request applies to a repeating schedule (e.g., every day) or to specific days of the week, using button-based inputs. Your task is to create a clear, realistic, and organized schedule that maximizes productivity while ensuring all tasks are addressed.
+   Prioritize tasks identified as high priority, either explicitly marked by the user or clearly indicated through context. If the priority level of a task is unclear, do not assume; instead, prompt the user for confirmation before proceeding. Ensure high-priority tasks are scheduled first with sufficient focus time while respecting unmovable tasks (such as fixed classes or appointments).
+   Construct the schedule with no overlapping tasks, appropriate breaks between sessions, and time slots that align with typical daily routines. If a task or request cannot be fully accommodated based on the user's constraints, provide a brief, clear explanation in plain text and suggest that the user refine their input for greater specificity.
+  
+   CRITICAL: You MUST return the schedule in the following EXACT JSON format. The date keys MUST be in MM/DD/YYYY format (e.g., "7/13/2025", "12/25/2024"), NOT day names like "Monday" or "Tuesday". Convert any day references to actual dates.
+  
+   CURRENT DATE AND TIME CONTEXT:
+   - Today's date and the current time are given at the start of each request
+   - Use them as your reference point for all date calculations
+  
+   DATE AND TIME AWARENESS:
+   - Use the current date from the request as your reference point for scheduling
+   - Interpret user's natural language for time references with context awareness
+   - Consider urgency indicators: "by tomorrow", "urgent", "asap", "due soon" = high priority
+   - Understand implied timelines: "when possible", "sometime this week", "when I have time" = flexible
+   - Convert relative references to actual dates based on context and urgency
+   - "tomorrow" typically means next day, but consider if user means "by tomorrow" (urgent) vs "for tomorrow" (planned)
+   - "next [day]" = next occurrence of that day from current date
+   - "this [day]" = this week's occurrence of that day
+   - "next week" = 7+ days from current date
+   - Consider user's implied timeline and urgency from context clues
+   - Use realistic, current dates that make sense for the user's timeline
+   - All dates should be in the current year or near future, not past dates
+  
+   Each task object should contain:
+   - task_name: string
+   - start_time: string (formatted as "HH:MM AM/PM")
+   - end_time: string (formatted as "HH:MM AM/PM")
+   - priority: boolean (true if marked high-priority)
+   - recurrence: string (use standard values: 'daily', 'weekly', 'monthly', 'none', or specific days like 'Monday', 'Tuesday', etc.)
+
+
+   CORRECT Example Format:
+   {
+   "7/13/2025": [
+       {
+       "task_name": "Math Study",
+       "start_time": "09:00 AM",
+       "end_time": "10:00 AM",
+       "priority": true,
+       "recurrence": "weekly"
+       },
+       {
+       "task_name": "Physics Review",
+       "start_time": "10:15 AM",
+       "end_time": "11:00 AM",
+       "priority": false,
+       "recurrence": "daily"
+       }
+   ],
+   "7/14/2025": [
+       {
+       "task_name": "English Essay",
+       "start_time": "02:00 PM",
+       "end_time": "04:00 PM",
+       "priority": true,
+       "recurrence": "none"
+       }
+   ]
+   }
+
+
+   INCORRECT Example (DO NOT USE):
+   {
+   "Monday": [...],  // WRONG - use "7/13/2025" instead
+   "Tuesday": [...],  // WRONG - use "7/14/2025" instead
+   "Friday": [...]    // WRONG - use "7/17/2025" instead
+   }
+
+   IMPORTANT RULES:
+   1. Date keys MUST be in MM/DD/YYYY format (e.g., "7/13/2025", "12/25/2024")
+   2. NEVER use day names like "Monday", "Tuesday", "Friday" as date keys
+   3. Convert any day references in the user's request to actual dates based on the current date from the request
+   4. Use realistic dates that make sense for the current time period
+   5. Maintain clarity, balance, and logical task distribution
+   6. Make reasonable assumptions if any user input is ambiguous
+   7. Clearly note any assumptions or required clarifications in a short text response alongside the JSON output
+   8. Always use the current date from the request as reference point for relative date calculations
+   9. Do NOT use dates from the past - only use current date or future dates
+   10. PRIORITY SCHEDULING: When user says "by [timeframe]", schedule that task for the earliest possible time within that constraint
+   11. TASK CONSOLIDATION: Don't split single tasks across multiple days unless explicitly requested or necessary
+   12. URGENCY INTERPRETATION: "urgent", "asap", "due soon", "by [date]" = high priority and immediate scheduling
+   13. RECURRENCE STANDARDS: Use 'daily' for every day tasks, 'weekly' for weekly recurring tasks, 'monthly' for monthly tasks, 'none' for one-time tasks
+"""
+
+_encoding: Any = None
+
+def estimate_tokens(text: str) -> int:
+   """
+   Count the tokens in a text with tiktoken when it is installed,
+   otherwise estimate about four characters per token.
+   """
+   global _encoding
+   if tiktoken is not None:
+       if _encoding is None:
+           try:
+               _encoding = tiktoken.encoding_for_model(PROMPT_TOKENIZER_MODEL)
+           except KeyError:
+               _encoding = tiktoken.get_encoding("cl100k_base")
+       return len(_encoding.encode(text))
+   return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def pack_context(chunks: List[str], budget_tokens: int = PROMPT_CONTEXT_TOKEN_BUDGET) -> List[str]:
+   """
+   Select retrieved chunks, most relevant first, that fit within a token budget.
+
+   Chunks that would overflow the budget are skipped so that smaller, less
+   relevant chunks can still use the remaining space. Duplicate chunks are
+   dropped.
+
+   Args:
+       chunks (List[str]): Retrieved chunks in relevance order
+       budget_tokens (int): Maximum total tokens of the selected chunks
+
+   Returns:
+       List[str]: The selected chunks, in relevance order
+   """
+   selected = []
+   seen = set()
+   remaining = budget_tokens
+   for chunk in chunks:
+       text = chunk.strip()
+       if not text or text in seen:
+           continue
+       # Each chunk is followed by a blank line separator
+       cost = estimate_tokens(text) + 1
+       if cost > remaining:
+           continue
+       selected.append(text)
+       seen.add(text)
+       remaining -= cost
+   return selected
+
+def build_user_message(user_prompt: str, context_chunks: List[str], now: Optional[datetime] = None) -> str:
+   """
+   Build the per-request user message: current date and time, the user's
+   request and the packed document context.
+   """
+   now = now or datetime.now()
+   parts = [
+       f"Today's date: {now.strftime('%m/%d/%Y')} ({now.strftime('%A')})",
+       f"Current time: {now.strftime('%I:%M %p')}",
+       "",
+       f"User Request: {user_prompt}"
+   ]
+   if context_chunks:
+       parts += ["", "Context from the user's documents:", "\n\n".join(context_chunks)]
+   parts += ["", "Please generate a schedule in the exact JSON format specified."]
+   return "\n".join(parts)
+
+def build_messages(user_prompt: str, context_chunks: List[str], now: Optional[datetime] = None,
+                   budget_tokens: int = PROMPT_CONTEXT_TOKEN_BUDGET) -> List[Dict[str, str]]:
+   """
+   Assemble the chat messages for a schedule request.
+
+   Args:
+       user_prompt (str): The user's scheduling request
+       context_chunks (List[str]): Retrieved document chunks in relevance order
+       now (Optional[datetime]): Reference time for relative dates (defaults to now)
+       budget_tokens (int): Token budget for the document context
+
+   Returns:
+       List[Dict[str, str]]: The static system message followed by the request
+   """
+   packed = pack_context(context_chunks, budget_tokens)
+   return [
+       {"role": "system", "content": SYSTEM_PROMPT},
+       {"role": "user", "content": build_user_message(user_prompt, packed, now)}
+   ]
+
+def build_retry_messages(messages: List[Dict[str, str]], failed_output: str, error_message: str) -> List[Dict[str, str]]:
+   """
+   Extend the original request with the rejected output and the validation errors.
+
+   The system message, request and context are kept unchanged, so the retry
+   shares the cached prefix. Only the latest failed attempt is included.
+
+   Args:
+       messages (List[Dict[str, str]]): Messages from build_messages
+       failed_output (str): The output that failed validation
+       error_message (str): Formatted validation errors
+
+   Returns:
+       List[Dict[str, str]]: Messages for the retry request
+   """
+   return messages[:2] + [
+       {"role": "assistant", "content": failed_output},
+       {"role": "user", "content": (
+           "Previous attempt failed validation. Please fix these issues:\n"
+           f"{error_message}\n\nGenerate a corrected schedule in the exact JSON format specified."
+       )}
+   ]
@@ -0,0 +1,45 @@
+import os
+import threading
+import time
+from metrics import timed # type: ignore
+
+# LLM request rate limit, shared by every generation in this process (tunable through environment variables)
+# LLM_REQUESTS_PER_MINUTE: 0 disables the limit; under serve.py each worker applies it separately
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "0"))
+# Requests that may be sent back to back after an idle period
+LLM_RATE_LIMIT_BURST = int(os.getenv("LLM_RATE_LIMIT_BURST", "1"))
+
+class RateLimiter:
+   """
+   Thread-safe limiter spacing requests evenly at a fixed rate, with an optional burst.
+
+   Each acquire() reserves the next free send time and sleeps until it, so
+   callers on any thread are served in arrival order and a batch of requests
+   cannot exceed the rate between them.
+   """
+
+   def __init__(self, requests_per_minute: float, burst: int = 1):
+       self.interval = 60.0 / requests_per_minute if requests_per_minute > 0 else 0.0
+       self.burst = max(1, burst)
+       self._next = 0.0
+       self._lock = threading.Lock()
+
+   def reserve(self) -> float:
+       """Reserve a send slot and return the seconds to wait for it."""
+       if not self.interval:
+           return 0.0
+       with self._lock:
+           now = time.monotonic()
+           # Slots left unused while idle can be spent at once, up to the burst size
+           start = max(self._next, now - (self.burst - 1) * self.interval)
+           self._next = start + self.interval
+           return max(0.0, start - now)
+
+   def acquire(self):
+       """Block until the next request may be sent."""
+       wait = self.reserve()
+       if wait > 0:
+           with timed("rate_limit_wait"):
+               time.sleep(wait)
+
+llm_rate_limiter = RateLimiter(LLM_REQUESTS_PER_MINUTE, LLM_RATE_LIMIT_BURST)
@@ -0,0 +1,284 @@
+import heapq
+import re
+from datetime import date, datetime, time, timedelta
+from itertools import islice
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional
+
+# Weekday names as used for schedule keys and recurrence values
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+# Date key formats produced by the LLM ("7/13/2025") or by API clients ("2025-07-13")
+DATE_KEY_PATTERN = re.compile(r'^(\d{1,2})/(\d{1,2})/(\d{4})$')
+
+# Recurrence kinds understood by the engine
+ONCE = "once"
+DAILY = "daily"
+WEEKDAYS_RULE = "weekdays"
+MONTHLY = "monthly"
+
+class Occurrence(NamedTuple):
+   """
+   A single expanded occurrence of a scheduled task.
+   """
+   start: datetime
+   end: datetime
+   task: Dict[str, Any]
+
+def parse_clock_time(value: str) -> Optional[time]:
+   """
+   Parse a time of day as stored in schedules.
+
+   Accepts both the 12-hour format used by the AI schedules ("09:00 AM", "9:00 AM")
+   and the 24-hour format accepted by /schedule/ai-save ("14:00").
+
+   Args:
+       value (str): The time string
+
+   Returns:
+       Optional[time]: Parsed time, or None if the string is not a recognised time
+   """
+   if not isinstance(value, str):
+       return None
+   value = value.strip().upper()
+   for time_format in ("%I:%M %p", "%I:%M%p", "%H:%M"):
+       try:
+           return datetime.strptime(value, time_format).time()
+       except ValueError:
+           continue
+   return None
+
+def parse_schedule_key(key: str) -> tuple[Optional[int], Optional[date]]:
+   """
+   Interpret a schedule key as either a weekday template or a concrete date.
+
+   Args:
+       key (str): A schedule key such as "monday", "7/13/2025" or "2025-07-13"
+
+   Returns:
+       tuple[Optional[int], Optional[date]]: (weekday, anchor_date) - exactly one is set
+           for a recognised key, both are None otherwise
+   """
+   normalized = key.strip().lower()
+   if normalized in WEEKDAYS:
+       return WEEKDAYS.index(normalized), None
+   match = DATE_KEY_PATTERN.match(normalized)
+   try:
+       if match:
+           month, day, year = (int(part) for part in match.groups())
+           return None, date(year, month, day)
+       return None, date.fromisoformat(normalized)
+   except ValueError:
+       return None, None
+
+def normalize_task(entry: Any) -> Optional[Dict[str, Any]]:
+   """
+   Normalise a schedule entry into a task dictionary.
+
+   AI schedules store task objects, while manual schedules may store plain
+   "9:00 AM - 5:00 PM" strings; both are returned as task dictionaries.
+   """
+   if isinstance(entry, dict):
+       return entry
+   if isinstance(entry, str) and "-" in entry:
+       start_time, _, end_time = entry.partition("-")
+       return {
+           "task_name": entry.strip(),
+           "start_time": start_time.strip(),
+           "end_time": end_time.strip(),
+           "priority": False,
+           "recurrence": "none"
+       }
+   return None
+
+class RecurrenceRule:
+   """
+   Compiled recurrence rule for one task.
+
+   Rules anchored to a date key ("7/13/2025") start on that date:
+   - none: occurs once on the anchor date
+   - daily: every day from the anchor date
+   - weekly: every 7 days from the anchor date
+   - monthly: on the anchor's day of month (months without that day are skipped)
+   - weekday names ("Monday, Wednesday"): on those weekdays from the anchor date
+
+   Rules from a weekday key ("monday") belong to a repeating weekly template and
+   have no start date:
+   - none / weekly: every week on that weekday
+   - daily: every day
+   - monthly: the first such weekday of each month
+   - weekday names: on those weekdays
+   """
+
+   def __init__(self, kind: str, weekdays: frozenset = frozenset(), anchor: Optional[date] = None,
+                template_weekday: Optional[int] = None):
+       self.kind = kind
+       self.weekdays = weekdays
+       self.anchor = anchor
+       self.template_weekday = template_weekday
+
+   @classmethod
+   def compile(cls, recurrence: Optional[str], weekday: Optional[int], anchor: Optional[date]) -> "RecurrenceRule":
+       """
+       Build a rule from a task's recurrence string and the schedule key it was found under.
+       """
+       value = (recurrence or "none").strip().lower()
+       named_days = frozenset(WEEKDAYS.index(day) for day in WEEKDAYS if day in value)
+       home_weekday = anchor.weekday() if anchor is not None else weekday
+
+       if value == "daily":
+           return cls(DAILY, anchor=anchor)
+       if value == "monthly":
+           return cls(MONTHLY, anchor=anchor, template_weekday=weekday)
+       if named_days:
+           return cls(WEEKDAYS_RULE, weekdays=named_days, anchor=anchor)
+       if anchor is not None and value != "weekly":
+           # Anchored one-off task (recurrence "none" or unrecognised)
+           return cls(ONCE, anchor=anchor)
+       return cls(WEEKDAYS_RULE, weekdays=frozenset([home_weekday]), anchor=anchor)
+
+   def first_on_or_after(self, day: date) -> Optional[date]:
+       """
+       Return the first date on or after `day` on which the rule occurs.
+       Runs in constant time regardless of how far `day` is from the anchor.
+       """
+       if self.anchor is not None and day < self.anchor:
+           day = self.anchor
+
+       if self.kind == ONCE:
+           return self.anchor if self.anchor >= day else None
+       if self.kind == DAILY:
+           return day
+       if self.kind == WEEKDAYS_RULE:
+           for offset in range(7):
+               candidate = day + timedelta(days=offset)
+               if candidate.weekday() in self.weekdays:
+                   return candidate
+           return None
+
+       # Monthly rules: try the month containing `day` and the following months
+       year, month = day.year, day.month
+       for _ in range(13):
+           candidate = self._monthly_date(year, month)
+           if candidate is not None and candidate >= day:
+               return candidate
+           year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+       return None
+
+   def _monthly_date(self, year: int, month: int) -> Optional[date]:
+       """Return the rule's occurrence within a given month, if any."""
+       if self.anchor is not None:
+           try:
+               return date(year, month, self.anchor.day)
+           except ValueError:
+               return None
+       first = date(year, month, 1)
+       return first + timedelta(days=(self.template_weekday - first.weekday()) % 7)
+
+   def occurs_on(self, day: date) -> bool:
+       """Return True if the rule has an occurrence on `day`."""
+       return self.first_on_or_after(day) == day
+
+   def iter_dates(self, start: date, end: Optional[date] = None) -> Iterator[date]:
+       """
+       Lazily yield occurrence dates between `start` and `end` (inclusive).
+       With no `end` the generator is unbounded.
+       """
+       current = self.first_on_or_after(start)
+       while current is not None and (end is None or current <= end):
+           yield current
+           if current == date.max:
+               return
+           current = self.first_on_or_after(current + timedelta(days=1))
+
+class RecurringTask:
+   """
+   A task from a stored schedule paired with its compiled recurrence rule.
+   """
+
+   def __init__(self, task: Dict[str, Any], rule: RecurrenceRule, start_time: time, end_time: time, key: str):
+       self.task = task
+       self.rule = rule
+       self.start_time = start_time
+       self.end_time = end_time
+       self.key = key
+
+   def iter_occurrences(self, start: datetime, end: Optional[datetime] = None) -> Iterator[Occurrence]:
+       """
+       Lazily yield occurrences that end after `start` and begin before `end`.
+       """
+       first_day = start.date() - timedelta(days=1) if self.end_time <= self.start_time else start.date()
+       last_day = end.date() if end is not None else None
+       for day in self.rule.iter_dates(first_day, last_day):
+           occurrence = self.occurrence_on(day)
+           if occurrence.end <= start:
+               continue
+           if end is not None and occurrence.start >= end:
+               return
+           yield occurrence
+
+   def occurrence_on(self, day: date) -> Occurrence:
+       """Build the occurrence of this task on a given date."""
+       start = datetime.combine(day, self.start_time)
+       end = datetime.combine(day, self.end_time)
+       if end <= start:
+           # Tasks ending at or before their start time run past midnight
+           end += timedelta(days=1)
+       return Occurrence(start=start, end=end, task=self.task)
+
+class RecurrenceIndex:
+   """
+   Occurrence index over a stored schedule.
+
+   Each task is compiled once into a RecurrenceRule. Window queries merge the
+   per-task generators lazily, so the cost of a query is proportional to the
+   number of occurrences in the window rather than to the schedule's history,
+   and "what's next" queries jump directly to each task's next occurrence.
+   """
+
+   def __init__(self, schedule_data: Dict[str, Any]):
+       self.tasks: List[RecurringTask] = []
+       for key, entries in (schedule_data or {}).items():
+           weekday, anchor = parse_schedule_key(key)
+           if (weekday is None and anchor is None) or not isinstance(entries, list):
+               continue
+           for entry in entries:
+               task = normalize_task(entry)
+               if task is None:
+                   continue
+               start_time = parse_clock_time(task.get("start_time"))
+               end_time = parse_clock_time(task.get("end_time"))
+               if start_time is None or end_time is None:
+                   continue
+               rule = RecurrenceRule.compile(task.get("recurrence"), weekday, anchor)
+               self.tasks.append(RecurringTask(task, rule, start_time, end_time, key))
+
+   def occurrences(self, start: datetime, end: Optional[datetime] = None) -> Iterator[Occurrence]:
+       """
+       Lazily yield all occurrences overlapping [start, end) in chronological order.
+
+       Args:
+           start (datetime): Start of the window
+           end (Optional[datetime]): End of the window, or None for an unbounded stream
+
+       Returns:
+           Iterator[Occurrence]: Occurrences ordered by start time
+       """
+       streams = [recurring.iter_occurrences(start, end) for recurring in self.tasks]
+       return heapq.merge(*streams, key=lambda occurrence: (occurrence.start, occurrence.end))
+
+   def next_occurrences(self, after: datetime, limit: int = 1) -> List[Occurrence]:
+       """
+       Return the next `limit` occurrences starting at or after `after`.
+       """
+       upcoming = (occurrence for occurrence in self.occurrences(after) if occurrence.start >= after)
+       return list(islice(upcoming, limit))
+
+def occurrence_to_dict(occurrence: Occurrence) -> Dict[str, Any]:
+   """
+   Convert an occurrence into a JSON-serialisable dictionary.
+   """
+   result = dict(occurrence.task)
+   result["date"] = occurrence.start.date().isoformat()
+   result["start"] = occurrence.start.isoformat()
+   result["end"] = occurrence.end.isoformat()
+   return result
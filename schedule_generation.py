@@ -5,19 +5,23 @@ import openai
 import json
 from pydantic import BaseModel, ValidationError, Field, field_validator, RootModel
 import re
-from typing import Dict, List, Union, Any
+from typing import Dict, List, Optional, Union, Any
 from datetime import datetime, time
 import logging
 import os
 from dotenv import load_dotenv
-import chromadb
-from chromadb.utils.embedding_functions import OpenAIEmbeddingFunction
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from metrics import timed, record_llm_usage, LLM_RETRIES, LLM_STREAM_ABORTS, RETRIEVAL_REQUESTS, VALIDATION_FAILURES # type: ignore
+from prompt_builder import build_messages, build_retry_messages # type: ignore
+from chunking import chunk_documents, chunk_text, PAGE_BREAK # type: ignore
+from embeddings import get_embedding_backend, ChromaEmbeddingFunction # type: ignore
+from vector_store import get_collection, namespace_for_user # type: ignore
+from lexical_index import get_lexical_index, is_strong_hit, reciprocal_rank_fusion # type: ignore
+from stream_validation import IncrementalScheduleParser # type: ignore
+from rate_limiting import llm_rate_limiter # type: ignore
 
 load_dotenv()
 
 UPLOAD_FOLDER = "uploads"
-MODEL = "text-embedding-3-small"
 
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
@@ -25,20 +29,22 @@ logger = logging.getLogger(__name__)
 
 model = "gpt-3.5-turbo"
 
-chroma_client = chromadb.Client()
-collection = chroma_client.create_collection(
-    name="my_collection",
-    embedding_function=OpenAIEmbeddingFunction(
-        api_key=os.getenv("OPENAI_API_KEY"),
-        model_name="text-embedding-3-small"
-    )
-)
+# Stream completions and validate each date and task as it arrives, abandoning
+# the attempt at the first error (tunable through environment variables)
+STREAM_VALIDATION = os.getenv("STREAM_VALIDATION", "true").lower() == "true"
+
+# Date keys: MM/DD/YYYY, also accepting "7/21/2025" for "07/21/2025"
+DATE_KEY_PATTERN = r'^(0?[1-9]|1[0-2])/(0?[1-9]|[12][0-9]|3[01])/\d{4}$'
+
+# Embedding backend selected by EMBEDDING_BACKEND ("openai" or the offline "local" backend)
+embedding_backend = get_embedding_backend()
 
-# Get current date and time for the prompt
-current_datetime = datetime.now()
-current_date_str = current_datetime.strftime("%m/%d/%Y")
-current_day = current_datetime.strftime("%A")
-current_time_str = current_datetime.strftime("%I:%M %p")
+def get_user_collection(user_id: Optional[int] = None):
+    """
+    Return the vector collection holding a user's document chunks
+    (the shared collection when user_id is None), from the store selected by VECTOR_STORE.
+    """
+    return get_collection(namespace_for_user(user_id), ChromaEmbeddingFunction(embedding_backend))
 
 def extract_text_from_file(file_name: str, file_content: bytes):
     """
@@ -47,13 +53,11 @@ def extract_text_from_file(file_name: str, file_content: bytes):
     """
     if file_name.endswith(".pdf"):
         with fitz.open(stream=file_content, filetype="pdf") as doc:
-            text = ""
-            for page in doc:
-                text += page.get_text() # type: ignore
-            return text
+            # Keep page boundaries for structure-aware chunking
+            return PAGE_BREAK.join(page.get_text() for page in doc) # type: ignore
     elif file_name.endswith(".docx"):
         doc = docx.Document(io.BytesIO(file_content))
-        return "\n".join(para.text for para in doc.paragraphs)
+        return "\n\n".join(para.text for para in doc.paragraphs)
     elif file_name.endswith(".txt"):
         return file_content.decode("utf-8")
     else:
@@ -80,194 +84,119 @@ def process_documents(uploaded_files: List[Dict]) -> List[Dict]:
 
     return docs
 
+@timed("chunking")
 def generate_chunks(documents_string):
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=500,
-        chunk_overlap=100,
-        length_function=len,
-        separators=["\n\n", "\n", " ", ""]
-    )
-
-    chunks = text_splitter.split_text(documents_string)
-
-    return [{"id": i, "text": chunk} for i, chunk in enumerate(chunks)]
-
-def generate_single_embedding(client, text_chunk: str):
-    response = client.embeddings.create(
-        model=MODEL,
-        input=text_chunk
-    )
-    return response.data[0].embedding
-
-def generate_embedding(client, chunks):
     """
-    Generates embeddings for a list of text chunks by calling the single embedding function.
-    This is used for bulk processing during ingestion.
+    Split text into token-sized chunks along pages and paragraphs,
+    dropping exact and near-duplicate chunks (see chunking.py).
     """
-    embedded_data = []
+    return chunk_text(documents_string)
 
-    for chunk in chunks:
-        embedding = generate_single_embedding(client, chunk['text'])
-        embedded_data.append({
-            "id": chunk['id'],
-            "text": chunk['text'],
-            "embedding": embedding
-        })
+def generate_single_embedding(text_chunk: str):
+    return embedding_backend.embed_one(text_chunk)
 
-    return embedded_data
+def generate_embedding(chunks):
+    """
+    Generates embeddings for a list of text chunks with the configured embedding backend.
+    This is used for bulk processing during ingestion; texts are embedded in batches.
+    """
+    embeddings = embedding_backend.embed([chunk['text'] for chunk in chunks])
+    return [
+        {"id": chunk['id'], "text": chunk['text'], "embedding": embedding}
+        for chunk, embedding in zip(chunks, embeddings)
+    ]
 
-def embedding_insertion_to_collection(uploaded_files: List[Dict] = None):
+def embedding_insertion_to_collection(uploaded_files: List[Dict] = None, user_id: Optional[int] = None):
     try: 
-        collection.delete(where={"id": {"$ne": ""}})
+        collection = get_user_collection(user_id)
+        lexical_index = get_lexical_index(namespace_for_user(user_id), collection)
+        existing_ids = collection.get(include=[])["ids"]
+        if existing_ids:
+            collection.delete(ids=existing_ids)
+        lexical_index.delete()
         
         if uploaded_files is None:
             logger.info("No files uploaded to process")
             return
             
         docs = process_documents(uploaded_files)
-        documents_string = ''.join(doc['content'] for doc in docs).strip()
-        if documents_string:
-            chunks = generate_chunks(documents_string)
+        with timed("chunking"):
+            # Chunk each document separately so chunks never span two files
+            chunks = chunk_documents([doc['content'] for doc in docs])
+        if chunks:
             collection.add(
                 documents=[chunk['text'] for chunk in chunks],
                 ids=[str(chunk['id']) for chunk in chunks]
             )
+            lexical_index.add([str(chunk['id']) for chunk in chunks], [chunk['text'] for chunk in chunks])
             logger.info(f"Successfully loaded {len(chunks)} document chunks into vector database")
         else:
             logger.info("No documents found to insert into vector database")
+        if hasattr(collection, "version"):
+            lexical_index.source_version = collection.version()
     except Exception as e:
         logger.error(f"Error inserting embeddings: {e}")
 
-def collection_similarity_search(query: str, k: int = 5):
-    results = collection.query(
+def collection_similarity_search(query: str, k: int = 5, user_id: Optional[int] = None):
+    results = get_user_collection(user_id).query(
         query_texts=[query],
         n_results=k,
-        include=["distances"]
+        include=["documents", "distances"]
     )
     return results
 
-def generate_schedule_with_context(user_prompt: str, k: int = 5):
-    results = collection_similarity_search(user_prompt, k)
+def generate_schedule_with_context(user_prompt: str, k: int = 5, user_id: Optional[int] = None):
+    results = collection_similarity_search(user_prompt, k, user_id)
     return results
 
-def generate_document_context(user_prompt: str):
+@timed("retrieval")
+def retrieve_context_chunks(user_prompt: str, k: int = 5, user_id: Optional[int] = None) -> List[str]:
     """
-    Generate context from uploaded documents based on user prompt similarity.
-    Fixed to properly handle ChromaDB query results with error handling.
+    Retrieve the uploaded document chunks most relevant to the user prompt.
+
+    Chunks are ranked by BM25 over their words (exact course codes, dates and
+    room numbers) and by vector distance, and the two rankings are merged by
+    reciprocal rank fusion. When the best lexical match clearly beats the rest,
+    the lexical ranking is used alone and the query is never embedded.
+    Returns chunks in relevance order, keeping only lexical matches and close vectors.
     """
     try:
-        search_results = collection_similarity_search(user_prompt, k=5)
-        
-        if search_results and 'documents' in search_results and search_results['documents']:
-            retrieved_documents = search_results['documents'][0]  # First query result
-            distances = search_results['distances'][0] if 'distances' in search_results else []
+        collection = get_user_collection(user_id)
+        lexical_index = get_lexical_index(namespace_for_user(user_id), collection)
+        lexical_results = lexical_index.search(user_prompt, k)
+
+        if is_strong_hit(lexical_results):
+            RETRIEVAL_REQUESTS.inc(mode="lexical")
+            filtered_documents = [lexical_index.documents[chunk_id] for chunk_id, _, _ in lexical_results]
         else:
-            logger.info("No documents found in search results")
-            return ""
-            
-        filtered_documents = []
-        for i, doc in enumerate(retrieved_documents):
-            if i < len(distances) and distances[i] < 1.0:
-                filtered_documents.append(doc)
-        
+            RETRIEVAL_REQUESTS.inc(mode="hybrid")
+            search_results = collection_similarity_search(user_prompt, k=k, user_id=user_id)
+            vector_ids = []
+            documents = {chunk_id: lexical_index.documents[chunk_id] for chunk_id, _, _ in lexical_results}
+            if search_results and search_results.get('documents'):
+                distances = search_results['distances'][0] if search_results.get('distances') else []
+                for i, (chunk_id, doc) in enumerate(zip(search_results['ids'][0], search_results['documents'][0])):
+                    if i < len(distances) and distances[i] < embedding_backend.max_distance:
+                        vector_ids.append(chunk_id)
+                        documents[chunk_id] = doc
+            fused_ids = reciprocal_rank_fusion([[chunk_id for chunk_id, _, _ in lexical_results], vector_ids])
+            filtered_documents = [documents[chunk_id] for chunk_id in fused_ids[:k]]
+
         if filtered_documents:
-            context = "\n\n".join(filtered_documents)
             logger.info(f"Retrieved {len(filtered_documents)} relevant document chunks")
-            return context
         else:
             logger.info("No relevant documents found for context")
-            return ""
+        return filtered_documents
     except Exception as e:
         logger.error(f"Error generating document context: {e}")
-        return ""
+        return []
 
-prompt = f"""
-   You are an expert AI assistant specializing in generating personalized, structured daily schedules based on a user's goals, preferences, and contextual data. The user provides a scheduling prompt describing their needs, including classwork, extracurricular activities, personal tasks, and other commitments.
-   The user may also upload supporting documents such as existing schedules or notes, and specify whether their request applies to a repeating schedule (e.g., every day) or to specific days of the week, using button-based inputs. Your task is to create a clear, realistic, and organized schedule that maximizes productivity while ensuring all tasks are addressed.
-   Prioritize tasks identified as high priority, either explicitly marked by the user or clearly indicated through context. If the priority level of a task is unclear, do not assume; instead, prompt the user for confirmation before proceeding. Ensure high-priority tasks are scheduled first with sufficient focus time while respecting unmovable tasks (such as fixed classes or appointments).
-   Construct the schedule with no overlapping tasks, appropriate breaks between sessions, and time slots that align with typical daily routines. If a task or request cannot be fully accommodated based on the user's constraints, provide a brief, clear explanation in plain text and suggest that the user refine their input for greater specificity.
-  
-   CRITICAL: You MUST return the schedule in the following EXACT JSON format. The date keys MUST be in MM/DD/YYYY format (e.g., "7/13/2025", "12/25/2024"), NOT day names like "Monday" or "Tuesday". Convert any day references to actual dates.
-  
-   CURRENT DATE AND TIME CONTEXT:
-   - Today's date: {current_date_str} ({current_day})
-   - Current time: {current_time_str}
-   - Use this as your reference point for all date calculations
-  
-   DATE AND TIME AWARENESS:
-   - Use the current date ({current_date_str}) as your reference point for scheduling
-   - Interpret user's natural language for time references with context awareness
-   - Consider urgency indicators: "by tomorrow", "urgent", "asap", "due soon" = high priority
-   - Understand implied timelines: "when possible", "sometime this week", "when I have time" = flexible
-   - Convert relative references to actual dates based on context and urgency
-   - "tomorrow" typically means next day, but consider if user means "by tomorrow" (urgent) vs "for tomorrow" (planned)
-   - "next [day]" = next occurrence of that day from current date
-   - "this [day]" = this week's occurrence of that day
-   - "next week" = 7+ days from current date
-   - Consider user's implied timeline and urgency from context clues
-   - Use realistic, current dates that make sense for the user's timeline
-   - All dates should be in the current year or near future, not past dates
-  
-   Each task object should contain:
-   - task_name: string
-   - start_time: string (formatted as "HH:MM AM/PM")
-   - end_time: string (formatted as "HH:MM AM/PM")
-   - priority: boolean (true if marked high-priority)
-   - recurrence: string (use standard values: 'daily', 'weekly', 'monthly', 'none', or specific days like 'Monday', 'Tuesday', etc.)
-
-
-   CORRECT Example Format:
-   {{
-   "7/13/2025": [
-       {{
-       "task_name": "Math Study",
-       "start_time": "09:00 AM",
-       "end_time": "10:00 AM",
-       "priority": true,
-       "recurrence": "weekly"
-       }},
-       {{
-       "task_name": "Physics Review",
-       "start_time": "10:15 AM",
-       "end_time": "11:00 AM",
-       "priority": false,
-       "recurrence": "daily"
-       }}
-   ],
-   "7/14/2025": [
-       {{
-       "task_name": "English Essay",
-       "start_time": "02:00 PM",
-       "end_time": "04:00 PM",
-       "priority": true,
-       "recurrence": "none"
-       }}
-   ]
-   }}
-
-
-   INCORRECT Example (DO NOT USE):
-   {{
-   "Monday": [...],  // WRONG - use "7/13/2025" instead
-   "Tuesday": [...],  // WRONG - use "7/14/2025" instead
-   "Friday": [...]    // WRONG - use "7/17/2025" instead
-   }}
-
-   IMPORTANT RULES:
-   1. Date keys MUST be in MM/DD/YYYY format (e.g., "7/13/2025", "12/25/2024")
-   2. NEVER use day names like "Monday", "Tuesday", "Friday" as date keys
-   3. Convert any day references in the user's request to actual dates based on current date ({current_date_str})
-   4. Use realistic dates that make sense for the current time period
-   5. Maintain clarity, balance, and logical task distribution
-   6. Make reasonable assumptions if any user input is ambiguous
-   7. Clearly note any assumptions or required clarifications in a short text response alongside the JSON output
-   8. Always use current date ({current_date_str}) as reference point for relative date calculations
-   9. Do NOT use dates from the past - only use current date or future dates
-   10. PRIORITY SCHEDULING: When user says "by [timeframe]", schedule that task for the earliest possible time within that constraint
-   11. TASK CONSOLIDATION: Don't split single tasks across multiple days unless explicitly requested or necessary
-   12. URGENCY INTERPRETATION: "urgent", "asap", "due soon", "by [date]" = high priority and immediate scheduling
-   13. RECURRENCE STANDARDS: Use 'daily' for every day tasks, 'weekly' for weekly recurring tasks, 'monthly' for monthly tasks, 'none' for one-time tasks
-"""
+def generate_document_context(user_prompt: str, user_id: Optional[int] = None):
+    """
+    Generate context from uploaded documents based on user prompt similarity.
+    Fixed to properly handle ChromaDB query results with error handling.
+    """
+    return "\n\n".join(retrieve_context_chunks(user_prompt, user_id=user_id))
 
 class Task(BaseModel):
    """
@@ -338,8 +267,7 @@ class Schedule(RootModel[Dict[str, List[Task]]]):
            raise ValueError('Schedule cannot be empty')
        for date_key, tasks in v.items():
            # Validate date format (MM/DD/YYYY) - more flexible to handle both "7/21/2025" and "07/21/2025"
-           date_pattern = r'^(0?[1-9]|1[0-2])/(0?[1-9]|[12][0-9]|3[01])/\d{4}$'
-           if not re.match(date_pattern, date_key):
+           if not re.match(DATE_KEY_PATTERN, date_key):
                raise ValueError(f'Invalid date format: {date_key}. Must be MM/DD/YYYY')
            # Validate tasks list
            if not isinstance(tasks, list):
@@ -431,6 +359,28 @@ class ScheduleValidator:
            errors.append(f"Unexpected error: {e}")
            return errors
   
+   def stream_parser(self) -> IncrementalScheduleParser:
+       """
+       Create a parser that applies the same date, task and overlap rules
+       to streamed output, one date key or task at a time.
+       """
+       return IncrementalScheduleParser(self._check_date_key, self._check_task, self._check_day)
+
+   def _check_date_key(self, date_key: str) -> List[str]:
+       if not re.match(DATE_KEY_PATTERN, date_key):
+           return [f"Validation error: Invalid date format: {date_key}. Must be MM/DD/YYYY"]
+       return []
+
+   def _check_task(self, task: Any) -> List[str]:
+       try:
+           Task.model_validate(task)
+       except ValidationError as e:
+           return [f"Validation error: {e}"]
+       return []
+
+   def _check_day(self, date_key: str, tasks: List[Dict[str, Any]]) -> List[str]:
+       return self.validate_time_sequence([Task.model_validate(task) for task in tasks])
+
    def format_validation_errors(self, errors: List[str]) -> str:
        """
        Format validation errors into a clear message for the LLM.
@@ -445,84 +395,150 @@ class ScheduleValidator:
        error_msg += "\nPlease ensure the output follows the exact format specified in the prompt."
        return error_msg
 
-def generate_schedule(user_prompt: str, max_retries: int = 3) -> Union[Schedule, str]:
+def classify_validation_error(error: str) -> str:
+   """Map a validation error message to a short reason label for metrics."""
+   if "Invalid JSON format" in error:
+       return "invalid_json"
+   if "must be a JSON object" in error or "cannot be empty" in error:
+       return "structure"
+   if error.startswith("Validation error"):
+       return "schema"
+   if error.startswith("Task overlap"):
+       return "overlap"
+   return "other"
+
+def _request_schedule(messages: List[Dict[str, str]], temperature: float,
+                     parser: Optional[IncrementalScheduleParser] = None) -> str:
+   """
+   Send one schedule request to the LLM, recording its latency and token usage.
+   With a parser, the completion is streamed into it (see _stream_schedule).
+   """
+   llm_rate_limiter.acquire()
+   if parser is not None:
+       return _stream_schedule(messages, temperature, parser)
+   with timed("llm"):
+       response = openai.chat.completions.create(
+           model=model,
+           messages=messages,
+           response_format={"type": "json_object"},
+           temperature=temperature
+       )
+   record_llm_usage(response)
+   
+   llm_output = response.choices[0].message.content
+   if llm_output is None:
+       VALIDATION_FAILURES.inc(reason="empty_response")
+       raise ValueError("LLM returned empty response")
+   return llm_output
+
+def _stream_schedule(messages: List[Dict[str, str]], temperature: float, parser: IncrementalScheduleParser) -> str:
+   """
+   Stream one schedule request into an incremental parser.
+
+   Reading stops, and the connection is closed, as soon as the parser finds an
+   error; the output received up to that point is returned and the errors are
+   left in parser.errors. Token usage is only reported for completed streams.
+   """
+   with timed("llm"):
+       stream = openai.chat.completions.create(
+           model=model,
+           messages=messages,
+           response_format={"type": "json_object"},
+           temperature=temperature,
+           stream=True,
+           stream_options={"include_usage": True}
+       )
+       try:
+           for chunk in stream:
+               if chunk.usage is not None:
+                   record_llm_usage(chunk)
+               if not chunk.choices or not chunk.choices[0].delta.content:
+                   continue
+               if not parser.feed(chunk.choices[0].delta.content):
+                   LLM_STREAM_ABORTS.inc()
+                   logger.info(f"Stopped streaming after {parser.tasks} tasks: {parser.errors[0]}")
+                   break
+       finally:
+           stream.close()
+
+   llm_output = parser.output
+   if not llm_output:
+       VALIDATION_FAILURES.inc(reason="empty_response")
+       raise ValueError("LLM returned empty response")
+   return llm_output
+
+def _validate_output(validator: ScheduleValidator, llm_output: str,
+                     parser: Optional[IncrementalScheduleParser] = None) -> Union[Schedule, List[str]]:
+   """
+   Validate LLM output, recording the latency and the reasons for any failure.
+   Errors already found by a stream parser are used without validating again.
+   """
+   with timed("validation"):
+       if parser is not None and parser.errors:
+           validation_result = parser.errors
+       else:
+           validation_result = validator.validate_schedule(llm_output)
+   if not isinstance(validation_result, Schedule):
+       for reason in sorted({classify_validation_error(error) for error in validation_result}):
+           VALIDATION_FAILURES.inc(reason=reason)
+   return validation_result
+
+@timed("generate_schedule")
+def generate_schedule(user_prompt: str, max_retries: int = 3, user_id: Optional[int] = None) -> Union[Schedule, str]:
    """
    Generate schedule with comprehensive validation and retry logic.
   
+   Document context is retrieved once and packed under the prompt token budget.
+   Retries resend the same request and context followed by the rejected output
+   and its validation errors, so every attempt shares the static prompt prefix.
+   With STREAM_VALIDATION, each attempt is validated while it streams and is
+   abandoned at the first invalid date or task; the retry then carries the
+   output up to that point.
+  
    Args:
        user_prompt: The user's scheduling request
-       max_retries: Maximum number of retry attempts if validation fails
+       max_retries: Maximum number of attempts (LLM calls) if validation fails
+       user_id: Whose uploaded documents to retrieve context from (shared collection if None)
   
    Returns:
        Validated Schedule object or error message string
    """
    validator = ScheduleValidator()
+   messages = build_messages(user_prompt, retrieve_context_chunks(user_prompt, user_id=user_id))
+   attempt_messages = messages
+   error_message = None
   
    for attempt in range(max_retries):
        try:
            logger.info(f"Generating schedule (attempt {attempt + 1}/{max_retries})")
+           if attempt > 0:
+               LLM_RETRIES.inc()
           
-           # Create the full prompt with user input
-           full_prompt = f"""
-            Prompt: {prompt} 
-            User Request: {user_prompt}
-            Context: {generate_document_context(user_prompt)}
-            Please generate a schedule in the exact JSON format specified above.
-            """
-          
-           response = openai.chat.completions.create(
-               model=model,
-               messages=[{"role": "user", "content": full_prompt}],
-               response_format={"type": "json_object"},
-               temperature=0.7  # Slightly higher for creativity while maintaining structure
-           )
-          
-           llm_output = response.choices[0].message.content
-           if llm_output is None:
-               raise ValueError("LLM returned empty response")
+           # Slightly higher temperature for creativity on the first attempt,
+           # lower temperature for more precise formatting on retries
+           parser = validator.stream_parser() if STREAM_VALIDATION else None
+           llm_output = _request_schedule(attempt_messages, temperature=0.7 if attempt == 0 else 0.5, parser=parser)
 
            logger.info("Received LLM response, validating...")
           
-           # Validate the output
-           validation_result = validator.validate_schedule(llm_output)
+           # Validate the output (a stream abandoned early already carries its errors)
+           validation_result = _validate_output(validator, llm_output, parser)
           
            if isinstance(validation_result, Schedule):
-               logger.info("Schedule validation successful")
+               logger.info("Schedule validation successful" if attempt == 0 else "Schedule validation successful on retry")
                return validation_result
-           else:
-               # Validation failed, prepare retry with error feedback
-               error_message = validator.format_validation_errors(validation_result)
-               logger.warning(f"Validation failed (attempt {attempt + 1}): {error_message}")
-              
-               if attempt < max_retries - 1:
-                   # Add error feedback to the prompt for retry
-                   retry_prompt = f"{prompt}\n\nUser Request: {user_prompt}\n\nPrevious attempt failed validation. Please fix these issues:\n{error_message}\n\nGenerate a corrected schedule in the exact JSON format specified."
-                  
-                   response = openai.chat.completions.create(
-                       model=model,
-                       messages=[{"role": "user", "content": retry_prompt}],
-                       response_format={"type": "json_object"},
-                       temperature=0.5  # Lower temperature for more precise formatting
-                   )
-                  
-                   llm_output = response.choices[0].message.content
-                   if llm_output is None:
-                       raise ValueError("LLM returned empty response")
-                  
-                   validation_result = validator.validate_schedule(llm_output)
-                  
-                   if isinstance(validation_result, Schedule):
-                       logger.info("Schedule validation successful on retry")
-                       return validation_result
-               else:
-                   return f"Failed to generate valid schedule after {max_retries} attempts. Last error: {error_message}"
+           
+           # Validation failed, prepare retry with error feedback
+           error_message = validator.format_validation_errors(validation_result)
+           logger.warning(f"Validation failed (attempt {attempt + 1}): {error_message}")
+           attempt_messages = build_retry_messages(messages, llm_output, error_message)
       
        except Exception as e:
            logger.error(f"Error during schedule generation (attempt {attempt + 1}): {e}")
            if attempt == max_retries - 1:
                return f"Error generating schedule: {str(e)}"
   
-   return "Failed to generate schedule after maximum retry attempts"
+   return f"Failed to generate valid schedule after {max_retries} attempts. Last error: {error_message}"
 
 if __name__ == "__main__":
    user_prompt = "I have a lot of homework to do. I need to finish it by tomorrow. I have a test on Friday. I have a soccer game on Saturday. I have a doctor's appointment on Sunday. I have a job interview on Monday. I have a dentist appointment on Tuesday. I have a dentist appointment on Wednesday. I have a dentist appointment on Thursday. I have a dentist appointment on Friday. I have a dentist appointment on Saturday. I have a dentist appointment on Sunday."
@@ -594,13 +610,54 @@ def convert_date_schedule_to_weekday_schedule(date_schedule: Dict[str, List[Task
     
     return weekday_schedule
 
-def complete_ai_schedule_workflow(user_prompt: str, user_id: int) -> Dict[str, Any]:
+def generate_converted_schedule(user_prompt: str, user_id: int) -> Dict[str, Any]:
+    """
+    Generate a schedule with the LLM and convert it to weekdays, without saving it
+    
+    Args:
+        user_prompt: The user's scheduling request
+        user_id: Whose uploaded documents to retrieve context from
+        
+    Returns:
+        Dictionary with status, and schedule_data and original_schedule (plain dicts) on success
+    """
+    try:
+        ai_result = generate_schedule(user_prompt, user_id=user_id)
+        
+        if isinstance(ai_result, str):
+            logger.error(f"LLM generation failed: {ai_result}")
+            return {
+                "status": "error",
+                "message": f"Failed to generate schedule: {ai_result}",
+                "user_id": user_id
+            }
+        
+        with timed("conversion"):
+            weekday_schedule = convert_date_schedule_to_weekday_schedule(ai_result.root)
+        return {
+            "status": "success",
+            "user_id": user_id,
+            "schedule_data": weekday_schedule,
+            "original_schedule": {date_key: [task.model_dump() for task in tasks]
+                                  for date_key, tasks in ai_result.root.items()}
+        }
+    
+    except Exception as e:
+        logger.error(f"Unexpected error generating schedule for user {user_id}: {e}")
+        return {
+            "status": "error",
+            "message": f"Unexpected error: {str(e)}",
+            "user_id": user_id
+        }
+
+def complete_ai_schedule_workflow(user_prompt: str, user_id: int, verify_user: bool = True) -> Dict[str, Any]:
     """
     Complete workflow: prompt → LLM → convert → save to DB
     
     Args:
         user_prompt: The user's scheduling request
         user_id: The user ID to associate the schedule with
+        verify_user: Whether to check that the user exists (skipped for requests with a valid session)
         
     Returns:
         Dictionary with status and result information
@@ -610,7 +667,7 @@ def complete_ai_schedule_workflow(user_prompt: str, user_id: int) -> Dict[str, A
         
         # Step 1: Generate schedule with LLM
         logger.info("Generating schedule with LLM...")
-        ai_result = generate_schedule(user_prompt)
+        ai_result = generate_schedule(user_prompt, user_id=user_id)
         
         if isinstance(ai_result, str):
             logger.error(f"LLM generation failed: {ai_result}")
@@ -622,7 +679,8 @@ def complete_ai_schedule_workflow(user_prompt: str, user_id: int) -> Dict[str, A
         
         # Step 2: Convert date-based to weekday-based
         logger.info("Converting date-based schedule to weekday-based...")
-        weekday_schedule = convert_date_schedule_to_weekday_schedule(ai_result.root)
+        with timed("conversion"):
+            weekday_schedule = convert_date_schedule_to_weekday_schedule(ai_result.root)
         
         # Step 3: Import and use database function
         try:
@@ -636,7 +694,7 @@ def complete_ai_schedule_workflow(user_prompt: str, user_id: int) -> Dict[str, A
             }
         
         # Step 4: Validate user exists
-        if not user_exists(user_id):
+        if verify_user and not user_exists(user_id):
             logger.error(f"User {user_id} does not exist")
             return {
                 "status": "error",
@@ -675,15 +733,16 @@ def complete_ai_schedule_workflow(user_prompt: str, user_id: int) -> Dict[str, A
             "user_id": user_id
         }
 
-def generate_and_save_schedule(user_prompt: str, user_id: int) -> Dict[str, Any]:
+def generate_and_save_schedule(user_prompt: str, user_id: int, verify_user: bool = True) -> Dict[str, Any]:
     """
     Simplified function for external use - generates and saves schedule in one call
     
     Args:
         user_prompt: The user's scheduling request
         user_id: The user ID to associate the schedule with
+        verify_user: Whether to check that the user exists
         
     Returns:
         Dictionary with status and result information
     """
-    return complete_ai_schedule_workflow(user_prompt, user_id)
\ No newline at end of file
+    return complete_ai_schedule_workflow(user_prompt, user_id, verify_user)
\ No newline at end of file
@@ -0,0 +1,266 @@
+from sqlite3 import Error
+from typing import Any, Dict, List, Optional, Tuple
+from serialization import dumps, loads # type: ignore
+
+# A full snapshot is stored every SNAPSHOT_INTERVAL versions (versions 1, 11, 21, ...),
+# so rebuilding any version applies at most SNAPSHOT_INTERVAL - 1 deltas
+SNAPSHOT_INTERVAL = 10
+
+# Delta operations: ["set", path, value], ["del", path], ["trunc", path, length], ["ext", path, values]
+Delta = List[List[Any]]
+
+def compute_delta(old: Any, new: Any, path: Optional[List[Any]] = None) -> Delta:
+   """
+   Compute the operations that turn `old` into `new`.
+
+   Objects are compared key by key and lists element by element, so a change to
+   one task produces one small operation instead of a copy of the schedule.
+
+   Args:
+       old (Any): The previous JSON value
+       new (Any): The new JSON value
+       path (Optional[List[Any]]): Location of the values within the document
+
+   Returns:
+       Delta: List of operations, empty if the values are equal
+   """
+   path = path or []
+   if old == new:
+       return []
+
+   if isinstance(old, dict) and isinstance(new, dict):
+       delta: Delta = [["del", path + [key]] for key in old if key not in new]
+       for key, value in new.items():
+           if key not in old:
+               delta.append(["set", path + [key], value])
+           else:
+               delta.extend(compute_delta(old[key], value, path + [key]))
+       return delta
+
+   if isinstance(old, list) and isinstance(new, list):
+       delta = []
+       for index in range(min(len(old), len(new))):
+           delta.extend(compute_delta(old[index], new[index], path + [index]))
+       if len(new) < len(old):
+           delta.append(["trunc", path, len(new)])
+       elif len(new) > len(old):
+           delta.append(["ext", path, new[len(old):]])
+       # An insertion near the front shifts every element; replacing the list is smaller then
+       if len(dumps(delta)) > len(dumps(new)):
+           return [["set", path, new]]
+       return delta
+
+   return [["set", path, new]]
+
+def apply_delta(document: Any, delta: Delta) -> Any:
+   """
+   Apply delta operations to a JSON document in place.
+
+   Args:
+       document (Any): The document to modify
+       delta (Delta): Operations produced by compute_delta
+
+   Returns:
+       Any: The modified document (a new object if the root itself was replaced)
+   """
+   for operation in delta:
+       op, path = operation[0], operation[1]
+       if op == "set" and not path:
+           document = operation[2]
+           continue
+
+       target = document
+       for key in path[:-1] if op in ("set", "del") else path:
+           target = target[key]
+
+       if op == "set":
+           key = path[-1]
+           if isinstance(target, list) and key == len(target):
+               target.append(operation[2])
+           else:
+               target[key] = operation[2]
+       elif op == "del":
+           del target[path[-1]]
+       elif op == "trunc":
+           del target[operation[2]:]
+       elif op == "ext":
+           target.extend(operation[2])
+   return document
+
+def delta_to_changes(delta: Delta) -> List[Dict[str, Any]]:
+   """
+   Convert delta operations into readable changes addressed by JSON Pointer paths.
+   """
+   names = {"set": "set", "del": "remove", "trunc": "truncate", "ext": "extend"}
+   changes = []
+   for operation in delta:
+       pointer = "".join("/" + str(key).replace("~", "~0").replace("/", "~1") for key in operation[1])
+       change: Dict[str, Any] = {"op": names[operation[0]], "path": pointer}
+       if len(operation) > 2:
+           change["value"] = operation[2]
+       changes.append(change)
+   return changes
+
+def _reconstruct(cursor, user_id: int, version: int) -> Optional[Any]:
+   """
+   Rebuild a version from the nearest snapshot at or before it plus the deltas since.
+   """
+   cursor.execute("""
+       SELECT version, data FROM schedule_versions
+       WHERE user_id = ? AND version <= ? AND is_snapshot = 1
+       ORDER BY version DESC LIMIT 1
+       """, (user_id, version))
+   snapshot = cursor.fetchone()
+   if snapshot is None:
+       return None
+
+   document = loads(snapshot[1])
+   cursor.execute("""
+       SELECT data FROM schedule_versions
+       WHERE user_id = ? AND version > ? AND version <= ?
+       ORDER BY version
+       """, (user_id, snapshot[0], version))
+   for (data,) in cursor.fetchall():
+       document = apply_delta(document, loads(data))
+   return document
+
+def latest_versions(cursor, user_ids: List[int]) -> Dict[int, int]:
+   """
+   Return the latest version number of each user's schedule, with one query.
+   Users without any versions are left out.
+   """
+   if not user_ids:
+       return {}
+   placeholders = ", ".join("?" for _ in user_ids)
+   cursor.execute(
+       f"SELECT user_id, MAX(version) FROM schedule_versions WHERE user_id IN ({placeholders}) GROUP BY user_id",
+       list(user_ids)
+   )
+   return {row[0]: row[1] for row in cursor.fetchall()}
+
+def version_rows(user_id: int, latest: Optional[int], previous: Optional[Dict[str, Any]],
+                 schedule_data: Dict[str, Any]) -> List[Tuple[int, int, int, str]]:
+   """
+   Build the schedule_versions rows recording a save.
+
+   Called by the database's save functions inside the transaction that writes
+   the schedule, so versions are numbered in commit order and a version is never
+   lost without its schedule write. The new version is stored as a delta against
+   the schedule it replaces, except for every SNAPSHOT_INTERVAL-th version (or
+   when the delta would be larger), which is stored in full. A schedule saved
+   before version history existed is first recorded as a snapshot, so it can be
+   restored. Saves that do not change the schedule record nothing.
+
+   Args:
+       user_id (int): The user ID
+       latest (Optional[int]): The user's latest version number, None if there are no versions
+       previous (Optional[Dict[str, Any]]): The stored schedule being replaced, None if there is none
+       schedule_data (Dict[str, Any]): The schedule being saved
+
+   Returns:
+       List[Tuple[int, int, int, str]]: (user_id, version, is_snapshot, data) rows to insert
+   """
+   rows = []
+   latest = latest or 0
+   if previous is not None and latest == 0:
+       latest = 1
+       rows.append((user_id, latest, 1, dumps(previous)))
+   if previous == schedule_data:
+       return rows
+
+   version = latest + 1
+   snapshot_json = dumps(schedule_data)
+   is_snapshot = previous is None or (version - 1) % SNAPSHOT_INTERVAL == 0
+   if not is_snapshot:
+       delta_json = dumps(compute_delta(previous, schedule_data))
+       is_snapshot = len(delta_json) >= len(snapshot_json)
+   rows.append((user_id, version, int(is_snapshot), snapshot_json if is_snapshot else delta_json))
+   return rows
+
+def insert_versions(cursor, rows: List[Tuple[int, int, int, str]]):
+   """Insert rows built by version_rows."""
+   if rows:
+       cursor.executemany(
+           "INSERT INTO schedule_versions (user_id, version, is_snapshot, data) VALUES (?, ?, ?, ?)", rows
+       )
+
+def baseline_rows(cursor, user_id: int, current: Dict[str, Any]) -> List[Tuple[int, int, int, str]]:
+   """
+   Build the rows needed for a user's history to end at their current schedule:
+   a first snapshot when there are no versions, or a new snapshot when the latest
+   version differs from it (histories recorded before versions were written in
+   the schedule's own transaction could miss saves).
+   """
+   latest = latest_versions(cursor, [user_id]).get(user_id)
+   if latest is None:
+       return [(user_id, 1, 1, dumps(current))]
+   if _reconstruct(cursor, user_id, latest) != current:
+       return [(user_id, latest + 1, 1, dumps(current))]
+   return []
+
+def list_versions(user_id: int) -> List[Dict[str, Any]]:
+   """
+   List the stored versions of a user's schedule, newest first.
+   """
+   # Imported here because the database module imports this one to record versions
+   from database import create_connection # type: ignore
+   conn = create_connection()
+   if conn is None:
+       return []
+
+   try:
+       cursor = conn.cursor()
+       cursor.execute("""
+           SELECT version, is_snapshot, length(data), created_at FROM schedule_versions
+           WHERE user_id = ? ORDER BY version DESC
+           """, (user_id,))
+       return [
+           {
+               "version": row[0],
+               "kind": "snapshot" if row[1] else "delta",
+               "size": row[2],
+               "created_at": row[3]
+           }
+           for row in cursor.fetchall()
+       ]
+
+   except Error as e:
+       print(f"Error listing schedule versions: {e}")
+       return []
+   finally:
+       conn.close()
+
+def get_version(user_id: int, version: int) -> Optional[Dict[str, Any]]:
+   """
+   Reconstruct a stored version of a user's schedule.
+
+   Args:
+       user_id (int): The user ID
+       version (int): The version number
+
+   Returns:
+       Optional[Dict[str, Any]]: Version details with schedule_data, or None if it doesn't exist
+   """
+   from database import create_connection # type: ignore
+   conn = create_connection()
+   if conn is None:
+       return None
+
+   try:
+       cursor = conn.cursor()
+       cursor.execute("SELECT created_at FROM schedule_versions WHERE user_id = ? AND version = ?", (user_id, version))
+       result = cursor.fetchone()
+       if result is None:
+           return None
+       return {
+           "user_id": user_id,
+           "version": version,
+           "schedule_data": _reconstruct(cursor, user_id, version),
+           "created_at": result[0]
+       }
+
+   except Error as e:
+       print(f"Error retrieving schedule version: {e}")
+       return None
+   finally:
+       conn.close()
@@ -0,0 +1,162 @@
+from typing import Any, Dict, List
+
+class PatchError(ValueError):
+   """
+   Raised when a patch operation cannot be applied to a schedule.
+   """
+
+def _day_tasks(schedule_data: Dict[str, Any], day: Any, create: bool = False) -> List[Any]:
+   """Return the task list for a day key, optionally creating it."""
+   if not isinstance(day, str) or not day:
+       raise PatchError("Operation requires a non-empty 'day'")
+   if day not in schedule_data:
+       if not create:
+           raise PatchError(f"Day not found: {day}")
+       schedule_data[day] = []
+   tasks = schedule_data[day]
+   if not isinstance(tasks, list):
+       raise PatchError(f"Entries for {day} are not a list")
+   return tasks
+
+def _task_index(tasks: List[Any], index: Any, allow_end: bool = False) -> int:
+   """Validate a task position within a day."""
+   upper = len(tasks) + (1 if allow_end else 0)
+   if not isinstance(index, int) or isinstance(index, bool) or not 0 <= index < upper:
+       raise PatchError(f"Task index out of range: {index}")
+   return index
+
+def _apply_day_operation(schedule_data: Dict[str, Any], operation: Dict[str, Any]):
+   """
+   Apply a per-day or per-task operation.
+
+   Supported operations:
+   - {"op": "add", "day": "monday", "task": {...}, "index": 0}    (index optional, appends by default)
+   - {"op": "update", "day": "monday", "index": 0, "task": {...}} (merges the given fields)
+   - {"op": "delete", "day": "monday", "index": 0}
+   - {"op": "replace_day", "day": "monday", "tasks": [...]}
+   - {"op": "delete_day", "day": "monday"}
+   """
+   op = operation.get("op")
+   day = operation.get("day")
+
+   if op == "add":
+       tasks = _day_tasks(schedule_data, day, create=True)
+       if "task" not in operation:
+           raise PatchError("'add' requires a 'task'")
+       index = _task_index(tasks, operation.get("index", len(tasks)), allow_end=True)
+       tasks.insert(index, operation["task"])
+   elif op == "update":
+       tasks = _day_tasks(schedule_data, day)
+       index = _task_index(tasks, operation.get("index"))
+       changes = operation.get("task")
+       if not isinstance(changes, dict):
+           raise PatchError("'update' requires a 'task' object with the fields to change")
+       if isinstance(tasks[index], dict):
+           tasks[index] = {**tasks[index], **changes}
+       else:
+           tasks[index] = changes
+   elif op == "delete":
+       tasks = _day_tasks(schedule_data, day)
+       del tasks[_task_index(tasks, operation.get("index"))]
+   elif op == "replace_day":
+       if not isinstance(operation.get("tasks"), list):
+           raise PatchError("'replace_day' requires a 'tasks' list")
+       _day_tasks(schedule_data, day, create=True)
+       schedule_data[day] = operation["tasks"]
+   elif op == "delete_day":
+       _day_tasks(schedule_data, day)
+       del schedule_data[day]
+   else:
+       raise PatchError(f"Unsupported operation: {op}")
+
+def _parse_pointer(path: Any) -> List[str]:
+   """Split a JSON Pointer (RFC 6901) into unescaped reference tokens."""
+   if not isinstance(path, str) or not path.startswith("/"):
+       raise PatchError(f"Invalid path: {path}")
+   return [token.replace("~1", "/").replace("~0", "~") for token in path[1:].split("/")]
+
+def _apply_json_patch(schedule_data: Dict[str, Any], operation: Dict[str, Any]):
+   """
+   Apply a JSON Patch (RFC 6902) operation.
+   Supports the "add", "replace", "remove" and "test" operations.
+   """
+   op = operation.get("op")
+   tokens = _parse_pointer(operation.get("path"))
+   if op in ("add", "replace", "test") and "value" not in operation:
+       raise PatchError(f"'{op}' requires a 'value'")
+
+   # Walk to the parent of the target location
+   parent: Any = schedule_data
+   for token in tokens[:-1]:
+       if isinstance(parent, dict) and token in parent:
+           parent = parent[token]
+       elif isinstance(parent, list) and token.isdigit() and int(token) < len(parent):
+           parent = parent[int(token)]
+       else:
+           raise PatchError(f"Path not found: {operation['path']}")
+
+   key = tokens[-1]
+   if isinstance(parent, dict):
+       if op == "add":
+           parent[key] = operation["value"]
+       elif key not in parent:
+           raise PatchError(f"Path not found: {operation['path']}")
+       elif op == "replace":
+           parent[key] = operation["value"]
+       elif op == "remove":
+           del parent[key]
+       elif op == "test":
+           if parent[key] != operation["value"]:
+               raise PatchError(f"Test failed at {operation['path']}")
+       else:
+           raise PatchError(f"Unsupported operation: {op}")
+   elif isinstance(parent, list):
+       if op == "add" and key == "-":
+           parent.append(operation["value"])
+           return
+       if not key.isdigit():
+           raise PatchError(f"Invalid array index in path: {operation['path']}")
+       index = _task_index(parent, int(key), allow_end=(op == "add"))
+       if op == "add":
+           parent.insert(index, operation["value"])
+       elif op == "replace":
+           parent[index] = operation["value"]
+       elif op == "remove":
+           del parent[index]
+       elif op == "test":
+           if parent[index] != operation["value"]:
+               raise PatchError(f"Test failed at {operation['path']}")
+       else:
+           raise PatchError(f"Unsupported operation: {op}")
+   else:
+       raise PatchError(f"Path not found: {operation['path']}")
+
+def apply_operations(schedule_data: Dict[str, Any], operations: List[Dict[str, Any]]) -> Dict[str, Any]:
+   """
+   Apply a list of patch operations to a schedule, in order.
+
+   Operations with a "path" are treated as JSON Patch operations; all others
+   are per-day or per-task operations. The schedule is modified in place.
+
+   Args:
+       schedule_data (Dict[str, Any]): The stored schedule data
+       operations (List[Dict[str, Any]]): The operations to apply
+
+   Returns:
+       Dict[str, Any]: The patched schedule data
+
+   Raises:
+       PatchError: If any operation is invalid; no partial result should be saved
+   """
+   if not operations:
+       raise PatchError("At least one operation is required")
+   for operation in operations:
+       if not isinstance(operation, dict):
+           raise PatchError("Each operation must be an object")
+       if "path" in operation:
+           _apply_json_patch(schedule_data, operation)
+       else:
+           _apply_day_operation(schedule_data, operation)
+   if not isinstance(schedule_data, dict) or not schedule_data:
+       raise PatchError("Schedule data cannot be empty")
+   return schedule_data
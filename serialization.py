@@ -0,0 +1,115 @@
+import json
+import os
+import zlib
+from typing import Any, Union
+
+try:
+   import orjson
+except ImportError:  # Optional: fall back to the standard library encoder
+   orjson = None
+
+try:
+   import zstandard
+except ImportError:  # Optional: compress stored schedules with zlib instead
+   zstandard = None
+
+# Name of the JSON library in use, reported by the benchmarks
+JSON_BACKEND = "orjson" if orjson is not None else "json"
+
+def dumps_bytes(value: Any) -> bytes:
+   """
+   Encode a value as compact UTF-8 JSON.
+
+   Both backends produce the same document: no whitespace between tokens and
+   non-ASCII characters written as-is.
+   """
+   if orjson is not None:
+       return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+   return json.dumps(value, separators=(",", ":"), ensure_ascii=False, allow_nan=False).encode("utf-8")
+
+def dumps(value: Any) -> str:
+   """Encode a value as compact JSON text (for TEXT columns)."""
+   if orjson is not None:
+       return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+   return json.dumps(value, separators=(",", ":"), ensure_ascii=False, allow_nan=False)
+
+def loads(data: Union[str, bytes]) -> Any:
+   """Decode JSON text or UTF-8 bytes."""
+   if orjson is not None:
+       return orjson.loads(data)
+   return json.loads(data)
+
+# Stored schedule documents: BLOB_MAGIC, a format version byte, a codec byte, then the
+# JSON encoded with that codec. Rows written before compression hold plain JSON text.
+BLOB_MAGIC = b"SJ"
+BLOB_FORMAT_VERSION = 1
+CODEC_NONE = 0
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+_CODECS = {"none": CODEC_NONE, "zlib": CODEC_ZLIB, "zstd": CODEC_ZSTD}
+
+# Compression configuration (tunable through environment variables)
+# SCHEDULE_COMPRESSION: "zstd" (needs the zstandard package), "zlib" or "none"
+SCHEDULE_COMPRESSION = os.getenv("SCHEDULE_COMPRESSION", "zstd" if zstandard is not None else "zlib").lower()
+# Documents smaller than this are stored uncompressed; compression gains little on them
+SCHEDULE_COMPRESSION_MIN_BYTES = int(os.getenv("SCHEDULE_COMPRESSION_MIN_BYTES", "256"))
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+
+def _write_codec() -> int:
+   codec = _CODECS.get(SCHEDULE_COMPRESSION)
+   if codec is None:
+       raise ValueError(f"Unknown SCHEDULE_COMPRESSION '{SCHEDULE_COMPRESSION}'; expected 'zstd', 'zlib' or 'none'")
+   if codec == CODEC_ZSTD and zstandard is None:
+       return CODEC_ZLIB
+   return codec
+
+def encode_document(value: Any) -> bytes:
+   """
+   Encode a value as JSON for storage, compressed when it is large enough.
+
+   Args:
+       value (Any): JSON-serializable value
+
+   Returns:
+       bytes: Header followed by the (possibly compressed) JSON
+   """
+   data = dumps_bytes(value)
+   codec = _write_codec() if len(data) >= SCHEDULE_COMPRESSION_MIN_BYTES else CODEC_NONE
+   if codec == CODEC_ZLIB:
+       data = zlib.compress(data, ZLIB_LEVEL)
+   elif codec == CODEC_ZSTD:
+       data = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+   return BLOB_MAGIC + bytes((BLOB_FORMAT_VERSION, codec)) + data
+
+def document_json(stored: Union[str, bytes]) -> str:
+   """
+   Return the JSON text of a stored document without parsing it, decompressing it if needed.
+
+   Args:
+       stored (Union[str, bytes]): Value from encode_document, or plain JSON text (older rows)
+
+   Returns:
+       str: The document's JSON text
+   """
+   if isinstance(stored, str):
+       return stored
+   stored = bytes(stored)
+   if stored[:2] != BLOB_MAGIC or len(stored) < 4:
+       return stored.decode("utf-8")
+   version, codec, payload = stored[2], stored[3], stored[4:]
+   if version != BLOB_FORMAT_VERSION:
+       raise ValueError(f"Unsupported stored document format version {version}")
+   if codec == CODEC_ZLIB:
+       payload = zlib.decompress(payload)
+   elif codec == CODEC_ZSTD:
+       if zstandard is None:
+           raise ValueError("Stored document is zstd-compressed but the zstandard package is not installed")
+       payload = zstandard.ZstdDecompressor().decompress(payload)
+   elif codec != CODEC_NONE:
+       raise ValueError(f"Unknown stored document codec {codec}")
+   return payload.decode("utf-8")
+
+def decode_document(stored: Union[str, bytes]) -> Any:
+   """Decode a stored document (see encode_document) into its value."""
+   return loads(document_json(stored))
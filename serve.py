@@ -0,0 +1,81 @@
+"""
+Production launcher: runs the API in several uvicorn worker processes.
+
+Every piece of state the workers share goes through local files or SQLite:
+
+- The database is initialized once here, before the workers start, and is
+  opened by every worker in WAL mode with a busy timeout.
+- Document chunks live in the memory-mapped NumPy vector store
+  (VECTOR_STORE=numpy) under the state directory; writers lock each
+  collection's directory with flock. Chroma's in-memory collections would be
+  private to each worker.
+- Session tokens are signed with SESSION_SECRET, or with a key generated once
+  into the state directory.
+- Cached free/busy indexes are revalidated against the database
+  (CACHE_REVALIDATE=true), so saves handled by another worker are seen.
+- Metrics are written per worker to the state directory and merged by /metrics.
+
+Usage:
+    python serve.py --workers 4 --port 8000
+"""
+import argparse
+import glob
+import os
+import sys
+import uvicorn
+
+def _default_workers() -> int:
+   return int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+
+def configure_environment(workers: int, state_dir: str):
+   """
+   Set the environment the workers inherit for multi-process operation.
+   Values already set by the caller are kept, except for ones that cannot work with several workers.
+   """
+   state_dir = os.path.abspath(state_dir)
+   os.makedirs(state_dir, exist_ok=True)
+   os.environ["INIT_DATABASE_ON_STARTUP"] = "false"
+   if workers > 1:
+       if os.getenv("VECTOR_STORE", "numpy").lower() != "numpy":
+           raise SystemExit("VECTOR_STORE must be 'numpy' with more than one worker: "
+                            "Chroma collections are kept in each worker's memory")
+       os.environ["VECTOR_STORE"] = "numpy"
+       os.environ.setdefault("VECTOR_STORE_DIR", os.path.join(state_dir, "vector_store"))
+       os.environ["CACHE_REVALIDATE"] = "true"
+       if not os.getenv("SESSION_SECRET"):
+           os.environ.setdefault("SESSION_SECRET_FILE", os.path.join(state_dir, "session_secret"))
+
+   metrics_dir = os.environ.setdefault("METRICS_DIR", os.path.join(state_dir, "metrics"))
+   os.makedirs(metrics_dir, exist_ok=True)
+   # Start counting from zero; files of the previous run's workers would be added otherwise
+   for path in glob.glob(os.path.join(metrics_dir, "metrics-*.json")):
+       os.remove(path)
+
+def main():
+   parser = argparse.ArgumentParser(description="Run the scheduling API in several worker processes")
+   parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+   parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+   parser.add_argument("--workers", type=int, default=_default_workers(),
+                       help="worker processes (default: WEB_CONCURRENCY or the number of CPU cores)")
+   parser.add_argument("--state-dir", default=os.getenv("STATE_DIR", "run"),
+                       help="directory for the vector store, metrics and generated session key")
+   parser.add_argument("--log-level", default="info")
+   args = parser.parse_args()
+
+   configure_environment(args.workers, args.state_dir)
+
+   # Imported after configuration so module-level settings read the final environment
+   from database import init_database # type: ignore
+   if args.workers > 1 and os.getenv("SESSION_SECRET_FILE"):
+       from sessions import load_secret_file # type: ignore
+       load_secret_file(os.environ["SESSION_SECRET_FILE"])
+
+   print("Initializing database...")
+   init_database()
+   print(f"Database initialization complete. Starting {args.workers} workers on {args.host}:{args.port}")
+   sys.stdout.flush()
+
+   uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers, log_level=args.log_level)
+
+if __name__ == "__main__":
+   main()
@@ -0,0 +1,186 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+from datetime import datetime, timezone
+from sqlite3 import Error
+from typing import Optional, Set, Tuple
+from database import create_connection # type: ignore
+
+# Session configuration (tunable through environment variables)
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", str(7 * 24 * 3600)))
+REVOCATION_CACHE_TTL_SECONDS = float(os.getenv("REVOCATION_CACHE_TTL_SECONDS", "30"))
+REQUIRE_SESSION_TOKENS = os.getenv("REQUIRE_SESSION_TOKENS", "false").lower() in ("1", "true", "yes")
+# File holding a generated signing key shared by all processes, used when SESSION_SECRET is not set
+SESSION_SECRET_FILE = os.getenv("SESSION_SECRET_FILE")
+
+def load_secret_file(path: str) -> bytes:
+   """
+   Read the signing key from a file, creating the file with a random key if it does not exist.
+
+   The key is written to a temporary file that is then hard-linked into place,
+   so when several processes start at once exactly one key wins and no process
+   ever reads a partly written file.
+
+   Args:
+       path (str): Key file, readable only by its owner
+
+   Returns:
+       bytes: The signing key
+   """
+   if not os.path.exists(path):
+       directory = os.path.dirname(os.path.abspath(path))
+       os.makedirs(directory, exist_ok=True)
+       temporary = f"{path}.{os.getpid()}.tmp"
+       descriptor = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+       with os.fdopen(descriptor, "w") as f:
+           f.write(secrets.token_hex(32))
+       try:
+           os.link(temporary, path)
+       except FileExistsError:
+           pass  # Another process created it first; use that key
+       finally:
+           os.remove(temporary)
+   with open(path) as f:
+       return f.read().strip().encode("utf-8")
+
+def _load_secret() -> bytes:
+   """Load the signing key from SESSION_SECRET or SESSION_SECRET_FILE, or generate a per-process key."""
+   secret = os.getenv("SESSION_SECRET")
+   if secret:
+       return secret.encode("utf-8")
+   if SESSION_SECRET_FILE:
+       return load_secret_file(SESSION_SECRET_FILE)
+   print("Warning: SESSION_SECRET is not set; session tokens will not survive a restart.")
+   return secrets.token_bytes(32)
+
+SESSION_SECRET = _load_secret()
+
+# Revoked token IDs, refreshed from the database at most every REVOCATION_CACHE_TTL_SECONDS
+_revoked_ids: Set[str] = set()
+_revoked_loaded_at = 0.0
+_revoked_lock = threading.Lock()
+
+def _b64url_encode(value: bytes) -> str:
+   """Encode bytes as unpadded base64url text."""
+   return base64.urlsafe_b64encode(value).rstrip(b"=").decode("ascii")
+
+def _b64url_decode(value: str) -> bytes:
+   """Decode unpadded base64url text."""
+   return base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+
+def _sign(payload: str) -> str:
+   """Return the HMAC-SHA256 signature of an encoded payload."""
+   return _b64url_encode(hmac.new(SESSION_SECRET, payload.encode("ascii"), hashlib.sha256).digest())
+
+def issue_token(user_id: int) -> Tuple[str, datetime]:
+   """
+   Issue a signed session token for a user.
+
+   Args:
+       user_id (int): The authenticated user's ID
+
+   Returns:
+       Tuple[str, datetime]: (token, expires_at)
+   """
+   expires_at = int(time.time()) + SESSION_TTL_SECONDS
+   claims = {"uid": user_id, "exp": expires_at, "jti": secrets.token_hex(8)}
+   payload = _b64url_encode(json.dumps(claims, separators=(",", ":")).encode("utf-8"))
+   return f"{payload}.{_sign(payload)}", datetime.fromtimestamp(expires_at, tz=timezone.utc)
+
+def _decode(token: str) -> Optional[dict]:
+   """Return a token's claims if its signature is valid and it has not expired."""
+   # Tokens are base64url text; anything else (e.g. Latin-1 bytes in a header) is simply invalid
+   if not token.isascii():
+       return None
+   payload, _, signature = token.partition(".")
+   if not payload or not signature or not hmac.compare_digest(signature, _sign(payload)):
+       return None
+   try:
+       claims = json.loads(_b64url_decode(payload))
+   except ValueError:
+       return None
+   if not isinstance(claims, dict) or claims.get("exp", 0) <= time.time():
+       return None
+   return claims
+
+def _revoked_token_ids() -> Set[str]:
+   """Return the cached set of revoked token IDs, reloading it when stale."""
+   global _revoked_ids, _revoked_loaded_at
+   if time.monotonic() - _revoked_loaded_at < REVOCATION_CACHE_TTL_SECONDS:
+       return _revoked_ids
+
+   with _revoked_lock:
+       if time.monotonic() - _revoked_loaded_at < REVOCATION_CACHE_TTL_SECONDS:
+           return _revoked_ids
+       conn = create_connection()
+       if conn is not None:
+           try:
+               cursor = conn.cursor()
+               cursor.execute("SELECT jti FROM revoked_sessions WHERE expires_at > ?", (int(time.time()),))
+               _revoked_ids = {row[0] for row in cursor.fetchall()}
+               _revoked_loaded_at = time.monotonic()
+           except Error as e:
+               print(f"Error loading revoked sessions: {e}")
+           finally:
+               conn.close()
+   return _revoked_ids
+
+def verify_token(token: str) -> Optional[int]:
+   """
+   Validate a session token without a per-request database lookup.
+
+   The signature and expiry are checked locally; revocations come from a
+   small cache that is refreshed from the database at most once per
+   REVOCATION_CACHE_TTL_SECONDS.
+
+   Args:
+       token (str): The session token
+
+   Returns:
+       Optional[int]: The user ID if the token is valid, None otherwise
+   """
+   claims = _decode(token)
+   if claims is None or claims.get("jti") in _revoked_token_ids():
+       return None
+   return claims.get("uid")
+
+def revoke_token(token: str) -> bool:
+   """
+   Revoke a session token until it expires.
+
+   Args:
+       token (str): The session token
+
+   Returns:
+       bool: True if the token was valid and is now revoked
+   """
+   claims = _decode(token)
+   if claims is None:
+       return False
+
+   conn = create_connection()
+   if conn is None:
+       return False
+   try:
+       cursor = conn.cursor()
+       cursor.execute(
+           "INSERT OR IGNORE INTO revoked_sessions (jti, expires_at) VALUES (?, ?)",
+           (claims["jti"], claims["exp"])
+       )
+       # Drop revocations of tokens that have expired anyway
+       cursor.execute("DELETE FROM revoked_sessions WHERE expires_at <= ?", (int(time.time()),))
+       conn.commit()
+   except Error as e:
+       print(f"Error revoking session: {e}")
+       return False
+   finally:
+       conn.close()
+
+   with _revoked_lock:
+       _revoked_ids.add(claims["jti"])
+   return True
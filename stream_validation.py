@@ -0,0 +1,208 @@
+import json
+from typing import Any, Callable, Dict, List, Optional
+
+# Callbacks supplied by the caller; each returns the errors it found (empty when valid)
+DateKeyCheck = Callable[[str], List[str]]
+TaskCheck = Callable[[Any], List[str]]
+DayCheck = Callable[[str, List[Dict[str, Any]]], List[str]]
+
+_WHITESPACE = " \t\r\n"
+
+class IncrementalScheduleParser:
+   """
+   Validates a schedule (a JSON object mapping dates to lists of task objects)
+   while its text is still arriving, as LLM output streams in.
+
+   Each date key is checked as soon as its closing quote arrives, each task as
+   soon as its closing brace arrives, and each day as soon as its list closes.
+   The first error ends validation: feed() returns False and the errors are
+   kept in ``errors``, so the caller can stop reading the stream.
+
+   The parser only follows the nesting of the document. Syntax errors it does
+   not notice are left to the full validation of the complete output, which
+   still runs when the stream ends without errors.
+   """
+
+   def __init__(self, check_date_key: DateKeyCheck, check_task: TaskCheck, check_day: Optional[DayCheck] = None):
+       self.check_date_key = check_date_key
+       self.check_task = check_task
+       self.check_day = check_day
+       self.errors: List[str] = []
+       self.days = 0
+       self.tasks = 0
+       self._chunks: List[str] = []
+       # Open containers: "{" or "[" per nesting level; level 1 is the schedule, 2 a day, 3 a task
+       self._stack: List[str] = []
+       self._in_string = False
+       self._escape = False
+       self._started = False
+       self._closed = False
+       # Text of the date key or task currently being read, collected across chunks
+       self._capture: Optional[List[str]] = None
+       self._capture_start = 0
+       self._expect_key = False
+       self._date_key: Optional[str] = None
+       self._day_tasks: List[Dict[str, Any]] = []
+
+   @property
+   def output(self) -> str:
+       """Text received so far."""
+       return "".join(self._chunks)
+
+   def feed(self, text: str) -> bool:
+       """
+       Process the next piece of output.
+
+       Args:
+           text (str): Streamed content, split anywhere
+
+       Returns:
+           bool: False once an error has been found (the rest of the stream need not be read)
+       """
+       self._chunks.append(text)
+       if self.errors or self._closed:
+           return not self.errors
+       index = 0
+       length = len(text)
+       self._capture_start = 0
+       while index < length:
+           if self._in_string:
+               index = self._scan_string(text, index)
+               if self.errors:
+                   return False
+               continue
+           char = text[index]
+           if char in _WHITESPACE:
+               index += 1
+               continue
+           if not self._started:
+               if char != "{":
+                   return self._fail("Schedule must be a JSON object")
+               self._started = True
+               self._stack.append("{")
+               self._expect_key = True
+           elif char == '"':
+               depth = len(self._stack)
+               if depth == 1 and not self._expect_key:
+                   return self._fail(f"Validation error: Tasks for {self._date_key} must be a list")
+               if depth == 2:
+                   return self._fail(f"Validation error: Tasks for {self._date_key} must be objects")
+               self._in_string = True
+               if depth == 1:
+                   self._begin_capture(index)
+           elif char in "{[":
+               if not self._open(char, index):
+                   return False
+           elif char in "}]":
+               if not self._close(char, text, index):
+                   return False
+               if self._closed:
+                   return True
+           elif char == ",":
+               if len(self._stack) == 1:
+                   self._expect_key = True
+           elif char == ":":
+               if len(self._stack) == 1:
+                   self._expect_key = False
+           elif len(self._stack) == 1 and not self._expect_key:
+               return self._fail(f"Validation error: Tasks for {self._date_key} must be a list")
+           elif len(self._stack) == 2:
+               return self._fail(f"Validation error: Tasks for {self._date_key} must be objects")
+           index += 1
+       if self._capture is not None:
+           self._capture.append(text[self._capture_start:])
+       return True
+
+   def _scan_string(self, text: str, index: int) -> int:
+       """Skip string content up to and including the closing quote; return the next index."""
+       while index < len(text):
+           if self._escape:
+               self._escape = False
+               index += 1
+               continue
+           quote = text.find('"', index)
+           backslash = text.find("\\", index, quote if quote >= 0 else len(text))
+           if backslash >= 0:
+               self._escape = True
+               index = backslash + 1
+               continue
+           if quote < 0:
+               return len(text)
+           self._in_string = False
+           if len(self._stack) == 1 and self._capture is not None:
+               self._end_key(self._end_capture(text, quote + 1))
+           return quote + 1
+       return index
+
+   def _open(self, char: str, index: int) -> bool:
+       depth = len(self._stack)
+       if depth == 1:
+           if self._expect_key:
+               return self._fail("Invalid JSON format: expected a date key")
+           if char != "[":
+               return self._fail(f"Validation error: Tasks for {self._date_key} must be a list")
+           self._day_tasks = []
+       elif depth == 2:
+           if char != "{":
+               return self._fail(f"Validation error: Tasks for {self._date_key} must be objects")
+           self._begin_capture(index)
+       self._stack.append(char)
+       return True
+
+   def _close(self, char: str, text: str, index: int) -> bool:
+       if not self._stack or self._stack[-1] != ("{" if char == "}" else "["):
+           return self._fail(f"Invalid JSON format: unexpected '{char}'")
+       self._stack.pop()
+       depth = len(self._stack)
+       if depth == 0:
+           self._closed = True
+           if not self.days:
+               return self._fail("Schedule cannot be empty")
+       elif depth == 1:
+           return self._end_day()
+       elif depth == 2:
+           return self._end_task(self._end_capture(text, index + 1))
+       return True
+
+   def _end_key(self, raw: str):
+       try:
+           self._date_key = json.loads(raw)
+       except ValueError as e:
+           self._fail(f"Invalid JSON format: {e}")
+           return
+       self._record(self.check_date_key(self._date_key))
+
+   def _end_task(self, raw: str) -> bool:
+       try:
+           task = json.loads(raw)
+       except ValueError as e:
+           return self._fail(f"Invalid JSON format: {e}")
+       self.tasks += 1
+       self._day_tasks.append(task)
+       return self._record(self.check_task(task))
+
+   def _end_day(self) -> bool:
+       self.days += 1
+       if not self._day_tasks:
+           return self._fail(f"Validation error: No tasks found for date: {self._date_key}")
+       if self.check_day is not None:
+           return self._record(self.check_day(self._date_key, self._day_tasks))
+       return True
+
+   def _begin_capture(self, index: int):
+       self._capture = []
+       self._capture_start = index
+
+   def _end_capture(self, text: str, end: int) -> str:
+       self._capture.append(text[self._capture_start:end])
+       raw = "".join(self._capture)
+       self._capture = None
+       return raw
+
+   def _record(self, errors: List[str]) -> bool:
+       self.errors.extend(errors)
+       return not self.errors
+
+   def _fail(self, error: str) -> bool:
+       self.errors.append(error)
+       return False
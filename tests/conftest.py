@@ -0,0 +1,52 @@
+import os
+import sys
+import pytest
+
+# Modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Keep password hashing fast; must be set before password_hashing is imported
+os.environ.setdefault("PASSWORD_HASH_ITERATIONS", "1000")
+
+import database # type: ignore
+import availability # type: ignore
+
+@pytest.fixture
+def database_file(tmp_path, monkeypatch):
+   """Point the database module at a fresh, initialized SQLite file."""
+   path = str(tmp_path / "test.db")
+   monkeypatch.setattr(database, "DATABASE_FILE", path)
+   database.init_database()
+   # Cached free/busy indexes are keyed by user ID, which restarts at 1 in every database
+   with availability._index_lock:
+       availability._index_cache.clear()
+       availability._index_generations.clear()
+   return path
+
+@pytest.fixture
+def client(database_file):
+   """TestClient for the API, backed by a fresh database."""
+   from fastapi.testclient import TestClient
+   import main # type: ignore
+   with TestClient(main.app) as test_client:
+       yield test_client
+
+@pytest.fixture
+def user_id(client):
+   """Register a user and return its ID."""
+   response = client.post("/auth", json={"username": "test-user", "password": "test-password"})
+   return response.json()["user_id"]
+
+def make_task(start_time: str, end_time: str, task_name: str = "Study", recurrence: str = "weekly") -> dict:
+   return {"task_name": task_name, "start_time": start_time, "end_time": end_time,
+           "priority": False, "recurrence": recurrence}
+
+@pytest.fixture
+def no_network(monkeypatch):
+   """Fail the test if anything opens a network connection."""
+   import socket
+
+   def refuse(*args, **kwargs):
+       raise AssertionError("Test attempted a network connection")
+
+   monkeypatch.setattr(socket.socket, "connect", refuse)
+   monkeypatch.setattr(socket, "create_connection", refuse)
@@ -0,0 +1,52 @@
+import database # type: ignore
+import availability # type: ignore
+from conftest import make_task
+
+def create_user():
+   conn = database.create_connection()
+   conn.execute("INSERT INTO users (username, password) VALUES ('user', 'x')")
+   conn.commit()
+   conn.close()
+   return 1
+
+def test_every_save_changes_the_stamp(database_file):
+   user_id = create_user()
+   # Same stored length, saved within the same second
+   database.save_schedule(user_id, {"monday": [make_task("09:00 AM", "10:00 AM")]})
+   stamps = [database.get_schedule_stamps([user_id])[user_id]]
+   database.save_schedule(user_id, {"monday": [make_task("10:00 AM", "11:00 AM")]})
+   stamps.append(database.get_schedule_stamps([user_id])[user_id])
+   database.bulk_save_schedules([(user_id, {"monday": [make_task("11:00 AM", "12:00 PM")]})])
+   stamps.append(database.get_schedule_stamps([user_id])[user_id])
+   database.update_schedule_data(user_id, lambda schedule: {"monday": [make_task("12:00 PM", "01:00 PM")]})
+   stamps.append(database.get_schedule_stamps([user_id])[user_id])
+
+   assert len(set(stamps)) == len(stamps)
+   assert database.get_schedule_stamps([user_id + 1]) == {}
+
+def test_revalidated_cache_sees_saves_from_other_processes(database_file, monkeypatch):
+   user_id = create_user()
+   monkeypatch.setattr(availability, "CACHE_REVALIDATE", True)
+   # Saves in another process never reach this process's listeners
+   monkeypatch.setattr(database, "notify_schedule_saved", lambda user_id, schedule_data: None)
+
+   database.save_schedule(user_id, {"monday": [make_task("09:00 AM", "10:00 AM")]})
+   first = availability.get_free_busy_index(user_id)
+   assert availability.get_free_busy_index(user_id) is first
+   database.save_schedule(user_id, {"monday": [make_task("10:00 AM", "11:00 AM")]})
+   assert availability.get_free_busy_index(user_id) is not first
+
+def test_revision_column_is_added_to_existing_tables(tmp_path, monkeypatch):
+   monkeypatch.setattr(database, "DATABASE_FILE", str(tmp_path / "old.db"))
+   conn = database.create_connection()
+   conn.execute("""
+       CREATE TABLE schedules (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL,
+       schedule_data TEXT NOT NULL, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+       updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)
+       """)
+   conn.execute("INSERT INTO schedules (user_id, schedule_data) VALUES (1, '{}')")
+   conn.commit()
+   conn.close()
+
+   database.init_database()
+   assert database.get_schedule_stamps([1]) == {1: 0}
@@ -0,0 +1,52 @@
+from chunking import chunk_documents, chunk_text # type: ignore
+
+def test_paragraphs_differing_only_in_numbers_are_kept():
+   chunks = chunk_text(
+       "Week 1: Quiz 1 in Room 204 on 9/5\n\nWeek 2: Quiz 2 in Room 210 on 9/12\n\nWeek 3: Quiz 3 in Room 310 on 9/19",
+       max_tokens=8,
+   )
+   texts = [chunk["text"] for chunk in chunks]
+   for week in ("Week 1", "Week 2", "Week 3"):
+       assert any(text.startswith(week) for text in texts), texts
+
+def test_exact_duplicate_paragraphs_are_dropped():
+   chunks = chunk_text("Office hours are on Mondays.\n\noffice   hours are on MONDAYS.\n\nBring a calculator.")
+   assert len(chunks) == 1
+   assert chunks[0]["text"] == "Office hours are on Mondays.\n\nBring a calculator."
+
+def test_page_headers_and_footers_are_dropped():
+   pages = [
+       f"CS 101 Syllabus, Fall 2024\n\nTopic {topic} is covered this week.\n\nPage {number} of 3"
+       for number, topic in enumerate(("recursion", "sorting", "graphs"), start=1)
+   ]
+   chunks = chunk_text("\f".join(pages), max_tokens=16)
+   text = "\n\n".join(chunk["text"] for chunk in chunks)
+   assert text.count("CS 101 Syllabus") == 1
+   assert text.count("Page") == 1
+   for topic in ("recursion", "sorting", "graphs"):
+       assert f"Topic {topic}" in text
+   assert [chunk["page"] for chunk in chunks][0] == 1
+
+def test_dated_paragraphs_at_page_edges_are_kept():
+   text = ("Course overview and grading policy.\n\nExam on 12 May in room 4.\f"
+           "Exam on 19 May in room 7.\n\nFinal project guidelines.")
+   chunks = chunk_text(text, max_tokens=8)
+   texts = [chunk["text"] for chunk in chunks]
+   assert "Exam on 12 May in room 4." in texts
+   assert "Exam on 19 May in room 7." in texts
+
+def test_edge_paragraphs_repeated_on_a_minority_of_pages_are_kept():
+   topics = ["recursion", "sorting", "hashing", "graphs", "dynamic programming"]
+   pages = [f"This week introduces {topic}.\n\nPractice problems on {topic} are optional." for topic in topics]
+   pages[1] += "\n\nQuiz on 10 May."
+   pages[3] += "\n\nQuiz on 24 May."
+   text = "\n\n".join(chunk["text"] for chunk in chunk_text("\f".join(pages), max_tokens=16))
+   assert "Quiz on 10 May." in text and "Quiz on 24 May." in text
+   assert all(f"introduces {topic}" in text for topic in topics)
+
+def test_chunks_respect_token_limit_and_document_boundaries():
+   paragraph = "Read chapter one before the lecture and answer the review questions."
+   chunks = chunk_documents(["\n\n".join([paragraph] * 3), "Lab reports are due Friday."], max_tokens=32, deduplicate=False)
+   assert [chunk["document"] for chunk in chunks].count(1) == 1
+   assert all(chunk["id"] == index for index, chunk in enumerate(chunks))
+   assert sum(chunk["text"].count("chapter one") for chunk in chunks) == 3
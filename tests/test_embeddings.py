@@ -0,0 +1,44 @@
+import math
+import embeddings # type: ignore
+from embeddings import LocalEmbeddingBackend # type: ignore
+
+def distance(first, second):
+   return sum((a - b) ** 2 for a, b in zip(first, second))
+
+def test_vectors_are_unit_length_and_deterministic(no_network):
+   backend = LocalEmbeddingBackend(dimensions=64)
+   vectors = backend.embed(["CS 101 midterm in Room 204", "Office hours on Mondays"])
+   assert [len(vector) for vector in vectors] == [64, 64]
+   for vector in vectors:
+       assert math.isclose(math.sqrt(sum(value * value for value in vector)), 1.0, rel_tol=1e-5)
+   assert LocalEmbeddingBackend(dimensions=64).embed_one("CS 101 midterm in Room 204") == vectors[0]
+
+def test_shared_words_are_closer_than_unrelated_text(no_network):
+   backend = LocalEmbeddingBackend()
+   query, related, unrelated = backend.embed([
+       "When is the chemistry lab report due?",
+       "The chemistry lab report is due on Friday at noon.",
+       "Basketball practice moves to the north gym."
+   ])
+   assert distance(query, related) < backend.max_distance <= distance(query, unrelated)
+
+def test_stop_words_only_text_embeds_to_zero_vector(no_network):
+   assert LocalEmbeddingBackend(dimensions=8).embed_one("the and of") == [0.0] * 8
+
+def test_pure_python_fallback_matches_numpy(no_network, monkeypatch):
+   backend = LocalEmbeddingBackend(dimensions=32)
+   texts = ["Lecture notes for week three", "Quiz on recursion and sorting"]
+   with_numpy = backend.embed(texts)
+   monkeypatch.setattr(embeddings, "np", None)
+   without_numpy = backend.embed(texts)
+   for first, second in zip(with_numpy, without_numpy):
+       assert all(math.isclose(a, b, abs_tol=1e-6) for a, b in zip(first, second))
+
+def test_backend_is_selected_by_name():
+   assert embeddings.create_embedding_backend("local").name == "local"
+   try:
+       embeddings.create_embedding_backend("unknown")
+   except ValueError:
+       pass
+   else:
+       raise AssertionError("Unknown backend name was accepted")
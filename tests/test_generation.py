@@ -0,0 +1,19 @@
+import asyncio
+import main # type: ignore
+
+def test_generation_runs_outside_the_event_loop(client, user_id, monkeypatch):
+   calls = []
+
+   def generate_and_save_schedule(user_prompt, user_id, verify_user=True):
+       try:
+           asyncio.get_running_loop()
+           calls.append("event loop")
+       except RuntimeError:
+           calls.append("worker thread")
+       return {"status": "success", "message": "Schedule created successfully", "user_id": user_id,
+               "schedule_data": {}}
+
+   monkeypatch.setattr(main, "generate_and_save_schedule", generate_and_save_schedule)
+   response = client.post("/schedule/generate", json={"user_id": user_id, "user_prompt": "Study for the midterm"})
+   assert response.status_code == 200
+   assert calls == ["worker thread"]
@@ -0,0 +1,58 @@
+import database # type: ignore
+from conftest import make_task
+
+def save(client, user_id, schedule_data):
+   response = client.post("/schedule/save", json={"user_id": user_id, "schedule_data": schedule_data})
+   assert response.json()["status"] == "success"
+
+def test_unchanged_schedule_is_not_modified(client, user_id):
+   save(client, user_id, {"monday": [make_task("09:00 AM", "10:00 AM")]})
+   first = client.get(f"/schedule/{user_id}.ics")
+   assert first.status_code == 200
+   assert "BEGIN:VEVENT" in first.text
+
+   assert client.get(f"/schedule/{user_id}.ics", headers={"If-None-Match": first.headers["etag"]}).status_code == 304
+   assert client.get(f"/schedule/{user_id}.ics",
+                     headers={"If-Modified-Since": first.headers["last-modified"]}).status_code == 304
+
+def test_etag_changes_for_save_within_the_same_second(client, user_id):
+   # Same stored length as the first version, and usually the same second
+   save(client, user_id, {"monday": [make_task("09:00 AM", "10:00 AM")]})
+   first = client.get(f"/schedule/{user_id}.ics")
+   save(client, user_id, {"monday": [make_task("10:00 AM", "11:00 AM")]})
+
+   second = client.get(f"/schedule/{user_id}.ics", headers={"If-None-Match": first.headers["etag"]})
+   assert second.status_code == 200
+   assert second.headers["etag"] != first.headers["etag"]
+   assert "T100000" in second.text
+
+def test_missing_schedule_is_not_found(client, user_id):
+   assert client.get(f"/schedule/{user_id}.ics").status_code == 404
+
+def event_uids(text):
+   return {line for line in text.splitlines() if line.startswith("UID:")}
+
+def test_event_uids_survive_inserting_a_task(client, user_id):
+   save(client, user_id, {"monday": [make_task("09:00 AM", "10:00 AM"), make_task("01:00 PM", "02:00 PM", "Gym")]})
+   before = event_uids(client.get(f"/schedule/{user_id}.ics").text)
+   save(client, user_id, {"monday": [make_task("07:00 AM", "08:00 AM", "Run"), make_task("09:00 AM", "10:00 AM"),
+                                     make_task("01:00 PM", "02:00 PM", "Gym")]})
+   after = event_uids(client.get(f"/schedule/{user_id}.ics").text)
+
+   assert len(before) == 2 and len(after) == 3
+   assert before < after
+
+def test_identical_tasks_get_distinct_uids(client, user_id):
+   save(client, user_id, {"monday": [make_task("09:00 AM", "10:00 AM"), make_task("09:00 AM", "10:00 AM")]})
+   assert len(event_uids(client.get(f"/schedule/{user_id}.ics").text)) == 2
+
+def test_validators_are_read_from_the_covering_index(client, user_id):
+   save(client, user_id, {"monday": [make_task("09:00 AM", "10:00 AM")]})
+   created_at, updated_at, revision = database.get_schedule_validators(user_id)
+   assert client.get(f"/schedule/{user_id}.ics").headers["etag"] == f'W/"{user_id}-{revision}-ics"'
+
+   conn = database.create_connection()
+   plan = conn.execute("EXPLAIN QUERY PLAN SELECT created_at, updated_at, revision FROM schedules WHERE user_id = ?",
+                       (user_id,)).fetchall()
+   conn.close()
+   assert "COVERING INDEX idx_schedules_validators" in plan[0][-1]
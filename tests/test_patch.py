@@ -0,0 +1,19 @@
+import database # type: ignore
+from conftest import make_task
+
+def test_patch_updates_one_task(client, user_id):
+   client.post("/schedule/save", json={"user_id": user_id, "schedule_data": {
+       "monday": [make_task("09:00 AM", "10:00 AM"), make_task("01:00 PM", "02:00 PM", "Gym")]}})
+   response = client.patch(f"/schedule/{user_id}", json={"operations": [
+       {"op": "update", "day": "monday", "index": 1, "task": {"start_time": "03:00 PM", "end_time": "04:00 PM"}}]})
+   assert response.status_code == 200
+   assert database.get_schedule(user_id)["schedule_data"]["monday"][1]["start_time"] == "03:00 PM"
+
+def test_patch_without_changes_writes_nothing(client, user_id):
+   client.post("/schedule/save", json={"user_id": user_id, "schedule_data": {"monday": [make_task("09:00 AM", "10:00 AM")]}})
+   before = database.get_schedule(user_id)["updated_at"], database.get_schedule_stamps([user_id])
+
+   response = client.patch(f"/schedule/{user_id}", json={"operations": [
+       {"op": "test", "path": "/monday/0/task_name", "value": "Study"}]})
+   assert response.status_code == 200
+   assert (database.get_schedule(user_id)["updated_at"], database.get_schedule_stamps([user_id])) == before
@@ -0,0 +1,60 @@
+import pytest
+import lexical_index # type: ignore
+import vector_store # type: ignore
+import schedule_generation # type: ignore
+from embeddings import LocalEmbeddingBackend # type: ignore
+
+SYLLABUS = (
+   "CS 101 meets Tuesdays and Thursdays in Room 204.\n\n"
+   "The chemistry lab report is due Friday at noon in the science building.\n\n"
+   "Basketball practice moves to the north gym after spring break."
+)
+
+@pytest.fixture
+def local_retrieval(tmp_path, monkeypatch, no_network):
+   """Embed locally into a NumPy vector store under tmp_path."""
+   monkeypatch.setattr(schedule_generation, "embedding_backend", LocalEmbeddingBackend())
+   monkeypatch.setattr(vector_store, "VECTOR_STORE", "numpy")
+   monkeypatch.setattr(vector_store, "VECTOR_STORE_DIR", str(tmp_path / "vectors"))
+   monkeypatch.setattr(vector_store, "_stores", {})
+   monkeypatch.setattr(lexical_index, "_indexes", {})
+
+def upload(user_id, text):
+   schedule_generation.embedding_insertion_to_collection(
+       [{"filename": "syllabus.txt", "content": text.encode("utf-8")}], user_id=user_id
+   )
+
+def test_uploaded_chunks_are_embedded_and_retrieved(local_retrieval):
+   upload(1, SYLLABUS)
+   collection = schedule_generation.get_user_collection(1)
+   assert isinstance(collection, vector_store.NumpyVectorStore)
+   assert collection.count() == 1
+
+   chunks = schedule_generation.retrieve_context_chunks("When is the chemistry lab report due?", user_id=1)
+   assert len(chunks) == 1
+   assert "chemistry lab report" in chunks[0]
+
+def test_retrieval_ranks_the_matching_chunk_first(local_retrieval):
+   collection = schedule_generation.get_user_collection(1)
+   paragraphs = SYLLABUS.split("\n\n")
+   collection.add(documents=paragraphs, ids=[str(index) for index in range(len(paragraphs))])
+
+   chunks = schedule_generation.retrieve_context_chunks("chemistry lab report deadline", user_id=1)
+   assert chunks[0] == paragraphs[1]
+   assert paragraphs[2] not in chunks
+
+def test_users_only_retrieve_their_own_documents(local_retrieval):
+   upload(1, SYLLABUS)
+   upload(2, "Piano lessons are on Wednesday evenings.")
+
+   assert schedule_generation.retrieve_context_chunks("chemistry lab report", user_id=2) == []
+   assert schedule_generation.retrieve_context_chunks("piano lessons", user_id=2) == [
+       "Piano lessons are on Wednesday evenings."
+   ]
+
+def test_reupload_replaces_previous_chunks(local_retrieval):
+   upload(1, SYLLABUS)
+   upload(1, "Piano lessons are on Wednesday evenings.")
+
+   assert schedule_generation.get_user_collection(1).count() == 1
+   assert schedule_generation.retrieve_context_chunks("chemistry lab report", user_id=1) == []
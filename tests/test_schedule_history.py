@@ -0,0 +1,74 @@
+import database # type: ignore
+import schedule_history # type: ignore
+from conftest import make_task
+
+def create_users(count: int):
+   conn = database.create_connection()
+   conn.executemany("INSERT INTO users (username, password) VALUES (?, ?)",
+                    [(f"user-{i}", "x") for i in range(count)])
+   conn.commit()
+   conn.close()
+
+def latest_document(user_id: int):
+   latest = schedule_history.list_versions(user_id)[0]["version"]
+   return schedule_history.get_version(user_id, latest)["schedule_data"]
+
+def test_saves_are_recorded_as_versions(database_file):
+   create_users(1)
+   first = {"monday": [make_task("09:00 AM", "10:00 AM")]}
+   second = {"monday": [make_task("10:00 AM", "11:00 AM")]}
+   database.save_schedule(1, first)
+   database.save_schedule(1, second)
+   database.save_schedule(1, second)
+
+   assert [version["version"] for version in schedule_history.list_versions(1)] == [2, 1]
+   assert schedule_history.get_version(1, 1)["schedule_data"] == first
+   assert schedule_history.get_version(1, 2)["schedule_data"] == second
+
+def test_schedule_saved_before_history_is_kept_as_first_version(database_file):
+   create_users(1)
+   legacy = {"monday": [make_task("09:00 AM", "10:00 AM")]}
+   conn = database.create_connection()
+   conn.execute("INSERT INTO schedules (user_id, schedule_data) VALUES (1, ?)", (database.encode_document(legacy),))
+   conn.commit()
+   conn.close()
+
+   database.save_schedule(1, {"tuesday": [make_task("01:00 PM", "02:00 PM")]})
+   assert schedule_history.get_version(1, 1)["schedule_data"] == legacy
+   assert latest_document(1) == database.get_schedule(1)["schedule_data"]
+
+def test_bulk_save_and_patch_record_versions(database_file):
+   create_users(2)
+   results = database.bulk_save_schedules([
+       (1, {"monday": [make_task("09:00 AM", "10:00 AM")]}),
+       (1, {"monday": [make_task("09:00 AM", "11:00 AM")]}),
+       (2, {"friday": [make_task("09:00 AM", "10:00 AM")]})
+   ])
+   assert [result["status"] for result in results] == ["success"] * 3
+   assert len(schedule_history.list_versions(1)) == 2
+   assert latest_document(1) == database.get_schedule(1)["schedule_data"]
+
+   def add_task(schedule):
+       schedule["monday"].append(make_task("01:00 PM", "02:00 PM", "Gym"))
+       return schedule
+
+   assert database.update_schedule_data(1, add_task)["status"] == "success"
+   assert len(schedule_history.list_versions(1)) == 3
+   assert schedule_history.get_version(1, 2)["schedule_data"]["monday"][-1]["end_time"] == "11:00 AM"
+   assert latest_document(1) == database.get_schedule(1)["schedule_data"]
+
+def test_baselines_repair_histories_behind_the_stored_schedule(database_file):
+   create_users(2)
+   database.save_schedule(1, {"monday": [make_task("09:00 AM", "10:00 AM")]})
+   database.save_schedule(2, {"monday": [make_task("09:00 AM", "10:00 AM")]})
+   conn = database.create_connection()
+   conn.execute("DELETE FROM schedule_versions WHERE user_id = 1")
+   conn.execute("UPDATE schedule_versions SET data = '{}' WHERE user_id = 2")
+   conn.execute("PRAGMA user_version = 0")
+   conn.commit()
+   conn.close()
+
+   assert database.record_version_baselines() == 2
+   assert database.record_version_baselines() == 0
+   for user_id in (1, 2):
+       assert latest_document(user_id) == database.get_schedule(user_id)["schedule_data"]
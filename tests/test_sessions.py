@@ -0,0 +1,63 @@
+import json
+import database # type: ignore
+import main # type: ignore
+import sessions # type: ignore
+from conftest import make_task
+
+def test_issued_token_verifies(database_file):
+   token, _ = sessions.issue_token(7)
+   assert sessions.verify_token(token) == 7
+
+def test_tampered_and_malformed_tokens_are_rejected(database_file):
+   token, _ = sessions.issue_token(7)
+   payload, _, signature = token.partition(".")
+   tampered = signature[:-1] + ("B" if signature.endswith("A") else "A")
+   assert sessions.verify_token(f"{payload}.{tampered}") is None
+   assert sessions.verify_token(payload) is None
+   assert sessions.verify_token("abc.d\xe9f") is None
+   assert sessions.verify_token("") is None
+
+def test_expired_token_is_rejected(database_file, monkeypatch):
+   monkeypatch.setattr(sessions, "SESSION_TTL_SECONDS", -1)
+   token, _ = sessions.issue_token(7)
+   assert sessions.verify_token(token) is None
+
+def test_revoked_token_is_rejected(database_file, monkeypatch):
+   monkeypatch.setattr(sessions, "REVOCATION_CACHE_TTL_SECONDS", 0)
+   token, _ = sessions.issue_token(7)
+   assert sessions.revoke_token(token)
+   assert sessions.verify_token(token) is None
+
+def test_non_ascii_bearer_token_is_unauthorized(client, user_id):
+   response = client.post(
+       "/schedule/save",
+       json={"user_id": user_id, "schedule_data": {"monday": []}},
+       headers={"Authorization": b"Bearer abc.d\xe9f"}
+   )
+   assert response.status_code == 401
+
+def bulk_save(client, lines, headers=None):
+   body = "\n".join(json.dumps(line) for line in lines)
+   return client.post("/schedule/bulk-save", content=body,
+                      headers={"Content-Type": "application/x-ndjson", **(headers or {})})
+
+def test_bulk_save_requires_a_valid_token(client, user_id, monkeypatch):
+   monkeypatch.setattr(main, "REQUIRE_SESSION_TOKENS", True)
+   lines = [{"user_id": user_id, "schedule_data": {"monday": [make_task("09:00 AM", "10:00 AM")]}}]
+   assert bulk_save(client, lines).status_code == 401
+   assert bulk_save(client, lines, {"Authorization": "Bearer not.a-token"}).status_code == 401
+   assert database.get_schedule(user_id) is None
+
+def test_bulk_save_rejects_items_for_other_users(client, user_id):
+   other = client.post("/auth", json={"username": "other-user", "password": "other-password"}).json()
+   token = client.post("/auth", json={"username": "test-user", "password": "test-password"}).json()["token"]
+   schedule = {"monday": [make_task("09:00 AM", "10:00 AM")]}
+   response = bulk_save(client, [{"user_id": user_id, "schedule_data": schedule},
+                                 {"user_id": other["user_id"], "schedule_data": schedule}],
+                        {"Authorization": f"Bearer {token}"})
+
+   # Rejected items are reported at once, saved ones when their chunk is committed
+   results = sorted((json.loads(line) for line in response.text.splitlines()), key=lambda result: result["index"])
+   assert [result["status"] for result in results] == ["success", "error"]
+   assert results[1]["message"] == "Session does not belong to this user"
+   assert database.get_schedule(other["user_id"]) is None
@@ -0,0 +1,51 @@
+import json
+import os
+import pstats
+import tracing # type: ignore
+
+def read_traces(directory):
+   path = os.path.join(directory, f"traces-{os.getpid()}.jsonl")
+   with open(path) as f:
+       return [json.loads(line) for line in f]
+
+def test_traced_requests_are_written_in_the_background(client, tmp_path, monkeypatch):
+   monkeypatch.setattr(tracing, "TRACE_ENABLED", True)
+   monkeypatch.setattr(tracing, "TRACE_SAMPLE_RATE", 1.0)
+   monkeypatch.setattr(tracing, "TRACE_DIR", str(tmp_path))
+
+   responses = [client.get("/health") for _ in range(3)]
+   tracing._trace_writer.flush()
+
+   traces = read_traces(str(tmp_path))
+   assert [trace["trace_id"] for trace in traces] == [response.headers["x-trace-id"] for response in responses]
+   assert all(trace["status"] == 200 and trace["path"] == "/health" for trace in traces)
+
+def test_profiled_request_reports_overlap(client, tmp_path, monkeypatch):
+   monkeypatch.setattr(tracing, "PROFILE_ENABLED", True)
+   monkeypatch.setattr(tracing, "TRACE_DIR", str(tmp_path))
+
+   client.get("/health", headers={"X-Profile": "cprofile"})
+   tracing._trace_writer.flush()
+
+   trace = read_traces(str(tmp_path))[0]
+   assert trace["profile"].endswith(".prof") and os.path.exists(trace["profile"])
+   assert trace["profile_overlap"] == 0
+
+def test_cprofile_includes_thread_pool_work(client, user_id, tmp_path, monkeypatch):
+   import main # type: ignore
+   monkeypatch.setattr(tracing, "PROFILE_ENABLED", True)
+   monkeypatch.setattr(tracing, "TRACE_DIR", str(tmp_path))
+
+   def generate_in_worker_thread(user_prompt, user_id, verify_user=True):
+       return {"status": "success", "message": "Schedule created successfully", "user_id": user_id,
+               "schedule_data": {}}
+
+   monkeypatch.setattr(main, "generate_and_save_schedule", generate_in_worker_thread)
+   response = client.post("/schedule/generate", json={"user_id": user_id, "user_prompt": "Study"},
+                          headers={"X-Profile": "cprofile"})
+   assert response.status_code == 200
+   tracing._trace_writer.flush()
+
+   trace = read_traces(str(tmp_path))[0]
+   stats = pstats.Stats(trace["profile"])
+   assert any(name == "generate_in_worker_thread" for _, _, name in stats.stats)
@@ -0,0 +1,70 @@
+import multiprocessing
+import os
+from vector_store import NumpyVectorStore # type: ignore
+
+WRITERS = 4
+WRITES_PER_WRITER = 50
+
+def write_records(directory, writer):
+   store = NumpyVectorStore(directory, "ns")
+   for index in range(WRITES_PER_WRITER):
+       store.add(ids=[f"{writer}-{index}"], embeddings=[[float(writer + 1), float(index + 1)]],
+                 documents=[f"record {writer}-{index}"])
+       store.query(query_embeddings=[[1.0, 1.0]], n_results=3)
+
+def vectors_files(store):
+   return sorted(name for name in os.listdir(store.path) if name.startswith("vectors.f32"))
+
+def test_add_replaces_records_with_the_same_ids(tmp_path):
+   store = NumpyVectorStore(str(tmp_path), "ns")
+   store.add(ids=["a", "b"], embeddings=[[1.0, 0.0], [0.0, 1.0]], documents=["first", "second"])
+   store.add(ids=["a"], embeddings=[[0.0, 2.0]], documents=["replaced"])
+
+   assert store.count() == 2
+   result = store.query(query_embeddings=[[0.0, 1.0]], n_results=2)
+   assert result["documents"][0] == ["second", "replaced"]
+   assert result["distances"][0] == [0.0, 0.0]
+
+def test_delete_and_reopen(tmp_path):
+   store = NumpyVectorStore(str(tmp_path), "ns")
+   store.add(ids=["a", "b"], embeddings=[[1.0, 0.0], [0.0, 1.0]], documents=["first", "second"])
+   store.delete(ids=["a"])
+
+   reopened = NumpyVectorStore(str(tmp_path), "ns")
+   assert reopened.get()["documents"] == ["second"]
+   reopened.delete()
+   assert store.count() == 0
+
+def test_writes_keep_the_replaced_vectors_file(tmp_path):
+   store = NumpyVectorStore(str(tmp_path), "ns")
+   store.add(ids=["a"], embeddings=[[1.0, 0.0]])
+   first = vectors_files(store)
+   store.add(ids=["b"], embeddings=[[0.0, 1.0]])
+   second = vectors_files(store)
+   store.add(ids=["c"], embeddings=[[1.0, 1.0]])
+
+   # Only files older than the replaced one are removed
+   assert len(second) == 2 and set(first) <= set(second)
+   assert len(vectors_files(store)) == 2 and not set(first) & set(vectors_files(store))
+
+def test_reader_sees_writes_from_another_instance(tmp_path):
+   reader = NumpyVectorStore(str(tmp_path), "ns")
+   writer = NumpyVectorStore(str(tmp_path), "ns")
+   assert reader.count() == 0
+   writer.add(ids=["a"], embeddings=[[1.0, 0.0]], documents=["first"])
+   assert reader.query(query_embeddings=[[1.0, 0.0]], n_results=1)["ids"] == [["a"]]
+
+def test_concurrent_writes_from_several_processes(tmp_path):
+   processes = [multiprocessing.Process(target=write_records, args=(str(tmp_path), writer))
+                for writer in range(WRITERS)]
+   for process in processes:
+       process.start()
+   for process in processes:
+       process.join(60)
+   assert [process.exitcode for process in processes] == [0] * WRITERS
+
+   store = NumpyVectorStore(str(tmp_path), "ns")
+   assert store.count() == WRITERS * WRITES_PER_WRITER
+   stored = store.get(include=["documents", "embeddings"])
+   assert stored["documents"] == [f"record {record_id}" for record_id in stored["ids"]]
+   assert store.query(query_embeddings=[[1.0, 0.0]], n_results=1)["ids"] == [["3-0"]]
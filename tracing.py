@@ -0,0 +1,392 @@
+import atexit
+import cProfile
+import json
+import os
+import pstats
+import queue
+import random
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+from starlette.concurrency import run_in_threadpool as _starlette_run_in_threadpool
+
+# Tracing configuration (tunable through environment variables)
+TRACE_ENABLED = os.getenv("TRACE_ENABLED", "false").lower() in ("1", "true", "yes")
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+TRACE_DIR = os.getenv("TRACE_DIR", "traces")
+
+# Profiling configuration: requests are profiled when sampled or when they carry
+# PROFILE_HEADER, and only if PROFILE_ENABLED is set
+PROFILE_ENABLED = os.getenv("PROFILE_ENABLED", "false").lower() in ("1", "true", "yes")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_MODE = os.getenv("PROFILE_MODE", "cprofile")  # "cprofile" or "sample"
+PROFILE_HEADER = os.getenv("PROFILE_HEADER", "x-profile").lower().encode("latin-1")
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))
+# Finished traces waiting to be written; traces beyond this are dropped rather than slowing requests
+TRACE_QUEUE_SIZE = int(os.getenv("TRACE_QUEUE_SIZE", "10000"))
+
+class Span:
+   """
+   A timed operation within a request trace.
+   """
+   __slots__ = ("name", "kind", "start", "duration", "error", "children")
+
+   def __init__(self, name: str, kind: str):
+       self.name = name
+       self.kind = kind
+       self.start = time.perf_counter()
+       self.duration: Optional[float] = None
+       self.error: Optional[str] = None
+       self.children: List["Span"] = []
+
+   def finish(self, error: Optional[BaseException] = None):
+       """Record the span's duration and any exception that ended it."""
+       self.duration = time.perf_counter() - self.start
+       if error is not None:
+           self.error = type(error).__name__
+
+   def to_dict(self, origin: float) -> Dict[str, Any]:
+       """Serialize the span tree with offsets relative to the trace start."""
+       result: Dict[str, Any] = {
+           "name": self.name,
+           "kind": self.kind,
+           "offset_ms": round((self.start - origin) * 1000, 3),
+           "duration_ms": round((self.duration or 0.0) * 1000, 3)
+       }
+       if self.error:
+           result["error"] = self.error
+       if self.children:
+           result["children"] = [child.to_dict(origin) for child in self.children]
+       return result
+
+# The innermost open span of the current request; None when the request is not traced
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+def start_span(name: str, kind: str = "stage") -> Optional[Tuple[Span, Any]]:
+   """
+   Open a child span of the current span.
+
+   Returns None, doing no other work, when the current request is not traced.
+
+   Returns:
+       Optional[Tuple[Span, Any]]: Handle to pass to end_span
+   """
+   parent = _current_span.get()
+   if parent is None:
+       return None
+   span = Span(name, kind)
+   parent.children.append(span)
+   return span, _current_span.set(span)
+
+def end_span(handle: Optional[Tuple[Span, Any]], error: Optional[BaseException] = None):
+   """Close a span opened by start_span."""
+   if handle is None:
+       return
+   span, token = handle
+   span.finish(error)
+   _current_span.reset(token)
+
+class span:
+   """
+   Context manager for a span around a block:
+
+       with span("chunking"):
+           ...
+   """
+
+   def __init__(self, name: str, kind: str = "stage"):
+       self.name = name
+       self.kind = kind
+       self._handle: Optional[Tuple[Span, Any]] = None
+
+   def __enter__(self) -> "span":
+       self._handle = start_span(self.name, self.kind)
+       return self
+
+   def __exit__(self, exc_type, exc, tb) -> bool:
+       end_span(self._handle, exc)
+       return False
+
+class StackSampler:
+   """
+   Samples the stacks of all threads at a fixed interval into collapsed-stack counts.
+   The output can be rendered with flamegraph.pl or speedscope.
+   """
+
+   def __init__(self, interval: float = PROFILE_SAMPLE_INTERVAL):
+       self.interval = interval
+       self.stacks: Counter = Counter()
+       self._stop = threading.Event()
+       self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+   def _run(self):
+       own_id = threading.get_ident()
+       while not self._stop.wait(self.interval):
+           for thread_id, frame in sys._current_frames().items():
+               if thread_id == own_id:
+                   continue
+               names = []
+               while frame is not None:
+                   code = frame.f_code
+                   names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                   frame = frame.f_back
+               self.stacks[";".join(reversed(names))] += 1
+
+   def start(self):
+       self._thread.start()
+
+   def stop(self):
+       self._stop.set()
+       self._thread.join()
+
+   def dump(self, path: str):
+       """Write the samples in collapsed-stack format."""
+       with open(path, "w") as f:
+           for stack, count in self.stacks.most_common():
+               f.write(f"{stack} {count}\n")
+
+class TraceWriter:
+   """
+   Appends finished traces to this process's JSON lines file from a background thread,
+   so requests never wait on file I/O. Traces queued together are written with one open().
+   Other file writes (profile dumps) are queued as callables and run on the same thread.
+   """
+
+   def __init__(self, max_queued: int = TRACE_QUEUE_SIZE):
+       self.dropped = 0
+       self._queue: "queue.Queue[Union[Dict[str, Any], Callable[[], None], None]]" = queue.Queue(max_queued)
+       self._thread: Optional[threading.Thread] = None
+       self._start_lock = threading.Lock()
+
+   def submit(self, record: Union[Dict[str, Any], Callable[[], None]]):
+       """Queue a trace, or a callable writing a file, for the writer thread; drops it if the queue is full."""
+       if self._thread is None:
+           with self._start_lock:
+               if self._thread is None:
+                   self._thread = threading.Thread(target=self._run, name="trace-writer", daemon=True)
+                   self._thread.start()
+                   atexit.register(self.close)
+       try:
+           self._queue.put_nowait(record)
+       except queue.Full:
+           self.dropped += 1
+
+   def _run(self):
+       while True:
+           records = [self._queue.get()]
+           while True:
+               try:
+                   records.append(self._queue.get_nowait())
+               except queue.Empty:
+                   break
+           stop = None in records
+           for job in records:
+               if callable(job):
+                   try:
+                       job()
+                   except OSError as e:
+                       print(f"Error writing profile: {e}")
+           self._write([record for record in records if isinstance(record, dict)])
+           for _ in records:
+               self._queue.task_done()
+           if stop:
+               return
+
+   def _write(self, records: List[Dict[str, Any]]):
+       if not records:
+           return
+       try:
+           os.makedirs(TRACE_DIR, exist_ok=True)
+           path = os.path.join(TRACE_DIR, f"traces-{os.getpid()}.jsonl")
+           with open(path, "a") as f:
+               f.write("".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records))
+       except OSError as e:
+           print(f"Error writing traces: {e}")
+
+   def flush(self):
+       """Wait until every queued trace has been written."""
+       if self._thread is not None:
+           self._queue.join()
+
+   def close(self, timeout: float = 5.0):
+       """Write the traces still queued and stop the thread."""
+       if self._thread is not None and self._thread.is_alive():
+           self._queue.put(None)
+           self._thread.join(timeout)
+
+_trace_writer = TraceWriter()
+
+# Worker thread profiles of the request being profiled with cProfile, which only
+# hooks the event loop thread; None when no cProfile profile is active in this context
+_thread_profiles: ContextVar[Optional[List[cProfile.Profile]]] = ContextVar("thread_profiles", default=None)
+
+def _run_profiled(profiles: List[cProfile.Profile], func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+   profiler = cProfile.Profile()
+   profiler.enable()
+   try:
+       return func(*args, **kwargs)
+   finally:
+       profiler.disable()
+       profiles.append(profiler)
+
+async def run_in_threadpool(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+   """
+   Starlette's run_in_threadpool, except that while the calling request is
+   profiled with cProfile the call is profiled in its worker thread too and
+   merged into the request's profile.
+   """
+   profiles = _thread_profiles.get()
+   if profiles is None:
+       return await _starlette_run_in_threadpool(func, *args, **kwargs)
+   return await _starlette_run_in_threadpool(_run_profiled, profiles, func, *args, **kwargs)
+
+# Only one profiler may run at a time: cProfile hooks are per interpreter thread.
+# A profile still covers every request handled by the process while it runs;
+# _profile_overlap counts those requests so each profile can report them.
+_profile_lock = threading.Lock()
+_in_flight = 0
+_profile_overlap = 0
+
+def _profile_mode(scope: Dict[str, Any]) -> Optional[str]:
+   """Return the profiling mode requested for this request, if any."""
+   if not PROFILE_ENABLED:
+       return None
+   for name, value in scope.get("headers", []):
+       if name == PROFILE_HEADER:
+           requested = value.decode("latin-1").strip().lower()
+           return requested if requested in ("cprofile", "sample") else PROFILE_MODE
+   if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+       return PROFILE_MODE
+   return None
+
+class TracingMiddleware:
+   """
+   ASGI middleware that records a span tree per sampled request.
+
+   Each traced request is written as one JSON line to TRACE_DIR/traces-<pid>.jsonl,
+   with nested spans for the database, retrieval, LLM and validation stages
+   (see metrics.timed). Traces are written by a background thread. Profiled
+   requests also write a cProfile dump (.prof) or collapsed stack samples (.folded)
+   to TRACE_DIR/profiles and are always traced.
+
+   cProfile only hooks the thread that enables it, the event loop. Work the
+   request hands to the thread pool through this module's run_in_threadpool is
+   profiled in the worker thread and merged in; other thread pool work (sync
+   endpoints, iterating sync streaming responses) is missing from .prof files,
+   and only the sampler sees it. Both modes also record other requests running
+   meanwhile: on the event loop for cProfile, in any thread for the sampler.
+   Their number is stored with the trace as "profile_overlap"; only profiles with
+   an overlap of 0 describe the profiled request alone. Requests that are neither
+   traced nor profiled pass straight through.
+   """
+
+   def __init__(self, app: Any):
+       self.app = app
+
+   async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any):
+       if scope["type"] != "http" or not (TRACE_ENABLED or PROFILE_ENABLED):
+           await self.app(scope, receive, send)
+           return
+
+       # Runs on the event loop thread only, so the counters need no lock
+       global _in_flight, _profile_overlap
+       _in_flight += 1
+       if _profile_lock.locked():
+           _profile_overlap += 1
+       try:
+           await self._handle(scope, receive, send)
+       finally:
+           _in_flight -= 1
+
+   async def _handle(self, scope: Dict[str, Any], receive: Any, send: Any):
+       global _profile_overlap
+       traced = TRACE_ENABLED and random.random() < TRACE_SAMPLE_RATE
+       mode = _profile_mode(scope)
+       if not traced and mode is None:
+           await self.app(scope, receive, send)
+           return
+
+       trace_id = secrets.token_hex(8)
+       root = Span(f"{scope['method']} {scope['path']}", "request")
+       token = _current_span.set(root)
+       status = {"code": 500}
+
+       async def send_with_trace_id(message: Dict[str, Any]):
+           if message["type"] == "http.response.start":
+               status["code"] = message["status"]
+               message["headers"] = list(message.get("headers", [])) + [(b"x-trace-id", trace_id.encode("ascii"))]
+           await send(message)
+
+       profiler: Any = None
+       profile_overlap = None
+       thread_profiles: Optional[List[cProfile.Profile]] = None
+       profiles_token = None
+       if mode is not None and _profile_lock.acquire(blocking=False):
+           # Requests already in flight will run during the profile too
+           _profile_overlap = _in_flight - 1
+           profiler = cProfile.Profile() if mode == "cprofile" else StackSampler()
+           if mode == "cprofile":
+               thread_profiles = []
+               profiles_token = _thread_profiles.set(thread_profiles)
+               profiler.enable()
+           else:
+               profiler.start()
+
+       error: Optional[BaseException] = None
+       try:
+           await self.app(scope, receive, send_with_trace_id)
+       except BaseException as e:
+           error = e
+           raise
+       finally:
+           root.finish(error)
+           _current_span.reset(token)
+           if profiles_token is not None:
+               _thread_profiles.reset(profiles_token)
+           profile_path = None
+           if profiler is not None:
+               try:
+                   profile_path = self._save_profile(profiler, mode, trace_id, thread_profiles or [])
+               finally:
+                   profile_overlap = _profile_overlap
+                   _profile_lock.release()
+           _trace_writer.submit({
+               "trace_id": trace_id,
+               "time": datetime.now(timezone.utc).isoformat(),
+               "method": scope["method"],
+               "path": scope["path"],
+               "status": status["code"],
+               "duration_ms": round((root.duration or 0.0) * 1000, 3),
+               "spans": [child.to_dict(root.start) for child in root.children],
+               "profile": profile_path,
+               "profile_overlap": profile_overlap
+           })
+
+   def _save_profile(self, profiler: Any, mode: str, trace_id: str, thread_profiles: List[cProfile.Profile]) -> str:
+       """Stop a profiler and queue its results for the trace writer thread, returning the file path."""
+       directory = os.path.join(TRACE_DIR, "profiles")
+       stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+       if mode == "cprofile":
+           profiler.disable()
+           path = os.path.join(directory, f"{stamp}-{trace_id}.prof")
+
+           def write():
+               stats = pstats.Stats(profiler)
+               for thread_profile in thread_profiles:
+                   stats.add(thread_profile)
+               os.makedirs(directory, exist_ok=True)
+               stats.dump_stats(path)
+       else:
+           profiler.stop()
+           path = os.path.join(directory, f"{stamp}-{trace_id}.folded")
+
+           def write():
+               os.makedirs(directory, exist_ok=True)
+               profiler.dump(path)
+       _trace_writer.submit(write)
+       return path
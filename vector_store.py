@@ -0,0 +1,322 @@
+import json
+import logging
+import os
+import re
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+import numpy as np
+
+try:
+   import fcntl
+except ImportError:  # Optional: without it (Windows) only writers in one process are serialized
+   fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Vector store configuration (tunable through environment variables)
+# VECTOR_STORE: "chroma" (in-memory Chroma client) or "numpy" (memory-mapped files under VECTOR_STORE_DIR)
+VECTOR_STORE = os.getenv("VECTOR_STORE", "chroma").lower()
+VECTOR_STORE_DIR = os.getenv("VECTOR_STORE_DIR", "vector_store")
+
+# Namespace used when no user is given
+DEFAULT_NAMESPACE = "my_collection"
+
+_INDEX_FILE = "index.json"
+_VECTORS_FILE = "vectors.f32"
+_LOCK_FILE = "lock"
+_NAMESPACE = re.compile(r"^[A-Za-z0-9_-]{1,63}$")
+
+def _write_atomic(path: str, data: bytes):
+   """Write a file so readers see either the old or the new contents, never a mix."""
+   temporary = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+   with open(temporary, "wb") as f:
+       f.write(data)
+       f.flush()
+       os.fsync(f.fileno())
+   os.replace(temporary, path)
+
+class NumpyVectorStore:
+   """
+   Vector store for one namespace, kept as normalized float32 rows in a memory-mapped file.
+
+   Implements the parts of Chroma's collection API this app uses (add, get,
+   query, delete, count), so it can stand in for a Chroma collection. Queries
+   are one matrix-vector product over the mapped file plus argpartition for
+   the top k; distances are squared L2 between unit vectors (2 - 2 * cosine
+   similarity), the same scale Chroma's default "l2" space reports.
+
+   Files per namespace (under directory/namespace):
+       vectors.f32: count x dimensions float32 matrix, row-major
+       index.json: ids, documents and metadatas in row order
+
+   Writes rewrite both files atomically (vectors first, then the index that
+   refers to them); corpora here are a few hundred chunks. Readers remap
+   whenever the index file changes, so other processes see new data.
+
+   Processes sharing the directory coordinate through an flock on the
+   namespace's lock file: writers hold it exclusively from loading the index
+   to removing old vectors files, readers hold it shared while loading, so an
+   index is never read with its vectors file half-replaced or removed.
+   Cleanup keeps the vectors file of the replaced index as well, for readers
+   on systems without flock.
+   """
+
+   def __init__(self, directory: str, namespace: str = DEFAULT_NAMESPACE,
+                embedding_function: Optional[Callable[[List[str]], List[List[float]]]] = None):
+       if not _NAMESPACE.match(namespace):
+           raise ValueError(f"Invalid namespace '{namespace}'")
+       self.name = namespace
+       self.path = os.path.join(directory, namespace)
+       self.embedding_function = embedding_function
+       self._lock = threading.Lock()
+       self._loaded_stamp = None
+       self._ids: List[str] = []
+       self._documents: List[Optional[str]] = []
+       self._metadatas: List[Optional[Dict[str, Any]]] = []
+       self._vectors: Optional[np.ndarray] = None
+       self._vectors_name = ""
+       os.makedirs(self.path, exist_ok=True)
+
+   def _index_path(self) -> str:
+       return os.path.join(self.path, _INDEX_FILE)
+
+   @contextmanager
+   def _file_lock(self, exclusive: bool):
+       """Hold the namespace's lock file, shared or exclusive, across processes."""
+       if fcntl is None:
+           yield
+           return
+       with open(os.path.join(self.path, _LOCK_FILE), "ab") as f:
+           fcntl.flock(f.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+           try:
+               yield
+           finally:
+               fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+   def _stamp(self):
+       try:
+           stat = os.stat(self._index_path())
+           return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+       except FileNotFoundError:
+           return None
+
+   def _load(self, locked: bool = False):
+       """
+       (Re)load the index and remap the vectors if the files changed since the last load.
+
+       Args:
+           locked (bool): The caller already holds the file lock exclusively
+       """
+       if self._stamp() == self._loaded_stamp:
+           return
+       if locked:
+           self._read()
+       else:
+           with self._file_lock(exclusive=False):
+               self._read()
+
+   def _read(self):
+       stamp = self._stamp()
+       if stamp is None:
+           self._ids, self._documents, self._metadatas, self._vectors = [], [], [], None
+           self._vectors_name = ""
+       else:
+           with open(self._index_path(), "rb") as f:
+               index = json.load(f)
+           count, dimensions = len(index["ids"]), index["dimensions"]
+           vectors_path = os.path.join(self.path, index["vectors"])
+           self._vectors = (np.memmap(vectors_path, dtype=np.float32, mode="r", shape=(count, dimensions))
+                            if count else None)
+           self._ids, self._documents, self._metadatas = index["ids"], index["documents"], index["metadatas"]
+           self._vectors_name = index["vectors"]
+       self._loaded_stamp = stamp
+
+   def _write(self, ids: List[str], documents: List[Optional[str]], metadatas: List[Optional[Dict[str, Any]]],
+              vectors: np.ndarray):
+       """Replace the stored records; the caller holds the file lock exclusively and has just loaded."""
+       # Each write gets a new vectors file so mapped readers keep a consistent view
+       generation = int.from_bytes(os.urandom(4), "little")
+       vectors_name = f"{_VECTORS_FILE}.{generation:08x}" if len(ids) else ""
+       if vectors_name:
+           _write_atomic(os.path.join(self.path, vectors_name), np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+       index = {
+           "dimensions": int(vectors.shape[1]) if len(ids) else 0,
+           "vectors": vectors_name,
+           "ids": ids,
+           "documents": documents,
+           "metadatas": metadatas
+       }
+       _write_atomic(self._index_path(), json.dumps(index).encode("utf-8"))
+       # Remove vectors files older than the one this index replaced
+       keep = {vectors_name, self._vectors_name}
+       for name in os.listdir(self.path):
+           if name.startswith(_VECTORS_FILE) and name not in keep and ".tmp-" not in name:
+               try:
+                   os.remove(os.path.join(self.path, name))
+               except OSError:
+                   pass
+       self._loaded_stamp = None
+       self._load(locked=True)
+
+   def _embed(self, texts: List[str]) -> np.ndarray:
+       if self.embedding_function is None:
+           raise ValueError("No embedding function; pass embeddings explicitly")
+       return np.asarray(self.embedding_function(texts), dtype=np.float32)
+
+   @staticmethod
+   def _normalize(vectors: np.ndarray) -> np.ndarray:
+       vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+       norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+       return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+   def version(self) -> Any:
+       """Identifies the stored contents; changes on every write, from any process."""
+       with self._lock:
+           self._load()
+           return self._loaded_stamp
+
+   def count(self) -> int:
+       with self._lock:
+           self._load()
+           return len(self._ids)
+
+   def add(self, ids: List[str], documents: Optional[List[str]] = None, embeddings: Optional[List[List[float]]] = None,
+           metadatas: Optional[List[Dict[str, Any]]] = None):
+       """
+       Add records, replacing any with the same ids.
+
+       Args:
+           ids (List[str]): Record ids
+           documents (List[str], optional): Texts; embedded when embeddings are not given
+           embeddings (List[List[float]], optional): Precomputed vectors
+           metadatas (List[Dict[str, Any]], optional): Metadata per record
+       """
+       if embeddings is None:
+           if documents is None:
+               raise ValueError("add() needs documents or embeddings")
+           new_vectors = self._normalize(self._embed(documents))
+       else:
+           new_vectors = self._normalize(embeddings)
+       if len(new_vectors) != len(ids):
+           raise ValueError("ids and embeddings have different lengths")
+       documents = list(documents) if documents is not None else [None] * len(ids)
+       metadatas = list(metadatas) if metadatas is not None else [None] * len(ids)
+
+       with self._lock, self._file_lock(exclusive=True):
+           self._load(locked=True)
+           replaced = set(ids)
+           keep = [row for row, record_id in enumerate(self._ids) if record_id not in replaced]
+           if self._vectors is not None and self._vectors.shape[1] != new_vectors.shape[1]:
+               raise ValueError(f"Expected {self._vectors.shape[1]}-dimensional embeddings, got {new_vectors.shape[1]}")
+           old_vectors = (np.asarray(self._vectors[keep]) if self._vectors is not None
+                          else np.empty((0, new_vectors.shape[1]), dtype=np.float32))
+           self._write(
+               [self._ids[row] for row in keep] + list(ids),
+               [self._documents[row] for row in keep] + documents,
+               [self._metadatas[row] for row in keep] + metadatas,
+               np.concatenate([old_vectors, new_vectors])
+           )
+
+   def get(self, ids: Optional[List[str]] = None, include: Optional[List[str]] = None) -> Dict[str, Any]:
+       """Return records by id (all records when ids is None), like Collection.get."""
+       include = include if include is not None else ["documents", "metadatas"]
+       with self._lock:
+           self._load()
+           if ids is None:
+               rows = list(range(len(self._ids)))
+           else:
+               position = {record_id: row for row, record_id in enumerate(self._ids)}
+               rows = [position[record_id] for record_id in ids if record_id in position]
+           result: Dict[str, Any] = {"ids": [self._ids[row] for row in rows]}
+           result["documents"] = [self._documents[row] for row in rows] if "documents" in include else None
+           result["metadatas"] = [self._metadatas[row] for row in rows] if "metadatas" in include else None
+           result["embeddings"] = (np.asarray(self._vectors[rows]).tolist() if self._vectors is not None else []
+                                   ) if "embeddings" in include else None
+           return result
+
+   def delete(self, ids: Optional[List[str]] = None):
+       """Delete records by id; with no ids, delete every record."""
+       with self._lock, self._file_lock(exclusive=True):
+           self._load(locked=True)
+           removed = set(ids) if ids is not None else set(self._ids)
+           keep = [row for row, record_id in enumerate(self._ids) if record_id not in removed]
+           if len(keep) == len(self._ids):
+               return
+           vectors = np.asarray(self._vectors[keep]) if self._vectors is not None else np.empty((0, 0), np.float32)
+           self._write([self._ids[row] for row in keep], [self._documents[row] for row in keep],
+                       [self._metadatas[row] for row in keep], vectors)
+
+   def query(self, query_texts: Optional[List[str]] = None, query_embeddings: Optional[List[List[float]]] = None,
+             n_results: int = 10, include: Optional[List[str]] = None) -> Dict[str, Any]:
+       """
+       Return the n_results nearest records per query, like Collection.query.
+
+       Returns:
+           Dict[str, Any]: "ids", "distances", "documents" and "metadatas", one list per query
+       """
+       include = include if include is not None else ["documents", "metadatas", "distances"]
+       if query_embeddings is None:
+           if query_texts is None:
+               raise ValueError("query() needs query_texts or query_embeddings")
+           query_embeddings = self._embed(query_texts)
+       queries = self._normalize(query_embeddings)
+
+       with self._lock:
+           self._load()
+           ids, documents, metadatas, vectors = self._ids, self._documents, self._metadatas, self._vectors
+
+       result: Dict[str, Any] = {"ids": [], "distances": [], "documents": [], "metadatas": []}
+       for query in queries:
+           if vectors is None or n_results <= 0:
+               rows, distances = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+           else:
+               similarities = vectors @ query
+               k = min(n_results, len(similarities))
+               rows = np.argpartition(-similarities, k - 1)[:k] if k < len(similarities) else np.arange(k)
+               rows = rows[np.argsort(-similarities[rows], kind="stable")]
+               distances = np.maximum(0.0, 2.0 - 2.0 * similarities[rows])
+           result["ids"].append([ids[row] for row in rows])
+           result["distances"].append(distances.tolist())
+           result["documents"].append([documents[row] for row in rows])
+           result["metadatas"].append([metadatas[row] for row in rows])
+       for field in ("distances", "documents", "metadatas"):
+           if field not in include:
+               result[field] = None
+       return result
+
+_stores: Dict[str, Any] = {}
+_stores_lock = threading.Lock()
+_chroma_client = None
+
+def namespace_for_user(user_id: Optional[int]) -> str:
+   """Return the namespace holding a user's document chunks (the shared one for None)."""
+   return DEFAULT_NAMESPACE if user_id is None else f"user_{user_id}"
+
+def get_collection(namespace: str = DEFAULT_NAMESPACE, embedding_function: Optional[Callable] = None):
+   """
+   Return the collection for a namespace from the store selected by VECTOR_STORE.
+
+   Args:
+       namespace (str): Collection name, e.g. from namespace_for_user()
+       embedding_function (Callable, optional): Embeds documents and query texts
+
+   Returns:
+       A Chroma collection or a NumpyVectorStore; both support add, get, query, delete and count
+   """
+   global _chroma_client
+   with _stores_lock:
+       if namespace not in _stores:
+           if VECTOR_STORE == "numpy":
+               _stores[namespace] = NumpyVectorStore(VECTOR_STORE_DIR, namespace, embedding_function)
+           elif VECTOR_STORE == "chroma":
+               import chromadb
+               if _chroma_client is None:
+                   _chroma_client = chromadb.Client()
+               _stores[namespace] = _chroma_client.get_or_create_collection(
+                   name=namespace, embedding_function=embedding_function
+               )
+           else:
+               raise ValueError(f"Unknown VECTOR_STORE '{VECTOR_STORE}'; expected 'chroma' or 'numpy'")
+           logger.info(f"Opened {VECTOR_STORE} vector collection '{namespace}'")
+       return _stores[namespace]